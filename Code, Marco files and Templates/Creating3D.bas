@@ -1,227 +1,285 @@
 Attribute VB_Name = "Module2"
 ' ******************************************************************************
-' SolidWorks Macro with Excel Data Import - Looping through Rows - created by Xiao Liang
+' SolidWorks Macro building the designs of a CAD manifest - created by Xiao Liang
 ' ******************************************************************************
 
 Dim swApp As Object
 Dim Part As Object
 Dim boolstatus As Boolean
-Dim ExcelApp As Object
-Dim ExcelWorkbook As Object
-Dim ws As Object
 Dim longstatus As Long
 Dim longwarnings As Long
 
+' The manifest (cad_manifest.csv, written by cad_batch.py) is read from the folder of the running macro:
+' a header line, then one line per design with its ID, the blank part, the output files and the obstacle
+' geometry. Designs whose .x_t file exists are skipped; the result of every design is appended to
+' cad_status.csv in the same folder.
 Sub main()
 
 
     Set swApp = Application.SldWorks
     swApp.Visible = False ' 隐藏 SolidWorks 界面
     
-   ' Initialize Excel and open workbook
-    Set ExcelApp = CreateObject("Excel.Application")
-    Set ExcelWorkbook = ExcelApp.Workbooks.Open("D:\Close_loop_in_silico_optimization_showcase\Test.xlsx") ' 修改为你的Excel文件路径
-    Set ws = ExcelWorkbook.Sheets("Solidworks") ' 修改为你的工作表名称
-
-    ' Determine the last row with data in the worksheet
-    Dim lastRow As Long
+    Dim folder As String
+    folder = swApp.GetCurrentMacroPathFolder()
     
-    lastRow = ws.UsedRange.Columns(2).Cells(ws.UsedRange.Rows.Count).Row
+    Dim manifestFile As Integer
+    Dim manifestLines() As String
+    manifestFile = FreeFile
+    Open folder & "\cad_manifest.csv" For Input As #manifestFile
+    manifestLines = Split(Replace(Input$(LOF(manifestFile), manifestFile), vbCr, ""), vbLf)
+    Close #manifestFile
     
     Dim i As Long
-    For i = 2 To 3 ' Assuming that the first row is the header and data starts from row 2
-    
-        ' Read Block 1 coordinates and rotation
-        Dim block1Coords(1 To 6) As Double
-        block1Coords(1) = ws.Cells(i, "B").Value
-        block1Coords(2) = ws.Cells(i, "C").Value
-        block1Coords(3) = ws.Cells(i, "D").Value
-        block1Coords(4) = ws.Cells(i, "E").Value
-        block1Coords(5) = ws.Cells(i, "F").Value
-        block1Coords(6) = ws.Cells(i, "G").Value
-        Dim block1Rotation As Double
-        block1Rotation = ws.Cells(i, "H").Value
-        
-        ' Read Block 2 coordinates and rotation
-        Dim block2Coords(1 To 6) As Double
-        block2Coords(1) = ws.Cells(i, "I").Value
-        block2Coords(2) = ws.Cells(i, "J").Value
-        block2Coords(3) = ws.Cells(i, "K").Value
-        block2Coords(4) = ws.Cells(i, "L").Value
-        block2Coords(5) = ws.Cells(i, "M").Value
-        block2Coords(6) = ws.Cells(i, "N").Value
-        Dim block2Rotation As Double
-        block2Rotation = ws.Cells(i, "O").Value
-        
-        ' Read Block 3 coordinates and rotation
-        Dim block3Coords(1 To 6) As Double
-        block3Coords(1) = ws.Cells(i, "P").Value
-        block3Coords(2) = ws.Cells(i, "Q").Value
-        block3Coords(3) = ws.Cells(i, "R").Value
-        block3Coords(4) = ws.Cells(i, "S").Value
-        block3Coords(5) = ws.Cells(i, "T").Value
-        block3Coords(6) = ws.Cells(i, "U").Value
-        Dim block3Rotation As Double
-        block3Rotation = ws.Cells(i, "V").Value
-        
-        ' Read Block 4 coordinates and rotation
-        Dim block4Coords(1 To 6) As Double
-        block4Coords(1) = ws.Cells(i, "W").Value
-        block4Coords(2) = ws.Cells(i, "X").Value
-        block4Coords(3) = ws.Cells(i, "Y").Value
-        block4Coords(4) = ws.Cells(i, "Z").Value
-        block4Coords(5) = ws.Cells(i, "AA").Value
-        block4Coords(6) = ws.Cells(i, "AB").Value
-        Dim block4Rotation As Double
-        block4Rotation = ws.Cells(i, "AC").Value
+    Dim fields() As String
+    Dim status As String
+    Dim errorCode As Long
+    Dim started As Double
+    For i = 1 To UBound(manifestLines) ' Line 0 is the header
+        If Len(manifestLines(i)) > 0 Then
+            fields = Split(manifestLines(i), ",")
+            started = Timer
+            errorCode = 0
+            status = "skipped"
+            If ModelExists(fields(2)) = False Then
+                errorCode = BuildDesign(fields)
+                If errorCode = 0 Then
+                    status = "built"
+                Else
+                    status = "failed"
+                End If
+            End If
+            ReportStatus folder & "\cad_status.csv", fields(0), status, errorCode, Timer - started
+        End If
+    Next i
+    
+    ' Clean up and release objects
+    Set Part = Nothing
+    Set swApp = Nothing
 
-        
-        ' Now apply these values in your SolidWorks operations
+End Sub
 
-        ' Initialize SolidWorks and get active document
-        
 
-        
-        ' Open
-        Set Part = swApp.OpenDoc6("D:\Close_loop_in_silico_optimization_showcase\Blank.SLDPRT", 1, 0, "", longstatus, longwarnings)
-        
-        Dim COSMOSWORKSObj As Object
-        Dim CWAddinCallBackObj As Object
-        Set CWAddinCallBackObj = swApp.GetAddInObject("CosmosWorks.CosmosWorks")
-        Set COSMOSWORKSObj = CWAddinCallBackObj.COSMOSWORKS
-        
-        
-        ''''''block 1''''''
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
-        Part.SketchManager.CreateCenterRectangle block1Coords(1), block1Coords(2), block1Coords(3), block1Coords(4), block1Coords(5), block1Coords(6)
-        Part.Extension.RotateOrCopy False, 1, True, block1Coords(1), block1Coords(2), block1Coords(3), 0, 0, 1, block1Rotation
-        Dim swSketch1 As Object
-        Set swSketch1 = Part.SketchManager.ActiveSketch
-        swSketch1.Name = "block1_" & i
-        Part.ClearSelection2 True
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("block1_" & i, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
-        Dim myFeature1 As Object
-        Set myFeature1 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
-        myFeature1.Name = "Block_1_" & i
-        Part.SelectionManager.EnableContourSelection = False
-
-        ''''''block 2''''''
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
-        Part.SketchManager.CreateCenterRectangle block2Coords(1), block2Coords(2), block2Coords(3), block2Coords(4), block2Coords(5), block2Coords(6)
-        Part.Extension.RotateOrCopy False, 1, True, block2Coords(1), block2Coords(2), block2Coords(3), 0, 0, 1, block2Rotation
-        Dim swSketch2 As Object
-        Set swSketch2 = Part.SketchManager.ActiveSketch
-        swSketch2.Name = "block2_" & i
-        Part.ClearSelection2 True
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("block2_" & i, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
-        Dim myFeature2 As Object
-        Set myFeature2 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
-        myFeature2.Name = "Block_2_" & i
-        Part.SelectionManager.EnableContourSelection = False
-
-        ''''''block 3''''''
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
-        Part.SketchManager.CreateCenterRectangle block3Coords(1), block3Coords(2), block3Coords(3), block3Coords(4), block3Coords(5), block3Coords(6)
-        Part.Extension.RotateOrCopy False, 1, True, block3Coords(1), block3Coords(2), block3Coords(3), 0, 0, 1, block3Rotation
-        Dim swSketch3 As Object
-        Set swSketch3 = Part.SketchManager.ActiveSketch
-        swSketch3.Name = "block3_" & i
-        Part.ClearSelection2 True
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("block3_" & i, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
-        Dim myFeature3 As Object
-        Set myFeature3 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
-        myFeature3.Name = "Block_3_" & i
-        Part.SelectionManager.EnableContourSelection = False
-
-        ''''''block 4''''''
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
-        Part.SketchManager.CreateCenterRectangle block4Coords(1), block4Coords(2), block4Coords(3), block4Coords(4), block4Coords(5), block4Coords(6)
-        Part.Extension.RotateOrCopy False, 1, True, block4Coords(1), block4Coords(2), block4Coords(3), 0, 0, 1, block4Rotation
-        Dim swSketch4 As Object
-        Set swSketch4 = Part.SketchManager.ActiveSketch
-        swSketch4.Name = "block4_" & i
-        Part.ClearSelection2 True
-        Part.SketchManager.InsertSketch True
-        boolstatus = Part.Extension.SelectByID2("block4_" & i, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
-        Dim myFeature4 As Object
-        Set myFeature4 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
-        myFeature4.Name = "Block_4_" & i
-        Part.SelectionManager.EnableContourSelection = False
-        
-        
-        vBodies = Part.GetBodies2(swAllBodies, False)
+Function ModelExists(filePath As String) As Boolean
+    ModelExists = False
+    If Len(Dir(filePath)) > 0 Then
+        ModelExists = FileLen(filePath) > 0
+    End If
+End Function
+
+
+Sub ReportStatus(statusPath As String, designId As String, status As String, errorCode As Long, seconds As Double)
+    ' One line per design: design_id,status,error code,seconds (Str always writes a decimal point)
+    Dim statusFile As Integer
+    statusFile = FreeFile
+    Open statusPath For Append As #statusFile
+    Print #statusFile, designId & "," & status & "," & errorCode & "," & Trim(Str(Round(seconds, 2)))
+    Close #statusFile
+End Sub
 
-        ' 初始化最大体积和索引
-        maxVolume = 0
-        maxVolumeIndex = -1
+
+' Build one design of the manifest and save it. Returns 0 on success, otherwise the save status or the
+' number of the VBA error.
+' fields: design_id, part_template, x_t_file, sldprt_file, then x1, y1, z1, x2, y2, z2, angle of blocks 1 to 4
+Function BuildDesign(fields() As String) As Long
+
+    On Error GoTo Failed
+    Dim designId As String
+    designId = fields(0)
+    BuildDesign = 0
     
-        ' 遍历所有实体体，找到体积最大的实体体
-            For j = 0 To UBound(vBodies)
-            Set swBody = vBodies(j)
-            swMassProp = swBody.GetMassProperties(1) ' 使用默认单位（米-千克-秒）
-        
-            If Not IsEmpty(swMassProp) Then
-                If swMassProp(3) > maxVolume Then
-                    maxVolume = swMassProp(3)
-                    maxVolumeIndex = j
-                    maxVolumeBodyName = swBody.Name
-                End If
-            End If
-        Next j
+    ' Read Block 1 coordinates and rotation
+    Dim block1Coords(1 To 6) As Double
+    block1Coords(1) = Val(fields(4))
+    block1Coords(2) = Val(fields(5))
+    block1Coords(3) = Val(fields(6))
+    block1Coords(4) = Val(fields(7))
+    block1Coords(5) = Val(fields(8))
+    block1Coords(6) = Val(fields(9))
+    Dim block1Rotation As Double
+    block1Rotation = Val(fields(10))
     
-        ' 遍历所有实体体，删除体积小的实体体
-        For j = 0 To UBound(vBodies)
-            Set swBody = vBodies(j)
-        
-            ' 如果不是体积最大的实体体，删除它
-            If swBody.Name <> maxVolumeBodyName Then
-                boolstatus = Part.Extension.SelectByID2(swBody.Name, "SOLIDBODY", 0, 0, 0, False, 0, Nothing, 0)
-                Part.ClearSelection2 True
-                boolstatus = Part.Extension.SelectByID2(swBody.Name, "SOLIDBODY", 0, 0, 0, True, 0, Nothing, 0)
-                Dim myFeature As Object
-                Set myFeature = Part.FeatureManager.InsertDeleteBody2(False)
-            
+    ' Read Block 2 coordinates and rotation
+    Dim block2Coords(1 To 6) As Double
+    block2Coords(1) = Val(fields(11))
+    block2Coords(2) = Val(fields(12))
+    block2Coords(3) = Val(fields(13))
+    block2Coords(4) = Val(fields(14))
+    block2Coords(5) = Val(fields(15))
+    block2Coords(6) = Val(fields(16))
+    Dim block2Rotation As Double
+    block2Rotation = Val(fields(17))
+    
+    ' Read Block 3 coordinates and rotation
+    Dim block3Coords(1 To 6) As Double
+    block3Coords(1) = Val(fields(18))
+    block3Coords(2) = Val(fields(19))
+    block3Coords(3) = Val(fields(20))
+    block3Coords(4) = Val(fields(21))
+    block3Coords(5) = Val(fields(22))
+    block3Coords(6) = Val(fields(23))
+    Dim block3Rotation As Double
+    block3Rotation = Val(fields(24))
+    
+    ' Read Block 4 coordinates and rotation
+    Dim block4Coords(1 To 6) As Double
+    block4Coords(1) = Val(fields(25))
+    block4Coords(2) = Val(fields(26))
+    block4Coords(3) = Val(fields(27))
+    block4Coords(4) = Val(fields(28))
+    block4Coords(5) = Val(fields(29))
+    block4Coords(6) = Val(fields(30))
+    Dim block4Rotation As Double
+    block4Rotation = Val(fields(31))
+
+    
+    ' Now apply these values in your SolidWorks operations
+
+    ' Initialize SolidWorks and get active document
+    
+
+    
+    ' Open the blank part
+    Set Part = swApp.OpenDoc6(fields(1), 1, 0, "", longstatus, longwarnings)
+    If Part Is Nothing Then
+        BuildDesign = IIf(longstatus <> 0, longstatus, -1)
+        Exit Function
+    End If
+    
+    Dim COSMOSWORKSObj As Object
+    Dim CWAddinCallBackObj As Object
+    Set CWAddinCallBackObj = swApp.GetAddInObject("CosmosWorks.CosmosWorks")
+    Set COSMOSWORKSObj = CWAddinCallBackObj.COSMOSWORKS
+    
+    
+    ''''''block 1''''''
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
+    Part.SketchManager.CreateCenterRectangle block1Coords(1), block1Coords(2), block1Coords(3), block1Coords(4), block1Coords(5), block1Coords(6)
+    Part.Extension.RotateOrCopy False, 1, True, block1Coords(1), block1Coords(2), block1Coords(3), 0, 0, 1, block1Rotation
+    Dim swSketch1 As Object
+    Set swSketch1 = Part.SketchManager.ActiveSketch
+    swSketch1.Name = "block1_" & designId
+    Part.ClearSelection2 True
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("block1_" & designId, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
+    Dim myFeature1 As Object
+    Set myFeature1 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
+    myFeature1.Name = "Block_1_" & designId
+    Part.SelectionManager.EnableContourSelection = False
+
+    ''''''block 2''''''
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
+    Part.SketchManager.CreateCenterRectangle block2Coords(1), block2Coords(2), block2Coords(3), block2Coords(4), block2Coords(5), block2Coords(6)
+    Part.Extension.RotateOrCopy False, 1, True, block2Coords(1), block2Coords(2), block2Coords(3), 0, 0, 1, block2Rotation
+    Dim swSketch2 As Object
+    Set swSketch2 = Part.SketchManager.ActiveSketch
+    swSketch2.Name = "block2_" & designId
+    Part.ClearSelection2 True
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("block2_" & designId, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
+    Dim myFeature2 As Object
+    Set myFeature2 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
+    myFeature2.Name = "Block_2_" & designId
+    Part.SelectionManager.EnableContourSelection = False
+
+    ''''''block 3''''''
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
+    Part.SketchManager.CreateCenterRectangle block3Coords(1), block3Coords(2), block3Coords(3), block3Coords(4), block3Coords(5), block3Coords(6)
+    Part.Extension.RotateOrCopy False, 1, True, block3Coords(1), block3Coords(2), block3Coords(3), 0, 0, 1, block3Rotation
+    Dim swSketch3 As Object
+    Set swSketch3 = Part.SketchManager.ActiveSketch
+    swSketch3.Name = "block3_" & designId
+    Part.ClearSelection2 True
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("block3_" & designId, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
+    Dim myFeature3 As Object
+    Set myFeature3 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
+    myFeature3.Name = "Block_3_" & designId
+    Part.SelectionManager.EnableContourSelection = False
+
+    ''''''block 4''''''
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("base plane", "PLANE", 0, 0, 0, False, 0, Nothing, 0)
+    Part.SketchManager.CreateCenterRectangle block4Coords(1), block4Coords(2), block4Coords(3), block4Coords(4), block4Coords(5), block4Coords(6)
+    Part.Extension.RotateOrCopy False, 1, True, block4Coords(1), block4Coords(2), block4Coords(3), 0, 0, 1, block4Rotation
+    Dim swSketch4 As Object
+    Set swSketch4 = Part.SketchManager.ActiveSketch
+    swSketch4.Name = "block4_" & designId
+    Part.ClearSelection2 True
+    Part.SketchManager.InsertSketch True
+    boolstatus = Part.Extension.SelectByID2("block4_" & designId, "SKETCH", 0, 0, 0, False, 0, Nothing, 0)
+    Dim myFeature4 As Object
+    Set myFeature4 = Part.FeatureManager.FeatureCut4(True, False, False, 0, 0, 0.001, 0.001, False, False, False, False, 1.74532925199433E-02, 1.74532925199433E-02, False, False, False, False, False, True, True, True, True, False, 0, 0, False, False)
+    myFeature4.Name = "Block_4_" & designId
+    Part.SelectionManager.EnableContourSelection = False
+    
+    
+    vBodies = Part.GetBodies2(swAllBodies, False)
+
+    ' 初始化最大体积和索引
+    maxVolume = 0
+    maxVolumeIndex = -1
 
+    ' 遍历所有实体体，找到体积最大的实体体
+        For j = 0 To UBound(vBodies)
+        Set swBody = vBodies(j)
+        swMassProp = swBody.GetMassProperties(1) ' 使用默认单位（米-千克-秒）
+    
+        If Not IsEmpty(swMassProp) Then
+            If swMassProp(3) > maxVolume Then
+                maxVolume = swMassProp(3)
+                maxVolumeIndex = j
+                maxVolumeBodyName = swBody.Name
             End If
-        Next j
+        End If
+    Next j
 
-        k = i - 1
+    ' 遍历所有实体体，删除体积小的实体体
+    For j = 0 To UBound(vBodies)
+        Set swBody = vBodies(j)
+    
+        ' 如果不是体积最大的实体体，删除它
+        If swBody.Name <> maxVolumeBodyName Then
+            boolstatus = Part.Extension.SelectByID2(swBody.Name, "SOLIDBODY", 0, 0, 0, False, 0, Nothing, 0)
+            Part.ClearSelection2 True
+            boolstatus = Part.Extension.SelectByID2(swBody.Name, "SOLIDBODY", 0, 0, 0, True, 0, Nothing, 0)
+            Dim myFeature As Object
+            Set myFeature = Part.FeatureManager.InsertDeleteBody2(False)
         
-        ' Save As SLDPRT file
-        longstatus = Part.SaveAs3("D:\Close_loop_in_silico_optimization_showcase\Design" & k & ".SLDPRT", 0, 0)
-        If longstatus <> 0 Then
-            MsgBox "Error saving SLDPRT file for iteration " & k
+
         End If
-        
-        ' Ensure the file is properly saved
-        Part.ClearSelection2 True
+    Next j
 
-        ' Save As X_T file
-        longstatus = Part.SaveAs3("D:\Close_loop_in_silico_optimization_showcase\Design" & k & ".X_T", 2, 2)
+    ' Save As SLDPRT file, if requested
+    If Len(fields(3)) > 0 Then
+        longstatus = Part.SaveAs3(fields(3), 0, 0)
         If longstatus <> 0 Then
-            MsgBox "Error saving X_T file for iteration " & k
+            BuildDesign = longstatus
         End If
+    End If
+    
+    ' Ensure the file is properly saved
+    Part.ClearSelection2 True
 
-        ' Close Document
-        swApp.CloseDoc "Design" & k & ".SLDPRT"
+    ' Save As X_T file
+    longstatus = Part.SaveAs3(fields(2), 2, 2)
+    If longstatus <> 0 Then
+        BuildDesign = longstatus
+    End If
 
-    Next i
-    
-    ' Close Excel workbook and cleanup
-    ExcelWorkbook.Close False
-    ExcelApp.Quit
-    Set ExcelApp = Nothing
-    
-    ' Clean up and release objects
+    ' Close Document without saving the blank part
+    swApp.CloseDoc Part.GetTitle
     Set Part = Nothing
-    Set swApp = Nothing
+    Exit Function
 
-End Sub
+Failed:
+    BuildDesign = IIf(Err.Number <> 0, Err.Number, -1)
+    On Error Resume Next
+    If Not Part Is Nothing Then
+        swApp.CloseDoc Part.GetTitle
+    End If
+    Set Part = Nothing
 
+End Function
@@ -3,23 +3,67 @@
 @author: Xiao Liang
 """
 
+import argparse
 import subprocess
 import os
+import random
+import sys
+import threading
 import time
-import win32com.client as win32
 import shutil
 import pandas as pd
 import numpy as np
 import re
-import random
-import networkx as nx
 from scipy.spatial import distance
 from openpyxl import Workbook, load_workbook
-import comtypes.client
-import pythoncom
 import matplotlib
-matplotlib.use('Qt5Agg')  # Use the TkAgg backend
 import matplotlib.pyplot as plt
+from evaluation_cache import EvaluationCache
+from optimization import (
+    Mixer,
+    assign_density,
+    crossover,
+    evaluate_offspring_from_file,
+    generate_initial_population,
+    is_duplicate,
+    mutate,
+    non_dominated_sorting,
+    select_next_generation,
+    tournament_selection,
+)
+from steady_state import run_steady_state
+from cfd_job_pool import CFDJobPool, make_cfd_job, make_cfd_jobs
+from hypervolume import ParetoArchive
+from postprocessing import (
+    PLATES,
+    defer_reports,
+    load_summary_rows,
+    process_all_csv_files,
+    summarize_csv,
+    wait_for_reports,
+    write_summary,
+)
+from summary_watcher import SummaryWatcher
+from surrogate import GaussianProcessSurrogate, prescreen
+from cad_session import SolidWorksSession, WindowsComBackend
+from checkpoint import (
+    CampaignCheckpoint,
+    clear_design_files,
+    describe_status,
+    design_status,
+    manifest_matches,
+    restore_archive,
+    set_random_state,
+    write_manifest,
+)
+from evaluators import Evaluator, SyntheticEvaluator
+from cad_batch import MANIFEST_FILE as CAD_MANIFEST_FILE, run_cad_batch, write_cad_manifest
+from warm_start import INDEX_FILE as WARM_START_FILE, WarmStartIndex
+from solver_monitor import SolverMonitor
+from symmetry import SymmetryGroup
+from pipeline import DesignPipeline, PipelineStage
+import instrumentation
+from instrumentation import stage
 
 
 ## Functions for SolidWorks control
@@ -35,6 +79,11 @@ def open_sldprt_and_run_macro(file_path, macro_path, macro_module1, macro_proced
     :param macro_module2: Module name of macro 2
     :param macro_procedure2: Procedure name of macro 2
     """
+    # COM modules are Windows-only, they are imported when SolidWorks is actually used
+    import comtypes.client
+    import pythoncom
+    import win32com.client as win32
+
     # Check if file path exists
     if not os.path.exists(file_path):
         print(f"File path does not exist: {file_path}")
@@ -231,11 +280,13 @@ def replace_strings_and_update_population(input_file_path, output_file_path, old
     print(f"Modified file saved to: {output_file_path}")
 
 
-def run_starccm(batch_file_path):
+def run_starccm(batch_file_path, monitor=None):
     """
     Execute a starccm+ command using CMD and display the output in real-time.
 
     :param batch_file_path: Path to the modified Java file
+    :param monitor: Optional SolverMonitor reading the output; the design being solved is stopped through its
+                    stop file once it has converged or diverged (the other designs of the batch still run)
     """
     try:
         # Locate the directory
@@ -256,6 +307,11 @@ def run_starccm(batch_file_path):
         # Read CMD output in real-time
         for line in process.stdout:
             print(line, end="")  # Print standard output
+            if monitor is not None and monitor.feed(line) and monitor.stop_file:
+                print(f"Design {monitor.decision} at iteration {monitor.decision_iteration} ({monitor.reason}), "
+                      f"stopping it.")
+                with open(monitor.stop_file, 'w', encoding='utf-8') as file:
+                    file.write(f"{monitor.decision}: {monitor.reason}\n")
         for line in process.stderr:
             print(line, end="")  # Print error output
 
@@ -269,483 +325,6 @@ def run_starccm(batch_file_path):
 ## Functions for editing excel     
 # ----------------------------------------------------------------------------------------------------------------------------
 
-def natural_key(string):
-    """Key function for natural sorting, extracting numeric parts of a string."""
-    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', string)]
-
-
-def process_csv(file_path, output_folder):
-    """
-    Processes a CSV file, calculates MI values for each plate, and saves results to an Excel file.
-
-    :param file_path: Path to the CSV file
-    :param output_folder: Directory to save the processed Excel files
-    :return: A tuple containing the base file name, MI values, and the F2 value
-    """
-    df = pd.read_csv(file_path)
-
-    # Filter the data into separate DataFrames based on the X values
-    plates = {
-        'plate1': df[df['X (m)'] <= 0.001],
-        'plate2': df[df['X (m)'] == 0.002],
-        'plate3': df[df['X (m)'] == 0.003],
-        'plate4': df[df['X (m)'] == 0.004],
-        'plate5': df[df['X (m)'] == 0.005]
-    }
-
-    # Generate output Excel file name based on the input CSV file name
-    base_name = os.path.basename(file_path)
-    output_file_name = os.path.splitext(base_name)[0] + '_restructured.xlsx'
-    output_path = os.path.join(output_folder, output_file_name)
-
-    mi_values = {}
-
-    # Extract the value of the F2 cell (row 0, column 5)
-    f2_value = df.iloc[0, 5] if df.shape[1] > 5 and df.shape[0] > 0 else None
-
-    # Create a new Excel writer object
-    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-        for plate_name, plate_data in plates.items():
-            # Pivot the data
-            pivot_table = plate_data.pivot_table(values='PS', index='Z (m)', columns='Y (m)', aggfunc='mean')
-
-            # Calculate Average and (c-ci)^2 directly in Python
-            pivot_table['Average'] = pivot_table.mean(axis=1)
-            pivot_table['(c-ci)^2'] = (pivot_table['Average'] - 0.5) ** 2
-
-            # Calculate MI value directly
-            mi_value = 1 - (np.sqrt(pivot_table['(c-ci)^2'].mean()) / 0.5)
-            mi_values[plate_name] = mi_value
-
-            # Write the pivot table and MI value to a new sheet
-            pivot_table.to_excel(writer, sheet_name=plate_name)
-            worksheet = writer.sheets[plate_name]
-            worksheet.write('AI1', f'MI_{plate_name}')
-            worksheet.write('AI2', mi_value)
-
-    print(f'File saved to: {output_path}')
-    return base_name, mi_values, f2_value
-
-
-def process_all_csv_files(input_folder, output_folder, summary_file):
-    """
-    Processes all CSV files in a folder and generates a summary file with MI values and averages.
-
-    :param input_folder: Directory containing the input CSV files
-    :param output_folder: Directory to save the processed files
-    :param summary_file: Path to save the summary CSV file
-    """
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-
-    summary_data = []
-
-    # Get file names and sort them naturally
-    filenames = [f for f in os.listdir(input_folder) if f.endswith(".csv")]
-    filenames.sort(key=natural_key)
-
-    for filename in filenames:
-        file_path = os.path.join(input_folder, filename)
-        base_name, mi_values, f2_value = process_csv(file_path, output_folder)
-        summary_data.append((base_name, mi_values, f2_value))
-
-    # Write the summary data to a CSV file
-    summary_rows = []
-    for base_name, mi_values, f2_value in summary_data:
-        row = [base_name]
-        row.extend(mi_values.values())
-        average_value = np.mean(list(mi_values.values())) if mi_values else None
-        row.append(average_value)  # Add the average value
-        row.append(f2_value if f2_value is not None else 'N/A')
-        summary_rows.append(row)
-
-    # Create a DataFrame for summary data
-    summary_df = pd.DataFrame(summary_rows, columns=['Design', 'plate1', 'plate2', 'plate3', 'plate4', 'plate5', 'obj1', 'obj2'])
-
-    # Save summary to CSV
-    summary_df.to_csv(summary_file, index=False)
-    print(f'Summary file saved to: {summary_file}')
-
-
-
-def read_summary_csv(summary_file):
-
-    # Read the CSV file
-    df = pd.read_csv(summary_file)
-    
-    # Assuming the last two columns are Mixing Index and Pressure Drop
-    mixing_indices = df.iloc[:, -2].tolist()
-    pressure_drops = df.iloc[:, -1].tolist()
-    
-    return mixing_indices, pressure_drops
-
-
-## Functions for optimization algorithm   
-# ----------------------------------------------------------------------------------------------------------------------------
-
-class Mixer:
-    """
-    Custom problem for optimization.
-    """
-    def __init__(self):
-        self.num_variables = 4
-        self.num_objectives = 2
-        self.lower_bounds = [1] * self.num_variables
-        self.upper_bounds = [36] * self.num_variables
-        self.edges = [
-            (9, 13), (5, 9), (1, 5), (10, 14), (6, 10), (2, 6),
-            (11, 15), (7, 11), (3, 7), (12, 16), (8, 12), (4, 8),
-            (9, 10), (5, 6), (10, 11), (6, 7), (11, 12), (7, 8),
-            (10, 13), (9, 14), (6, 9), (5, 10), (2, 5), (1, 6),
-            (11, 14), (10, 15), (7, 10), (6, 11), (3, 6), (2, 7),
-            (12, 15), (11, 16), (11, 8), (7, 12), (4, 7), (3, 8)
-        ]
-
-    def repair_solution(self, positions):
-        """
-        Repair solution to ensure no invalid connections, no duplicate edges,
-        and maintain the required number of variables.
-        """
-        # Ensure positions are integers
-        positions = [int(pos) for pos in positions]
-
-        # Remove duplicates while preserving the order
-        positions = list(dict.fromkeys(positions))
-
-        # Get the edges corresponding to the positions
-        selected_edges = [self.edges[pos - 1] for pos in positions if pos - 1 < len(self.edges)]
-
-        # Build the graph from the selected edges
-        g = nx.Graph()
-        g.add_edges_from(selected_edges)
-
-        # Explicitly add all possible nodes to the graph
-        g.add_nodes_from(range(1, 17))  # Nodes are 1 to 16
-
-        # Ensure no invalid top-to-bottom connections
-        top_nodes = {1, 2, 3, 4}
-        bottom_nodes = {13, 14, 15, 16}
-
-        # Remove invalid connections
-        while self.has_top_to_bottom_path(g, top_nodes, bottom_nodes):
-            # Get the path causing the issue
-            path = self.get_top_to_bottom_path(g, top_nodes, bottom_nodes)
-
-            # Convert the path into edge tuples
-            path_edges = [(path[i], path[i + 1]) for i in range(len(path) - 1)]
-
-            # Find the first edge in the path to remove
-            edge_to_remove = None
-            for edge in path_edges:
-                if edge in selected_edges or tuple(reversed(edge)) in selected_edges:
-                    edge_to_remove = edge if edge in selected_edges else tuple(reversed(edge))
-                    break
-
-            if edge_to_remove:
-                # Remove the edge from the graph and the selected edges
-                selected_edges.remove(edge_to_remove)
-                g.remove_edge(*edge_to_remove)
-
-                # Add a new random edge not in the solution
-                new_edge = random.choice(
-                    [e for e in self.edges if e not in selected_edges and tuple(reversed(e)) not in selected_edges]
-                )
-                selected_edges.append(new_edge)
-                g.add_edge(*new_edge)
-            else:
-                # If no edge can be removed, break to prevent infinite loops
-                break
-
-        # Ensure unique edges in the solution
-        unique_edges = []
-        edge_set = set()
-        for edge in selected_edges:
-            if edge not in edge_set and tuple(reversed(edge)) not in edge_set:
-                unique_edges.append(edge)
-                edge_set.add(edge)
-
-        # Add new valid unique edges if the solution has fewer than the required number of variables
-        while len(unique_edges) < self.num_variables:
-            new_edge = random.choice(
-                [e for e in self.edges if e not in edge_set and tuple(reversed(e)) not in edge_set]
-            )
-            unique_edges.append(new_edge)
-            edge_set.add(new_edge)
-            g.add_edge(*new_edge)
-
-        # Map repaired edges back to their positions (ensure no duplicates in positions)
-        repaired_positions = [self.edges.index(edge) + 1 for edge in unique_edges]
-        return repaired_positions
-
-    def has_top_to_bottom_path(self, g, top_nodes, bottom_nodes):
-        """ Check if there is a path from any top node to any bottom node. """
-        for top_node in top_nodes:
-            for bottom_node in bottom_nodes:
-                if nx.has_path(g, top_node, bottom_node):
-                    return True
-        return False
-
-    def get_top_to_bottom_path(self, g, top_nodes, bottom_nodes):
-        """ Get any path from top to bottom if it exists. """
-        for top_node in top_nodes:
-            for bottom_node in bottom_nodes:
-                if nx.has_path(g, top_node, bottom_node):
-                    return nx.shortest_path(g, top_node, bottom_node)
-        return None
-
-    def create_solution(self):
-        """
-        Create a random solution.
-        """
-        variables = random.sample(range(1, 37), self.num_variables)
-        return {"variables": variables, "objectives": [0.0, 0.0]}
-
-
-def calculate_hypervolume(front, reference_point):
-    """
-    Calculate the HyperVolume (HV) of the Pareto front for mixed objectives.
-
-    Args:
-        front (list of lists): The Pareto front as a list of [obj1, obj2] points.
-        reference_point (list): The reference point as [ref_obj1, ref_obj2].
-
-    Returns:
-        float: The computed hypervolume.
-    """
-    if not front:
-        print("no input front")
-        return 0.0
-
-    # Adjust the front for uniform minimization (invert the maximization objective)
-    adjusted_front = [[-obj[0], obj[1]] for obj in front]
-
-    # Sort the front by the first objective (obj1, descending)
-    sorted_front = sorted(adjusted_front, key=lambda x: x[0], reverse=True)
-
-    # Initialize hypervolume
-    hv = 0.0
-
-    # Calculate the hypervolume using rectangles
-    for i in range(len(sorted_front)):
-        current_point = sorted_front[i]
-
-        # Calculate width (difference in obj1)
-        if i == 0:
-            width = reference_point[0] - current_point[0]
-        else:
-            width = sorted_front[i - 1][0] - current_point[0]
-
-        # Calculate height (difference in obj2)
-        height = reference_point[1] - current_point[1]
-
-        # Only add positive areas
-        if width > 0 and height > 0:
-            hv += width * height
-
-    return hv
-
-
-def ensure_integer_variables(solution):
-    """
-    Ensure that all variables in a solution are integers.
-    """
-    solution["variables"] = [int(var) for var in solution["variables"]]
-    return solution
-
-def evaluate_offspring_from_file(offspring, filepath):
-    """
-    Load fitness values for offspring from a file and assign objectives.
-    """
-    data = pd.read_csv(filepath)
-    print(f"Number of rows in file: {len(data)}")
-    for i, solution in enumerate(offspring):
-        solution["objectives"][0] = data.iloc[i, -2]  # Assuming second last column is Obj1
-        solution["objectives"][1] = data.iloc[i, -1]  # Assuming last column is Obj2
-
-    return offspring
-
-def load_pre_existing_population(filepath, problem):
-    """
-    Load pre-existing solutions from the provided CSV file.
-    """
-    pre_existing_data = pd.read_csv(filepath)
-    population = []
-    for _, row in pre_existing_data.iterrows():
-        solution = {
-            "variables": [
-                row["block1 position"],
-                row["block2 position"],
-                row["block3 position"],
-                row["block4 position"],
-            ],
-            "objectives": [row["Obj1"], row["Obj2"]],
-        }
-        population.append(solution)
-    return population
-
-def identify_pareto_front(population, target_size=3):
-    """
-    Identify a population of size target_size, containing Pareto fronts in sequence.
-    """
-    pareto_fronts = []
-    remaining_population = population[:]
-    selected_population = []
-
-    while remaining_population and len(selected_population) < target_size:
-        current_front = []
-        for i, candidate in enumerate(remaining_population):
-            dominated = False
-            for j, competitor in enumerate(remaining_population):
-                if i != j and dominates(competitor, candidate):
-                    dominated = True
-                    break
-            if not dominated:
-                current_front.append(candidate)
-
-        pareto_fronts.append(current_front)
-        if len(selected_population) + len(current_front) <= target_size:
-            selected_population.extend(current_front)
-        else:
-            selected_population.extend(current_front[: target_size - len(selected_population)])
-
-        remaining_population = [ind for ind in remaining_population if ind not in current_front]
-
-    return selected_population
-
-def generate_initial_population(problem, population_size):
-    """
-    Generate an initial population with feasible solutions.
-    """
-    population = []
-    while len(population) < population_size:
-        solution = problem.create_solution()
-        solution["variables"] = problem.repair_solution(solution["variables"])  # Ensure feasibility
-        population.append(solution)
-    return population
-
-def dominates(solution_a, solution_b):
-    """
-    Check if solution_a dominates solution_b.
-    """
-    return dominates_solution(solution_a, solution_b)
-
-
-def non_dominated_sorting(population):
-    """
-    Perform non-dominated sorting on the population.
-    """
-    fronts = []
-    domination_counts = [0] * len(population)
-    dominates = [set() for _ in range(len(population))]
-
-    for i, sol_i in enumerate(population):
-        for j, sol_j in enumerate(population):
-            if dominates_solution(sol_i, sol_j):
-                dominates[i].add(j)
-            elif dominates_solution(sol_j, sol_i):
-                domination_counts[i] += 1
-        if domination_counts[i] == 0:
-            sol_i["rank"] = 0
-            if len(fronts) == 0:
-                fronts.append([])
-            fronts[0].append(i)
-
-    current_rank = 0
-    while len(fronts[current_rank]) > 0:
-        next_front = []
-        for i in fronts[current_rank]:
-            for j in dominates[i]:
-                domination_counts[j] -= 1
-                if domination_counts[j] == 0:
-                    population[j]["rank"] = current_rank + 1
-                    next_front.append(j)
-        fronts.append(next_front)
-        current_rank += 1
-
-    return [[population[i] for i in front] for front in fronts if len(front) > 0]
-
-
-def dominates_solution(sol_a, sol_b):
-    """
-    Check if solution A dominates solution B.
-    Maximize Objective 1 and Minimize Objective 2.
-    """
-    better_in_all = (sol_a["objectives"][0] >= sol_b["objectives"][0]) and (sol_a["objectives"][1] <= sol_b["objectives"][1])
-    better_in_one = (sol_a["objectives"][0] > sol_b["objectives"][0]) or (sol_a["objectives"][1] < sol_b["objectives"][1])
-    return better_in_all and better_in_one
-
-
-def tournament_selection(population, k=2):
-    """
-    Perform tournament selection.
-    """
-    selected = random.sample(population, k)
-    return min(selected, key=lambda sol: sol["rank"])
-
-def crossover(parent1, parent2, crossover_rate, problem=None):
-    """
-    Perform single-point crossover and ensure unique and valid offspring.
-    """
-    if random.random() > crossover_rate:
-        # If crossover doesn't occur, return parents as offspring
-        # print(f"No crossover applied. Returning parents as offspring.")
-        return parent1, parent2
-
-    # Choose a random crossover point
-    point = random.randint(1, len(parent1["variables"]) - 1)
-
-    # Combine parts from both parents
-    child1_vars = parent1["variables"][:point] + parent2["variables"][point:]
-    child2_vars = parent2["variables"][:point] + parent1["variables"][point:]
-
-    # print(f"Crossover point: {point}")
-    # print(f"Before Repair - Child 1: {child1_vars}")
-    # print(f"Before Repair - Child 2: {child2_vars}")
-
-    # Create offspring solutions
-    child1 = {"variables": child1_vars, "objectives": [0.0, 0.0]}
-    child2 = {"variables": child2_vars, "objectives": [0.0, 0.0]}
-
-    # Repair offspring to ensure validity
-    if problem:
-        child1["variables"] = problem.repair_solution(child1["variables"])
-        child2["variables"] = problem.repair_solution(child2["variables"])
-
-    # Ensure variables are integers
-    child1 = ensure_integer_variables(child1)
-    child2 = ensure_integer_variables(child2)
-
-    return child1, child2
-
-def is_duplicate(candidate, population):
-    """
-    Check if a candidate solution is already in the population.
-    """
-    candidate_vars = set(candidate["variables"])
-    for solution in population:
-        if set(solution["variables"]) == candidate_vars:
-            return True
-    return False
-
-def mutate(solution, mutation_rate, problem=None):
-    """
-    Perform mutation on a solution and ensure unique and valid variables.
-    """
-    for i in range(len(solution["variables"])):
-        if random.random() < mutation_rate:
-            new_var = random.randint(1, 36)
-            # Replace variable at index `i` with a new one that doesn't duplicate
-            while new_var in solution["variables"]:
-                new_var = random.randint(1, 36)
-            solution["variables"][i] = new_var
-
-    # Repair the solution to ensure no invalid connections
-    if problem:
-        solution["variables"] = problem.repair_solution(solution["variables"])
-    solution["objectives"] = [0.0, 0.0]
-
-    return ensure_integer_variables(solution)
-
 def save_population_to_template(population, template_file, output_file, sheet_name, start_row, start_col):
     """
     Save the population to a specific Excel file, based on a template, always to 'simple' sheet.
@@ -775,301 +354,772 @@ def save_population_to_template(population, template_file, output_file, sheet_na
     print(f"Population saved to '{output_file}' in the sheet '{sheet_name}'.")
 
 
-     
-## Mian
-# ----------------------------------------------------------------------------------------------------------------------------------
+## CAD + CFD evaluator
 # ----------------------------------------------------------------------------------------------------------------------------
 
-# File paths and related parameters
-original_bas_file_path = r"D:\Close_loop_in_silico_optimization_showcase\Creating3D.bas"
-output_directory = r"D:\Close_loop_in_silico_optimization_showcase"
-file_path = r"D:\Close_loop_in_silico_optimization_showcase\Blank.SLDPRT"
-
-# Original macro file path
-src_macro_file = r"D:\Close_loop_in_silico_optimization_showcase\test.swp"
-
-# Macro module and procedure names
-macro_module_name = "Module1"
-macro_procedure_name = "main"
-macro_module_name2 = "Module2"
-macro_procedure_name2 = "main"
-
-# Problem definition
-problem = Mixer()
-
-# Algorithm parameters
-population_size = 2
-generations = 2
-mutation_rate = 0.3
-crossover_rate = 0.7
-
-# Template file name
-template_file = "Test.xlsx"
-
-# Reference point for HyperVolume calculation
-reference_point = [-1.0, 50.0]
-
-# Generate initial population
-initial_population = generate_initial_population(problem, population_size)
-
-# Save Initial Population to Test_1.xlsx in 'simple' sheet and print to console
-print("\nInitial Population:")
-for idx, solution in enumerate(initial_population, 1):
-    print(f"Solution {idx}: Variables = {solution['variables']}")
-
-save_population_to_template(
-    population=initial_population,
-    template_file=template_file,
-    output_file="Test_1.xlsx",
-    sheet_name="simple",
-    start_row=2,
-    start_col=1
-)
-
-# Run SolidWorks and perform setup
-dest_dir = r"D:\Close_loop_in_silico_optimization_showcase\T_1"
-macro_file = copy_and_rename_macro_file(src_macro_file, dest_dir, 1)
+def design_files(folder, extension):
+    """Design{k} files with the given extension in a folder (case-insensitive), for the instrumentation."""
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, f) for f in os.listdir(folder)
+            if f.startswith("Design") and f.lower().endswith(extension.lower())]
 
-changes = {
-    r"Close_loop_in_silico_optimization_showcase\Design": r"Close_loop_in_silico_optimization_showcase\T_1\Design",
-    r"Close_loop_in_silico_optimization_showcase\Test.xlsx": r"Close_loop_in_silico_optimization_showcase\Test_1.xlsx"
-}
-
-modified_content = update_bas_file(original_bas_file_path, changes, 1)
-iteration_dir = os.path.join(output_directory, "T_1")
-os.makedirs(iteration_dir, exist_ok=True)
-
-output_file_name = "Creating3D_new.bas"
-output_file_path = os.path.join(output_directory, output_file_name)
-
-with open(output_file_path, 'w') as file:
-    file.writelines(modified_content)
-
-print(f"Modified .bas file saved at: {output_file_path}")
-
-macro_file = r"D:\Close_loop_in_silico_optimization_showcase\T_1\test_T_1.swp"
-open_sldprt_and_run_macro(
-    file_path,
-    macro_file,
-    macro_module_name,
-    macro_procedure_name,
-    macro_module_name2,
-    macro_procedure_name2,
-)
 
-# Run STAR-CCM+
-input_java_file = r"D:\Close_loop_in_silico_optimization_showcase\Run_CFD.java"
-output_java_file = r"C:\Program Files\Siemens\17.04.008\STAR-CCM+17.04.008\star\bin\Run_CFD_Modified.java"
-folder_path = r"D:\Close_loop_in_silico_optimization_showcase\T_1"
-
-old_string = "T_0"
-new_string = "T_1"
-
-replace_strings_and_update_population(input_java_file, output_java_file, old_string, new_string, folder_path)
-run_starccm(output_java_file)
-
-output_folder = os.path.join(dest_dir, 'output')
-summary_file = os.path.join(output_folder, 'summary.csv')
-process_all_csv_files(dest_dir, output_folder, summary_file)
-
-
-# Real-time plotting setup
-plt.ion()
-fig, ax = plt.subplots()
-ax.set_xlim(0, 0.6)  # Mixing Index range
-ax.set_ylim(0, 16)  # Pressure Drop range
-ax.set_xlabel('Mixing Index')
-ax.set_ylabel('Pressure Drop')
-plt.title('Autonmous in-silico optimization')
-plt.grid(True)
+class CadCfdEvaluator(Evaluator):
+    """
+    Evaluator backend of the workflow: SolidWorks builds the designs (Creating3D.bas run by test.swp),
+    STAR-CCM+ simulates them (Run_CFD.java) and the exports are post-processed into the summary file.
+    """
+    def __init__(self, output_directory, template_file, bas_file, src_macro_file, part_file, cad_macros, cad_session,
+                 java_file, cfd_macro_file, base_sim_file, cfd_job_pool, cfd_cores_per_job, postprocessing_options,
+                 use_cfd_job_pool=True, overlap_postprocessing=False, write_template_xlsx=False, save_sldprt=True,
+                 cad_attempts=2, warm_start=None, use_pipeline=False, pipeline_queue_size=2):
+        """
+        :param output_directory: Folder of Creating3D_new.bas and of the T_{generation} / S_{evaluation_id} folders
+        :param template_file: Excel template, copied with the designs only if write_template_xlsx is set
+        :param bas_file: Creating3D.bas, the same for every batch (it builds the designs of cad_manifest.csv)
+        :param src_macro_file: Original test.swp
+        :param part_file: Blank.SLDPRT
+        :param cad_macros: List of (module, procedure) run in SolidWorks
+        :param cad_session: Persistent SolidWorksSession, None to launch and close SolidWorks for every batch
+        :param java_file: Original Run_CFD.java
+        :param cfd_macro_file: Modified Java macro run by STAR-CCM+
+        :param base_sim_file: Design_blank.sim
+        :param cfd_job_pool: CFDJobPool of the solver processes
+        :param cfd_cores_per_job: Cores of every solver process of the job pool
+        :param postprocessing_options: Keyword arguments of process_all_csv_files
+        :param use_cfd_job_pool: Simulate a generation in the job pool, False to run it in one starccm+ batch
+        :param overlap_postprocessing: Post-process the exports while the solver is still running
+        :param write_template_xlsx: Also save the designs to a copy of the template (Test_{generation}.xlsx),
+                                    e.g. to inspect them in Excel; the macro reads cad_manifest.csv
+        :param save_sldprt: Save the SolidWorks part of every design next to its .x_t file
+        :param cad_attempts: Macro runs per batch before the designs still without .x_t file are given up
+        :param warm_start: WarmStartIndex initializing the CFD jobs from the nearest converged design, None for
+                           cold starts from base_sim_file
+        :param use_pipeline: Stream the designs of a generation through CAD, CFD and post-processing one by one
+                             (see pipeline.py) instead of building all of them before the first simulation;
+                             needs the job pool
+        :param pipeline_queue_size: Built designs that may wait for a solver slot before CAD is paused
+        """
+        self.output_directory = output_directory
+        self.template_file = template_file
+        self.bas_file = bas_file
+        self.src_macro_file = src_macro_file
+        self.part_file = part_file
+        self.cad_macros = cad_macros
+        self.cad_session = cad_session
+        self.java_file = java_file
+        self.cfd_macro_file = cfd_macro_file
+        self.base_sim_file = base_sim_file
+        self.cfd_job_pool = cfd_job_pool
+        self.cfd_cores_per_job = cfd_cores_per_job
+        self.postprocessing_options = postprocessing_options
+        self.use_cfd_job_pool = use_cfd_job_pool
+        self.overlap_postprocessing = overlap_postprocessing
+        self.write_template_xlsx = write_template_xlsx
+        self.save_sldprt = save_sldprt
+        self.cad_attempts = cad_attempts
+        self.warm_start = warm_start
+        self.use_pipeline = use_pipeline
+        self.pipeline_queue_size = pipeline_queue_size
+
+        self.cad_lock = threading.Lock()  # SolidWorks serves one batch at a time
+        self.job_mode = False
+        self.macro_installed = False
+
+    def clear_stale_folder(self, folder, population):
+        """
+        Remove the files of a folder that was written for other designs (e.g. T_{generation} of an earlier
+        campaign in the same output directory); the CAD macro would skip the new designs since their .x_t
+        files exist, and the later stages would reuse the old exports.
+        """
+        if os.path.isdir(folder) and not manifest_matches(folder, population):
+            removed = clear_design_files(folder)
+            if self.warm_start is not None:
+                self.warm_start.discard(folder)
+            if removed:
+                print(f"{os.path.basename(folder)} was written for other designs, {len(removed)} stale files removed.")
+
+    def run_cad(self, folder, index):
+        """
+        Build the designs of the CAD manifest of a folder in one macro run, run again for the designs that
+        failed (see cad_batch.py).
 
+        :param folder: Folder of the manifest, the macro file test_T_{index}.swp is copied there
+        :param index: Generation number or evaluation ID
+        :return: Report of cad_batch.cad_report
+        """
+        if not self.macro_installed:
+            # test.swp imports Creating3D_new.bas; the macro reads the manifest of its own folder, so the
+            # same file serves every batch
+            shutil.copy(self.bas_file, os.path.join(self.output_directory, "Creating3D_new.bas"))
+            self.macro_installed = True
+        macro_file = copy_and_rename_macro_file(self.src_macro_file, folder, index)
+
+        def run_macro():
+            if self.cad_session is not None:
+                self.cad_session.run_macros(macro_file, self.cad_macros)
+            else:
+                (module1, procedure1), (module2, procedure2) = self.cad_macros
+                open_sldprt_and_run_macro(self.part_file, macro_file, module1, procedure1, module2, procedure2)
 
-# Adjust the size and position of the window
-manager = plt.get_current_fig_manager()
-manager.window.setGeometry(1400, 150, 800, 500)  # x, y, width, height
-manager.window.raise_()  # Raise the window to the front
-manager.window.activateWindow()  # Focus the window
+        return run_cad_batch(folder, run_macro, max_attempts=self.cad_attempts)
 
-# Colormap for dynamic colors
-colors = plt.cm.get_cmap('tab10')
+    def write_cad_input(self, population, folder, xlsx_file):
+        """
+        Write the CAD manifest read by Creating3D.bas (design IDs, obstacle geometry and output files) to
+        folder/cad_manifest.csv, and the Excel copy of the template if write_template_xlsx is set.
 
-# Store scatter plots for each generation
-scatter_plots = {}
-legend_labels = []
+        :return: List of the written files
+        """
+        files = [write_cad_manifest(population, folder, self.part_file, save_sldprt=self.save_sldprt)]
+        if self.write_template_xlsx:
+            save_population_to_template(
+                population=population,
+                template_file=self.template_file,
+                output_file=xlsx_file,
+                sheet_name="simple",
+                start_row=2,
+                start_col=1
+            )
+            files.append(xlsx_file)
+        return files
+
+    def evaluate(self, population, generation):
+        dest_dir = os.path.join(self.output_directory, f"T_{generation}")
+
+        # After a restart, only the designs without .x_t file, export or summary row are processed again
+        self.clear_stale_folder(dest_dir, population)
+        statuses = design_status(dest_dir, population) if os.path.isdir(dest_dir) else []
+        if any(s["x_t"] for s in statuses):
+            print(f"T_{generation}: {describe_status(statuses)} before the restart.")
+        missing_cad = [s["index"] for s in statuses if not s["x_t"]] if statuses else list(range(1, len(population) + 1))
+        write_manifest(dest_dir, population)
+
+        if self.use_pipeline and self.use_cfd_job_pool:
+            replace_strings_and_update_population(self.java_file, self.cfd_macro_file, "T_0", f"T_{generation}", dest_dir)
+            with stage("template", files=[os.path.join(dest_dir, CAD_MANIFEST_FILE)]):
+                self.write_cad_input(population, dest_dir, f"Test_{generation}.xlsx")
+            return self.evaluate_pipeline(population, dest_dir, statuses, generation), dest_dir
+
+        ## Run solidWorks
+        with self.cad_lock:
+            # Convert the edge indices to the obstacle geometry read by the macro (T_{generation}/cad_manifest.csv)
+            with stage("template", files=[os.path.join(dest_dir, CAD_MANIFEST_FILE)]):
+                self.write_cad_input(population, dest_dir, f"Test_{generation}.xlsx")
+
+            with stage("cad", files=lambda: design_files(dest_dir, ".x_t")):
+                # All designs of the generation in one macro run, the macro skips the existing .x_t files
+                if missing_cad:
+                    self.run_cad(dest_dir, generation)
+
+        ## Run starccm+
+        replace_strings_and_update_population(self.java_file, self.cfd_macro_file, "T_0", f"T_{generation}", dest_dir)
+
+        # Specify the input folder containing CSV files and the output folder for Excel files
+        output_folder = os.path.join(dest_dir, 'output')
+        summary_file = os.path.join(output_folder, 'summary.csv')
+
+        # Post-process the exports of finished designs while the solver is still running
+        summarized = [f"{s['design']}.csv" for s in statuses if s["summarized"]]
+        if self.overlap_postprocessing:
+            watcher = SummaryWatcher(dest_dir, output_folder, summary_file, num_designs=len(population),
+                                     **self.postprocessing_options)
+            watcher.resume(summarized).start()
+
+        # Run one solver process per design in the job pool, or all designs in one starccm+ batch
+        simulated = {s["design"] for s in statuses if s["export"]}
+        with stage("cfd", files=lambda: design_files(dest_dir, ".csv")):
+            if self.use_cfd_job_pool:
+                jobs = make_cfd_jobs(dest_dir, self.base_sim_file, self.cfd_cores_per_job)
+                jobs = [job for job in jobs if job.design_id not in simulated]
+                if self.warm_start is not None:
+                    self.warm_start.assign(jobs, population)
+                self.cfd_job_pool.run(jobs)
+                if self.warm_start is not None:
+                    self.warm_start.add_jobs(jobs, population)
+            elif len(simulated) < len(population):
+                monitor_factory = self.cfd_job_pool.monitor_factory
+                run_starccm(self.cfd_macro_file, monitor_factory() if monitor_factory else None)
+
+        ## Data processing
+        # Process the remaining CSV files in the input folder and create the summary
+        with stage("postprocessing"):
+            if self.overlap_postprocessing:
+                watcher.finish()
+            elif len(summarized) < len(population) or len(simulated) < len(population):
+                process_all_csv_files(dest_dir, output_folder, summary_file, num_designs=len(population),
+                                      **self.postprocessing_options)
+        return summary_file, dest_dir
+
+    def evaluate_pipeline(self, population, dest_dir, statuses, index):
+        """
+        Stream the designs of a folder through CAD -> CFD -> post-processing: design k is simulated as soon as
+        its .x_t file exists, while SolidWorks builds the next designs, and post-processed as soon as its export
+        is written. Work done before a restart (statuses) is skipped per design.
 
-# Initial plot setup for Generation 1
-mixing_indices, pressure_drops = read_summary_csv(summary_file)
+        :return: Path to the summary file, one row per design in design order (NaN for failed designs)
+        """
+        output_folder = os.path.join(dest_dir, 'output')
+        summary_file = os.path.join(output_folder, 'summary.csv')
+        os.makedirs(output_folder, exist_ok=True)
+        done = {s["design"]: s for s in statuses}
+        summary_rows = load_summary_rows(summary_file)
+        options = self.postprocessing_options
+        pool = self.cfd_job_pool
+
+        def cad(design, solution):
+            if not done.get(design, {}).get("x_t"):
+                # SolidWorks builds one design at a time; the macro reads the one-line manifest of the folder
+                with self.cad_lock:
+                    write_cad_manifest([solution], dest_dir, self.part_file, design_ids=[design],
+                                       save_sldprt=self.save_sldprt)
+                    self.run_cad(dest_dir, index)
+            return os.path.join(dest_dir, f"{design}.x_t")
+
+        def cfd(design, x_t_file):
+            job = make_cfd_job(dest_dir, design, self.base_sim_file, self.cfd_cores_per_job)
+            if done.get(design, {}).get("export"):
+                return job.csv_file
+            if self.warm_start is not None:
+                self.warm_start.assign([job], population)
+            CFDJobPool(pool.solver_command, self.cfd_macro_file, self.cfd_cores_per_job, cwd=pool.cwd,
+                       monitor_factory=pool.monitor_factory).run([job])
+            if self.warm_start is not None:
+                self.warm_start.add_jobs([job], population)
+            if job.status != "done":
+                raise RuntimeError(f"CFD job {job.status}" + (f", {job.stop_reason}" if job.stop_reason else ""))
+            return job.csv_file
+
+        def metrics(design, csv_file):
+            if done.get(design, {}).get("summarized"):
+                return summary_rows[f"{design}.csv"]
+            base_name, mi_values, f2_value, error = summarize_csv(
+                csv_file, output_folder, chunksize=options.get("chunksize"), use_cache=options.get("use_cache", False),
+                write_report=options.get("write_reports", True) is True)
+            if error is not None:
+                raise RuntimeError(error)
+            if options.get("write_reports") == "deferred":
+                defer_reports([csv_file], output_folder, chunksize=options.get("chunksize"),
+                              use_cache=options.get("use_cache", False), num_workers=options.get("num_workers", 1))
+            return base_name, mi_values, f2_value
+
+        pipeline = DesignPipeline([
+            PipelineStage("cad", cad, 1),
+            PipelineStage("cfd", cfd, max(1, pool.core_budget // self.cfd_cores_per_job)),
+            PipelineStage("metrics", metrics, max(1, options.get("num_workers", 1))),
+        ], queue_size=self.pipeline_queue_size)
+        records = pipeline.run([(f"Design{k}", solution) for k, solution in enumerate(population, start=1)])
+
+        # Failed designs keep their row, the objectives are read by position
+        write_summary([record["result"] if record["status"] == "done" else
+                       (f"{record['design']}.csv", {name: np.nan for name, _ in PLATES}, None) for record in records],
+                      summary_file)
+        failed = [f"{record['design']} ({record['stage']})" for record in records if record["status"] != "done"]
+        print(f"Pipeline finished: {len(records) - len(failed)}/{len(records)} designs done"
+              + (f", failed: {', '.join(failed)}" if failed else "."))
+        return summary_file
+
+    def evaluate_single(self, solution, evaluation_id):
+        """
+        Build and simulate a single design. The CAD stage is serialized, STAR-CCM+ runs of different
+        designs overlap.
+        """
+        design_dir = os.path.join(self.output_directory, f"S_{evaluation_id}")
+        self.clear_stale_folder(design_dir, [solution])
+        write_manifest(design_dir, [solution])
+
+        with self.cad_lock:
+            if not self.job_mode:
+                # Every solver process runs the same macro in job mode, the design is passed in its job file
+                replace_strings_and_update_population(self.java_file, self.cfd_macro_file, "T_0", "S_0",
+                                                      self.output_directory)
+                self.job_mode = True
+
+            design = f"S_{evaluation_id}"
+            with stage("template", design=design, files=[os.path.join(design_dir, CAD_MANIFEST_FILE)]):
+                self.write_cad_input([solution], design_dir, f"Test_S_{evaluation_id}.xlsx")
+
+            with stage("cad", design=design, files=lambda: design_files(design_dir, ".x_t")):
+                self.run_cad(design_dir, evaluation_id)
+
+        # One solver process per design, several designs are simulated at the same time
+        pool = self.cfd_job_pool
+        with stage("cfd", design=design, files=lambda: design_files(design_dir, ".csv")):
+            jobs = make_cfd_jobs(design_dir, self.base_sim_file, self.cfd_cores_per_job)
+            if self.warm_start is not None:
+                self.warm_start.assign(jobs, [solution])
+            CFDJobPool(pool.solver_command, self.cfd_macro_file, self.cfd_cores_per_job, cwd=pool.cwd,
+                       monitor_factory=pool.monitor_factory).run(jobs)
+            if self.warm_start is not None:
+                self.warm_start.add_jobs(jobs, [solution])
+
+        output_folder = os.path.join(design_dir, 'output')
+        summary_file = os.path.join(output_folder, 'summary.csv')
+        with stage("postprocessing", design=design):
+            process_all_csv_files(design_dir, output_folder, summary_file, num_designs=1, **self.postprocessing_options)
+        return summary_file, design_dir
+
+    def close(self):
+        if self.cad_session is not None:
+            self.cad_session.close()
 
-scatter_plots[f"Generation {1}"] = ax.scatter(
-    mixing_indices, pressure_drops, label="Initial population", color=colors(1 % 10)
-)
 
-# Update the legend dynamically
-ax.legend(loc='upper right')
-
-# Redraw the plot
-plt.draw()
-plt.pause(0.1)  # Allow GUI event processing
-
-
-# Optimization loop
-for i in range(2, generations + 2):
-    print(f"\n--- Generation {i} ---")
-
-    # Perform non-dominated sorting and calculate metrics
-    fronts = non_dominated_sorting(initial_population)
-    pareto_front = [(sol["objectives"][0], sol["objectives"][1]) for sol in fronts[0]]
-    hv = calculate_hypervolume(pareto_front, reference_point)
-
-    # Display Pareto front and metrics
-    print(f"\nPareto front at generation {i}:")
-    for sol in fronts[0]:
-        print(f"Variables = {sol['variables']}, Objectives = {sol['objectives']}")
-    print(f"HyperVolume: {hv:.4f}")
-
-    # Generate offspring
-    offspring = []
-    while len(offspring) < population_size:
-        parent1 = tournament_selection(initial_population)
-        parent2 = tournament_selection(initial_population)
-        child1, child2 = crossover(parent1, parent2, crossover_rate, problem)
-        off1 = mutate(child1, mutation_rate, problem)
-        if not is_duplicate(off1, offspring):
-            offspring.append(off1)
-        if len(offspring) < population_size:
-            off2 = mutate(child2, mutation_rate, problem)
-            if not is_duplicate(off2, offspring):
-                offspring.append(off2)
-
-    # Print offspring to console
-    print("\nGenerated Offspring Population:")
-    for idx, solution in enumerate(offspring, 1):
-        print(f"Offspring {idx}: Variables = {solution['variables']}")
-
-    # Save offspring population to Test_{generation + 1}.xlsx in 'simple' sheet
-    save_population_to_template(
-        population=offspring,
-        template_file=template_file,
-        output_file=f"Test_{i}.xlsx",
-        sheet_name="simple",
-        start_row=2,
-        start_col=1
-    )
+     
+## Mian
+# ----------------------------------------------------------------------------------------------------------------------------------
+# ----------------------------------------------------------------------------------------------------------------------------
 
-        
-    ## Run solidWorks
-    dest_dir = rf"D:\Close_loop_in_silico_optimization_showcase\T_{i}"
-    macro_file = copy_and_rename_macro_file(src_macro_file, dest_dir, i)
-    
-    # Define changes for each iteration
-    changes = {
-        r"Close_loop_in_silico_optimization_showcase\Design": rf"Close_loop_in_silico_optimization_showcase\T_{i}\Design",
-        r"Close_loop_in_silico_optimization_showcase\Test.xlsx": rf"Close_loop_in_silico_optimization_showcase\Test_{i}.xlsx"
-        }
-
-    # Call the function to get modified content
-    modified_content = update_bas_file(original_bas_file_path, changes, i)
-
-    # Create the output directory for this iteration
-    iteration_dir = os.path.join(output_directory, f"T_{i}")
-    os.makedirs(iteration_dir, exist_ok=True)
-
-    # Save the modified content to a new file with the format `Creating3D_T_i.bas`
-    output_file_name = "Creating3D_new.bas"
-    output_file_path = os.path.join(output_directory, output_file_name)
-
-    # Save the modified content
-    with open(output_file_path, 'w') as file:
-        file.writelines(modified_content)
-
-    print(f"Modified .bas file saved at: {output_file_path}")
-
-    # Create the location of macro file
-    macro_file = rf"D:\Close_loop_in_silico_optimization_showcase\T_{i}\test_T_{i}.swp"
-
-    # Run macro
-    open_sldprt_and_run_macro(
-        file_path,
-        macro_file,
-        macro_module_name,
-        macro_procedure_name,
-        macro_module_name2,
-        macro_procedure_name2,
+if __name__ == "__main__":
+    # The defaults run the SolidWorks + STAR-CCM+ workflow; "--evaluator synthetic" runs the same loop headless
+    # with an analytic stand-in, e.g. python Main.py --evaluator synthetic --output-directory runs --generations 20
+    parser = argparse.ArgumentParser(description="Autonomous in-silico optimization of the micromixer.")
+    parser.add_argument("--evaluator", choices=["cad_cfd", "synthetic"], default="cad_cfd",
+                        help="Evaluator backend (default: cad_cfd)")
+    parser.add_argument("--output-directory", help="Folder of the generations and of the evaluation cache")
+    parser.add_argument("--population-size", type=int, help="Number of designs per generation")
+    parser.add_argument("--generations", type=int, help="Number of generations after the initial population")
+    parser.add_argument("--synthetic-exports", action="store_true",
+                        help="Synthetic evaluator: write XYZ exports and post-process them instead of the summary")
+    parser.add_argument("--seed", type=int, help="Seed of the random number generators")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the campaign from the checkpoint in the output directory")
+    args = parser.parse_args()
+
+    # Evaluator backend: "cad_cfd" builds and simulates every design, "synthetic" needs no CAD, CFD or display
+    evaluator_backend = args.evaluator
+    headless = evaluator_backend == "synthetic"
+    matplotlib.use('Agg' if headless else 'Qt5Agg')
+    if args.seed is not None:
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+
+    # File paths and related parameters
+    original_bas_file_path = r"D:\Close_loop_in_silico_optimization_showcase\Creating3D.bas"
+    output_directory = args.output_directory or r"D:\Close_loop_in_silico_optimization_showcase"
+    file_path = r"D:\Close_loop_in_silico_optimization_showcase\Blank.SLDPRT"
+
+    # Original macro file path
+    src_macro_file = r"D:\Close_loop_in_silico_optimization_showcase\test.swp"
+
+    # Macro module and procedure names
+    macro_module_name = "Module1"
+    macro_procedure_name = "main"
+    macro_module_name2 = "Module2"
+    macro_procedure_name2 = "main"
+    cad_macros = [(macro_module_name, macro_procedure_name), (macro_module_name2, macro_procedure_name2)]
+
+    # SolidWorks executable, and whether it is started once for all generations (see cad_session.py)
+    solidworks_exe = r"D:\XXXXX\XXXXX\SLDWORKS.exe"
+    persistent_cad_session = True
+
+    # Problem definition
+    problem = Mixer()
+
+    # Symmetries of the lattice the objectives are invariant under (see symmetry.py): only one layout of each
+    # class of mirror images is simulated, e.g. ["mirror_top_bottom"] for the mirror across the mid-plane of
+    # the channel. Off by default: the straight CAD obstacles of geometry.py are up to 0.4 mm off their exact
+    # mirror position (python symmetry.py), so mirror images are different geometries. Enable a symmetry only
+    # once the obstacles are placed mirror-symmetrically or CFD shows that mirror images give the same objectives.
+    symmetry_group = []
+    symmetry = SymmetryGroup(problem.edges, symmetry_group)
+
+    # Algorithm parameters
+    population_size = args.population_size or 2
+    generations = args.generations if args.generations is not None else 2
+    mutation_rate = 0.3
+    crossover_rate = 0.7
+
+    # Density estimator for survival truncation and tournament ties: "crowding" (NSGA-II), "hypervolume" or None
+    density_estimator = "crowding"
+
+    # Optimization mode: "generational" runs the lockstep loop below, "steady_state" inserts every
+    # finished design into the population and dispatches a new offspring right away
+    optimization_mode = "generational"
+    num_cfd_slots = 2  # Number of designs simulated at the same time in steady-state mode
+    max_evaluations = population_size * (generations + 1)
+
+    # STAR-CCM+ job pool: one solver process per design, within a core budget, instead of one serial batch
+    use_cfd_job_pool = True
+    cfd_core_budget = 16
+    cfd_cores_per_job = 4
+    starccm_dir = r"C:\Program Files\Siemens\17.04.008\STAR-CCM+17.04.008\star\bin"
+    base_sim_file = r"D:\Close_loop_in_silico_optimization_showcase\Design_blank.sim"
+    input_java_file = r"D:\Close_loop_in_silico_optimization_showcase\Run_CFD.java"
+    cfd_macro_file = r"C:\Program Files\Siemens\17.04.008\STAR-CCM+17.04.008\star\bin\Run_CFD_Modified.java"
+    cfd_solver_command = [os.path.join(starccm_dir, "starccm+"), "-np", "{cores}", "-batch", "{macro}"]
+
+    # Convergence monitor: stop a run once Pressure_drop and the mixing index level off, abort it if it
+    # diverges (see solver_monitor.py; python solver_monitor.py replay <logs> tunes the options offline)
+    use_solver_monitor = True
+    solver_monitor_options = {
+        "window": 50,  # Iterations over which the report monitors must be flat
+        "report_tolerance": 1e-3,  # Relative change of Pressure_drop and mixing index over the window
+        "residual_tolerance": 1e-3,
+        "min_iterations": 100,
+        "divergence_factor": 1e3,
+    }
+    monitor_factory = (lambda: SolverMonitor(**solver_monitor_options)) if use_solver_monitor else None
+    cfd_job_pool = CFDJobPool(cfd_solver_command, cfd_macro_file, cfd_core_budget, cwd=starccm_dir,
+                              monitor_factory=monitor_factory)
+
+    # Post-processing: read the CFD exports in chunks of this many rows (bounded memory for fine meshes), None reads whole files
+    csv_chunksize = None
+    use_export_cache = True  # Convert every export once into memory-mapped .npy columns, reruns skip CSV parsing
+    postprocessing_workers = 8  # Designs post-processed at the same time (worker processes)
+    write_reports = "deferred"  # xlsx reports: True, False, or "deferred" to write them in the background
+    postprocessing_options = {
+        "chunksize": csv_chunksize,
+        "use_cache": use_export_cache,
+        "num_workers": postprocessing_workers,
+        "write_reports": write_reports,
+    }
+    overlap_postprocessing = True  # Post-process each export as soon as it is written, while the other designs are still simulated
+
+    # Template file name; the macro reads the designs from cad_manifest.csv, the copy of the template with the
+    # designs of each generation (Test_{i}.xlsx) is optional
+    template_file = "Test.xlsx"
+    write_template_xlsx = False
+    save_sldprt = True  # Keep Design{k}.SLDPRT next to the .x_t files
+    cad_attempts = 2  # Macro runs per batch; a second run only rebuilds the designs that failed
+
+    # Per-design pipeline: design k is simulated while SolidWorks builds design k + 1, instead of all designs
+    # being built before the first simulation (see pipeline.py; needs the job pool)
+    use_design_pipeline = True
+    pipeline_queue_size = 2  # Built designs that may wait for a solver slot before CAD is paused
+
+    # Warm start: every CFD job is initialized from the saved .sim of the nearest converged design, if it
+    # differs by at most warm_start_max_distance obstacle edges (see warm_start.py)
+    use_warm_start = True
+    warm_start_max_distance = 2
+
+    # Reference point for HyperVolume calculation
+    reference_point = [-1.0, 50.0]
+
+    # Evaluator backend
+    if headless:
+        # No xlsx reports, the synthetic runs are meant for timing the optimizer
+        os.makedirs(output_directory, exist_ok=True)
+        evaluator = SyntheticEvaluator(problem, output_directory, write_exports=args.synthetic_exports,
+                                       postprocessing_options={**postprocessing_options, "write_reports": False})
+    else:
+        # SolidWorks is started once and reused by all generations; it is restarted only when it stops responding
+        cad_session = None
+        if persistent_cad_session:
+            cad_session = SolidWorksSession(WindowsComBackend(solidworks_exe, file_path), startup_timeout=300,
+                                            poll_interval=1.0)
+        evaluator = CadCfdEvaluator(
+            output_directory,
+            template_file,
+            original_bas_file_path,
+            src_macro_file,
+            file_path,
+            cad_macros,
+            cad_session,
+            input_java_file,
+            cfd_macro_file,
+            base_sim_file,
+            cfd_job_pool,
+            cfd_cores_per_job,
+            postprocessing_options,
+            use_cfd_job_pool=use_cfd_job_pool,
+            overlap_postprocessing=overlap_postprocessing,
+            write_template_xlsx=write_template_xlsx,
+            save_sldprt=save_sldprt,
+            cad_attempts=cad_attempts,
+            warm_start=WarmStartIndex(os.path.join(output_directory, WARM_START_FILE), warm_start_max_distance)
+            if use_warm_start else None,
+            use_pipeline=use_design_pipeline,
+            pipeline_queue_size=pipeline_queue_size,
+        )
+    campaign_start = time.time()
+
+    # Per-stage timing of the campaign, python instrumentation.py report <log> prints the breakdown
+    instrumentation_log = os.path.join(output_directory, "instrumentation.jsonl")
+    instrumentation.configure(instrumentation_log)
+
+    # Persistent evaluation cache, shared by all campaigns that use the same output directory
+    cache_file = os.path.join(output_directory, "evaluation_cache.sqlite")
+    campaign_name = "Close_loop_in_silico_optimization_showcase"
+    evaluation_cache = EvaluationCache(cache_file, symmetry)
+
+    # Surrogate pre-screening: over-generate offspring and only simulate the most promising ones
+    use_surrogate = False
+    surrogate_oversampling = 4  # Candidates generated per offspring slot
+    surrogate_kappa = 1.0  # Weight of the prediction uncertainty in the selection
+    surrogate = GaussianProcessSurrogate()
+    if use_surrogate:
+        cached_designs = evaluation_cache.entries()
+        if cached_designs:
+            surrogate.update(*zip(*cached_designs))
+            print(f"Surrogate trained on {len(cached_designs)} cached designs.")
+
+    # Steady-state mode: every design is built and simulated on its own in folder S_{evaluation_id}
+    if optimization_mode == "steady_state":
+        def evaluate_design(variables, evaluation_id):
+            """
+            Evaluate a single design with the evaluator backend and store it in the evaluation cache.
+
+            :param variables: Edge indices of the design
+            :param evaluation_id: Running number of the evaluation, used for the folder name
+            :return: A tuple (obj1, obj2)
+            """
+            solution = {"variables": symmetry.canonical(variables), "objectives": [0.0, 0.0]}
+            with stage("evaluate", design=f"S_{evaluation_id}"):
+                summary_file, design_dir = evaluator.evaluate_single(solution, evaluation_id)
+                evaluate_offspring_from_file([solution], summary_file)
+                evaluation_cache.store_summary([solution], summary_file, design_dir, campaign_name)
+            return solution["objectives"][0], solution["objectives"][1]
+
+        final_population, history = run_steady_state(
+            problem,
+            evaluate_design,
+            population_size,
+            max_evaluations,
+            num_cfd_slots,
+            crossover_rate,
+            mutation_rate,
+            reference_point,
+            evaluation_cache=evaluation_cache,
+            density=density_estimator,
         )
 
-        
-    ## Run starccm+
-    input_java_file = r"D:\Close_loop_in_silico_optimization_showcase\Run_CFD.java" 
-    output_java_file = rf"C:\Program Files\Siemens\17.04.008\STAR-CCM+17.04.008\star\bin\Run_CFD_Modified.java"  
-    folder_path = rf"D:\Close_loop_in_silico_optimization_showcase\T_{i}"  
+        print("\nFinal population:")
+        for sol in final_population:
+            print(f"Variables = {sol['variables']}, Objectives = {sol['objectives']}, Rank = {sol['rank']}")
+
+        pd.DataFrame(history).to_csv(os.path.join(output_directory, "steady_state_history.csv"), index=False)
+        wait_for_reports()
+        evaluator.close()
+        sys.exit(0)
+
+    # Checkpoint of the generational loop, saved after every stage; --resume continues after the last one
+    checkpoint = CampaignCheckpoint(os.path.join(output_directory, "checkpoint.json"))
+    resume_state = checkpoint.load() if args.resume else None
+    if args.resume and resume_state is None:
+        print(f"No checkpoint in {output_directory}, starting a new campaign.")
+    hypervolume_history = []
+    if resume_state is not None:
+        set_random_state(resume_state["random_state"])
+        hypervolume_history = resume_state["hypervolume_history"]
+        print(f"Resuming generation {resume_state['generation']} after stage '{resume_state['stage']}'.")
+
+    if resume_state is None or (resume_state["generation"] == 1 and resume_state["stage"] != "survived"):
+        # Generate initial population
+        instrumentation.set_context(generation=1)
+        if resume_state is None:
+            with stage("initial_population"):
+                initial_population = generate_initial_population(problem, population_size)
+            checkpoint.save(1, "offspring", [], initial_population)
+        else:
+            initial_population = resume_state["offspring"]
+
+        # Print the initial population to the console
+        print("\nInitial Population:")
+        for idx, solution in enumerate(initial_population, 1):
+            print(f"Solution {idx}: Variables = {solution['variables']}")
+
+        if resume_state is None or resume_state["stage"] == "offspring":
+            # Only designs that are not in the evaluation cache go to SolidWorks and STAR-CCM+
+            cached_population, new_population = evaluation_cache.split_cached(initial_population)
+            # One canonical layout per class of mirror images is simulated
+            representatives, classes = symmetry.reduce(new_population)
+            print(f"{len(cached_population)} solutions found in the evaluation cache, {len(new_population)} to "
+                  f"simulate as {len(representatives)} canonical designs.")
+
+            with stage("evaluate"):
+                if representatives:
+                    summary_file, dest_dir = evaluator.evaluate(representatives, 1)
+
+                    # Assign the fitness values of the initial population and store them in the cache
+                    representatives = evaluate_offspring_from_file(representatives, summary_file)
+                    evaluation_cache.store_summary(representatives, summary_file, dest_dir, campaign_name)
+                    symmetry.map_back(representatives, classes)
+            checkpoint.save(1, "evaluated", [], initial_population)
+
+        if use_surrogate:
+            surrogate.update([sol["variables"] for sol in initial_population], [sol["objectives"] for sol in initial_population])
+
+        # Pareto archive of all evaluated designs; the hypervolume is updated after every single evaluation
+        pareto_archive = ParetoArchive(reference_point)
+        for solution in initial_population:
+            pareto_archive.insert(solution["objectives"][0], solution["objectives"][1], solution)
+        print(f"HyperVolume after the initial population: {pareto_archive.hypervolume:.4f}")
+        hypervolume_history.append((1, pareto_archive.hypervolume))
+        checkpoint.save(1, "survived", initial_population, [], pareto_archive, hypervolume_history)
+        first_generation = 2
+    else:
+        # Population and archive of the checkpoint; an unfinished generation is continued in the loop
+        initial_population = resume_state["population"]
+        pareto_archive = restore_archive(resume_state["archive"], reference_point)
+        first_generation = resume_state["generation"] + (resume_state["stage"] == "survived")
+        print(f"HyperVolume at the checkpoint: {pareto_archive.hypervolume:.4f}")
+
+
+    # Real-time plotting setup
+    plt.ion()
+    fig, ax = plt.subplots()
+    ax.set_xlim(0, 0.6)  # Mixing Index range
+    ax.set_ylim(0, 16)  # Pressure Drop range
+    ax.set_xlabel('Mixing Index')
+    ax.set_ylabel('Pressure Drop')
+    plt.title('Autonmous in-silico optimization')
+    plt.grid(True)
+
+
+    # Adjust the size and position of the window
+    if not headless:
+        manager = plt.get_current_fig_manager()
+        manager.window.setGeometry(1400, 150, 800, 500)  # x, y, width, height
+        manager.window.raise_()  # Raise the window to the front
+        manager.window.activateWindow()  # Focus the window
+
+    # Colormap for dynamic colors
+    colors = plt.get_cmap('tab10')
+
+    # Store scatter plots for each generation
+    scatter_plots = {}
+    legend_labels = []
+
+    # Initial plot setup for Generation 1
+    mixing_indices = [sol["objectives"][0] for sol in initial_population]
+    pressure_drops = [sol["objectives"][1] for sol in initial_population]
+
+    scatter_plots[f"Generation {1}"] = ax.scatter(
+        mixing_indices, pressure_drops, label="Initial population", color=colors(1 % 10)
+    )
 
-    old_string = "T_0"  
-    new_string = f"T_{i}"  
+    # Update the legend dynamically
+    ax.legend(loc='upper right')
 
-    # Update the file
-    replace_strings_and_update_population(input_java_file, output_java_file, old_string, new_string, folder_path)
-    
-    # Open CMD and run starccm+ orders
-    run_starccm(output_java_file)
-    
-    ## Data processing
-    # Specify the input folder containing CSV files and the output folder for Excel files
-    output_folder = os.path.join(dest_dir, 'output')
-    summary_file = os.path.join(output_folder, 'summary.csv')
-        
-    # Process all CSV files in the input folder and create the summary
-    process_all_csv_files(dest_dir, output_folder, summary_file)
+    # Redraw the plot
+    plt.draw()
+    plt.pause(0.1)  # Allow GUI event processing
 
-    
-    # Plotting updated population
-    # Read data from the summary CSV for the current generation
 
-    mixing_indices, pressure_drops = read_summary_csv(rf"D:\Close_loop_in_silico_optimization_showcase\T_{i}\output\summary.csv")
+    # Optimization loop
+    for i in range(first_generation, generations + 2):
+        print(f"\n--- Generation {i} ---")
+        instrumentation.set_context(generation=i)
+        # Offspring of an unfinished generation of the checkpoint, None for a new generation
+        resumed = resume_state if resume_state is not None and resume_state["generation"] == i else None
+
+        with stage("ranking"):
+            # Perform non-dominated sorting and calculate metrics
+            fronts = non_dominated_sorting(initial_population)
+            if density_estimator is not None:
+                for front in fronts:
+                    assign_density(front, density_estimator, reference_point)
+            hv = pareto_archive.hypervolume
+
+        # Display Pareto front and metrics
+        print(f"\nPareto front at generation {i}:")
+        for sol in fronts[0]:
+            print(f"Variables = {sol['variables']}, Objectives = {sol['objectives']}")
+        print(f"HyperVolume: {hv:.4f}")
+
+        if resumed is not None:
+            offspring = resumed["offspring"]
+        else:
+            with stage("offspring"):
+                # Generate offspring; with the surrogate, more candidates than needed are generated and pre-screened
+                num_candidates = population_size * surrogate_oversampling if use_surrogate else population_size
+                offspring = []
+                while len(offspring) < num_candidates:
+                    parent1 = tournament_selection(initial_population)
+                    parent2 = tournament_selection(initial_population)
+                    child1, child2 = crossover(parent1, parent2, crossover_rate, problem)
+                    off1 = mutate(child1, mutation_rate, problem)
+                    if not is_duplicate(off1, offspring):
+                        offspring.append(off1)
+                    if len(offspring) < num_candidates:
+                        off2 = mutate(child2, mutation_rate, problem)
+                        if not is_duplicate(off2, offspring):
+                            offspring.append(off2)
+
+                if use_surrogate:
+                    offspring = prescreen(surrogate, offspring, population_size, surrogate_kappa)
+            checkpoint.save(i, "offspring", initial_population, offspring, pareto_archive, hypervolume_history)
+
+        # Print offspring to console
+        print("\nGenerated Offspring Population:")
+        for idx, solution in enumerate(offspring, 1):
+            print(f"Offspring {idx}: Variables = {solution['variables']}")
+
+        if resumed is None or resumed["stage"] == "offspring":
+            # Look up the offspring in the evaluation cache; only cache misses go to SolidWorks and STAR-CCM+
+            cached_offspring, new_offspring = evaluation_cache.split_cached(offspring)
+            representatives, classes = symmetry.reduce(new_offspring)
+            print(f"{len(cached_offspring)} offspring found in the evaluation cache, {len(new_offspring)} to "
+                  f"simulate as {len(representatives)} canonical designs.")
+
+            with stage("evaluate"):
+                if representatives:
+                    summary_file, dest_dir = evaluator.evaluate(representatives, i)
+
+                    ## Automatically read fitness values for the current generation
+                    if not os.path.exists(summary_file):
+                        raise FileNotFoundError(f"Fitness file '{summary_file}' not found in folder '{dest_dir}'.")
+
+                    print(f"\nLoading fitness values for offspring from '{summary_file}'.")
+                    representatives = evaluate_offspring_from_file(representatives, summary_file)
+                    evaluation_cache.store_summary(representatives, summary_file, dest_dir, campaign_name)
+                    symmetry.map_back(representatives, classes)
+            checkpoint.save(i, "evaluated", initial_population, offspring, pareto_archive, hypervolume_history)
+
+        # Retrain the surrogate and compare its earlier predictions with the CFD results
+        if use_surrogate:
+            surrogate.update([sol["variables"] for sol in offspring], [sol["objectives"] for sol in offspring])
+            report = surrogate.error_report()
+            if report["count"]:
+                print(f"Surrogate prediction error over {report['count']} designs: "
+                      f"MAE MI = {report['mae'][0]:.4f}, MAE pressure drop = {report['mae'][1]:.4f}")
 
-    # Add scatter plot for this generation
-    scatter_plots[f"Generation {i}"] = ax.scatter(
-        mixing_indices, pressure_drops, label=f"Population {i}", color=colors(i % 10)
-    )
     
-    # Update the legend dynamically
-    ax.legend(loc='upper right')
+        with stage("plot"):
+            # Plotting updated population
+            mixing_indices = [sol["objectives"][0] for sol in offspring]
+            pressure_drops = [sol["objectives"][1] for sol in offspring]
+
+            # Add scatter plot for this generation
+            scatter_plots[f"Generation {i}"] = ax.scatter(
+                mixing_indices, pressure_drops, label=f"Population {i}", color=colors(i % 10)
+            )
     
-    # Redraw the plot
-    plt.draw()
-    plt.pause(0.1)  # Allow GUI event processing
-        
+            # Update the legend dynamically
+            ax.legend(loc='upper right')
     
-    ## Automatically read fitness values for the current generation
-    if not os.path.exists(summary_file):
-        raise FileNotFoundError(f"Fitness file '{summary_file}' not found in folder '{folder_path}'.")
-
-    print(f"\nLoading fitness values for offspring from '{summary_file}'.")
-    offspring = evaluate_offspring_from_file(offspring, summary_file)
-
-    # Combine population and offspring
-    initial_population += offspring
-
-    # Perform non-dominated sorting and select the next generation
-    fronts = non_dominated_sorting(initial_population)
-    next_generation = []
-    unique_solutions = set()  # Track unique solutions
-
-    for front in fronts:
-        for solution in front:
-            solution_tuple = tuple(sorted(solution["variables"]))
-            if solution_tuple not in unique_solutions:
-                next_generation.append(solution)
-                unique_solutions.add(solution_tuple)
-            if len(next_generation) >= population_size:
-                break
-        if len(next_generation) >= population_size:
-            break
-
-    initial_population = next_generation
-
-# Finalize plot
-plt.ioff()  # Disable interactive mode
-plt.show()  # Display the final plot
+            # Redraw the plot
+            plt.draw()
+            plt.pause(0.1)  # Allow GUI event processing
+
+
+        with stage("survival"):
+            # Update the Pareto archive and log the hypervolume after each evaluation
+            for idx, solution in enumerate(offspring, 1):
+                pareto_archive.insert(solution["objectives"][0], solution["objectives"][1], solution)
+                print(f"Offspring {idx}: Objectives = {solution['objectives']}, HyperVolume: {pareto_archive.hypervolume:.4f}")
+
+            # Combine population and offspring
+            initial_population += offspring
+
+            # Perform non-dominated sorting and select the next generation
+            initial_population = select_next_generation(initial_population, population_size, density_estimator, reference_point)
+        hypervolume_history.append((i, pareto_archive.hypervolume))
+        checkpoint.save(i, "survived", initial_population, [], pareto_archive, hypervolume_history)
+
+    wait_for_reports()
+    evaluator.close()
+    pd.DataFrame(hypervolume_history, columns=["generation", "hypervolume"]).to_csv(
+        os.path.join(output_directory, "hypervolume_history.csv"), index=False)
+    print(f"\nCampaign finished in {time.time() - campaign_start:.1f} s, HyperVolume: {pareto_archive.hypervolume:.4f}")
+
+    # Finalize plot
+    if headless:
+        fig.savefig(os.path.join(output_directory, "optimization.png"))
+    else:
+        plt.ioff()  # Disable interactive mode
+        plt.show()  # Display the final plot
 
 
 
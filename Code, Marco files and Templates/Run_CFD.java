@@ -18,6 +18,13 @@ import java.io.PrintWriter;
 public class Run_CFD_Modified extends StarMacro {
 
     public void execute() {
+        // Per-design job mode: the Python job pool starts one solver process per design and passes a job file
+        String jobFilePath = System.getenv("CFD_JOB_FILE");
+        if (jobFilePath != null && !jobFilePath.isEmpty()) {
+            executeJob(jobFilePath);
+            return;
+        }
+
         int numDesigns = population_number; 
         String baseSimFilePath = "D:\\Close_loop_in_silico_optimization_showcase\\Design_blank.sim";     
 
@@ -26,7 +33,7 @@ public class Run_CFD_Modified extends StarMacro {
             String x_tFilePath = "D:\\Close_loop_in_silico_optimization_showcase\\T_0\\Design" + i + ".x_t";
             String csvFilePath = "D:\\Close_loop_in_silico_optimization_showcase\\T_0\\Design" + i + ".csv";
 
-            executeSimulation(baseSimFilePath, simFilePath, x_tFilePath, csvFilePath);
+            executeSimulation(baseSimFilePath, simFilePath, x_tFilePath, csvFilePath, null, simFilePath.replace(".sim", ".stop"));
 
         try {
             Thread.sleep(10000); 
@@ -37,7 +44,28 @@ public class Run_CFD_Modified extends StarMacro {
         }
     }
 
-    private void executeSimulation(String baseSimFilePath, String simFilePath, String x_tFilePath, String csvFilePath) {
+    private void executeJob(String jobFilePath) {
+        // Job file keys: sim_template, sim_file, stop_file, x_t_file, csv_file, and optionally init_sim_file (warm start)
+        Properties job = new Properties();
+        try (FileReader reader = new FileReader(jobFilePath)) {
+            job.load(reader);
+        } catch (IOException e) {
+            System.err.println("Failed to read job file " + jobFilePath + ": " + e.getMessage());
+            return;
+        }
+
+        executeSimulation(job.getProperty("sim_template"), job.getProperty("sim_file"), job.getProperty("x_t_file"), job.getProperty("csv_file"), job.getProperty("init_sim_file"), job.getProperty("stop_file"));
+    }
+
+    private void executeSimulation(String baseSimFilePath, String simFilePath, String x_tFilePath, String csvFilePath, String initSimFilePath, String stopFilePath) {
+        // Warm start: load the converged simulation of the most similar design instead of the blank one. Its
+        // CAD body is replaced and remeshed like the blank one; the fields are interpolated onto the new mesh
+        // and used as the initial solution.
+        boolean warmStart = initSimFilePath != null && !initSimFilePath.isEmpty() && new java.io.File(initSimFilePath).exists();
+        if (warmStart) {
+            baseSimFilePath = initSimFilePath;
+        }
+
         // Load the base simulation file
         Simulation simulation = new Simulation(baseSimFilePath);
 
@@ -137,11 +165,29 @@ public class Run_CFD_Modified extends StarMacro {
         MeshPipelineController meshController = simulation.get(MeshPipelineController.class);
         meshController.generateVolumeMesh();
 
+        if (warmStart) {
+            // Keep the fields of the source design, restart the iteration count so the stopping criteria apply again
+            simulation.getSolution().clearSolution(Solution.Clear.History);
+            simulation.println("Initialized from " + initSimFilePath);
+        }
+
+        // Stop file of the convergence monitor (solver_monitor.py): the solver stops after the iteration in which
+        // the file appears, and the design is exported as usual
+        if (stopFilePath != null && !stopFilePath.isEmpty()) {
+            new java.io.File(stopFilePath).delete();
+            AbortFileStoppingCriterion stopFileCriterion = ((AbortFileStoppingCriterion) simulation.getSolverStoppingCriterionManager().getSolverStoppingCriterion("Stop File"));
+            stopFileCriterion.setAbsolutePath(stopFilePath);
+            stopFileCriterion.setIsUsed(true);
+            simulation.println("Stop file: " + stopFilePath);
+        }
+
         // Run simulation
         ResidualPlot residualPlot = ((ResidualPlot) simulation.getPlotManager().getPlot("Residuals"));
         residualPlot.open();
 
         simulation.getSimulationIterator().run();
+        // Read by cfd_job_pool.read_iterations
+        simulation.println("Solver iterations: " + simulation.getSimulationIterator().getCurrentIteration());
 
         // Extract data and export to CSV
         XyzInternalTable xyzTable = ((XyzInternalTable) simulation.getTableManager().getTable("mixing index"));
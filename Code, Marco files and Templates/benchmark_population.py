@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import random
+import time
+
+import numpy as np
+
+from optimization import (
+    Mixer,
+    crossover,
+    generate_initial_population,
+    is_duplicate,
+    mutate,
+    non_dominated_sorting,
+    select_next_generation,
+    tournament_selection,
+)
+from population import Population, make_offspring
+from steady_state import stand_in_objectives
+
+
+## Benchmark: one generation (offspring + survival) with solution dicts and with the array-backed Population
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def dict_generation(problem, population, population_size, reference_point):
+    """Offspring and survival as in the generation loop of Main.py."""
+    non_dominated_sorting(population)
+    offspring = []
+    while len(offspring) < population_size:
+        parent1 = tournament_selection(population)
+        parent2 = tournament_selection(population)
+        child1, child2 = crossover(parent1, parent2, 0.7, problem)
+        for child in (child1, child2):
+            child = mutate({"variables": list(child["variables"]), "objectives": [0.0, 0.0]}, 0.3, problem)
+            if len(offspring) < population_size and not is_duplicate(child, offspring):
+                offspring.append(child)
+    for solution in offspring:
+        solution["objectives"] = list(stand_in_objectives(problem, solution["variables"]))
+    return select_next_generation(population + offspring, population_size, "crowding", reference_point)
+
+
+def array_generation(problem, population, population_size, reference_point):
+    """The same generation with batched operators."""
+    offspring = make_offspring(population, population_size, 0.7, 0.3)
+    offspring.objectives = np.array([stand_in_objectives(problem, variables) for variables in offspring.designs.tolist()])
+    return population.concatenate(offspring).select(population_size, "crowding", reference_point)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    problem = Mixer()
+    reference_point = [-1.0, 50.0]
+
+    print(f"{'N':>7} {'dicts (s)':>10} {'arrays (s)':>11} {'speed-up':>9}")
+    for n in [100, 1000, 5000]:
+        solutions = generate_initial_population(problem, n)
+        for solution in solutions:
+            solution["objectives"] = list(stand_in_objectives(problem, solution["variables"]))
+        population = Population.from_solutions(problem.feasibility, solutions).select(n, "crowding", reference_point)
+
+        start = time.perf_counter()
+        array_generation(problem, population, n, reference_point)
+        array_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dict_generation(problem, solutions, n, reference_point)
+        dict_time = time.perf_counter() - start
+
+        print(f"{n:>7} {dict_time:>10.3f} {array_time:>11.3f} {dict_time / array_time:>8.1f}x")
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from export_cache import cache_folder, load_export
+from postprocessing import (PLATES, plane_position, plane_statistics, process_all_csv_files, stream_plane_statistics,
+                            wait_for_reports)
+
+
+## Benchmark of post-processing large XyzInternalTable exports
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def write_large_export(csv_file, seed, ny, nz):
+    """
+    Vectorized version of dummy_starccm.write_synthetic_export for multi-million-row exports: PS follows
+    a tanh profile in Z that widens downstream, the pressure drop is appended to the first data row.
+    """
+    rng = np.random.default_rng(seed)
+    mixing_rate = rng.uniform(0.1, 0.8)
+    pressure_drop = 2.0 + 12.0 * mixing_rate ** 1.5
+
+    plate_index, iz, iy = np.meshgrid(np.arange(len(PLATES)), np.arange(nz), np.arange(ny), indexing='ij')
+    x = np.array([plane_position(position) for _, position in PLATES])[plate_index.ravel()]
+    z = np.round(-0.00025 + iz.ravel() * 0.0005 / (nz - 1), 9)
+    y = np.round(-0.0005 + iy.ravel() * 0.001 / (ny - 1), 9)
+    width = 0.1 + mixing_rate * plate_index.ravel()
+    ps = np.clip(0.5 + 0.5 * np.tanh(z / 0.00025 / width) + rng.normal(0.0, 0.01, len(x)), 0.0, 1.0)
+
+    df = pd.DataFrame({
+        'X (m)': x, 'Y (m)': y, 'Z (m)': z, 'PS': np.round(ps, 6),
+        'Pressure (Pa)': np.round(pressure_drop * (1 - x / 0.006), 6), 'Pressure_drop': np.nan,
+    })
+    df.loc[0, 'Pressure_drop'] = pressure_drop
+    df.to_csv(csv_file, index=False)
+
+
+def legacy_plate_mi(df):
+    """MI of the five plates as computed by the original process_csv (one filtered copy and pivot per plate)."""
+    plates = {
+        'plate1': df[df['X (m)'] <= 0.001],
+        'plate2': df[df['X (m)'] == 0.002],
+        'plate3': df[df['X (m)'] == 0.003],
+        'plate4': df[df['X (m)'] == 0.004],
+        'plate5': df[df['X (m)'] == 0.005]
+    }
+    mi_values = {}
+    for plate_name, plate_data in plates.items():
+        pivot_table = plate_data.pivot_table(values='PS', index='Z (m)', columns='Y (m)', aggfunc='mean')
+        pivot_table['Average'] = pivot_table.mean(axis=1)
+        pivot_table['(c-ci)^2'] = (pivot_table['Average'] - 0.5) ** 2
+        mi_values[plate_name] = 1 - (np.sqrt(pivot_table['(c-ci)^2'].mean()) / 0.5)
+    return mi_values
+
+
+def full_read_legacy(csv_file):
+    df = pd.read_csv(csv_file)
+    return legacy_plate_mi(df), df.iloc[0, 5]
+
+
+def full_read_vectorized(csv_file):
+    df = pd.read_csv(csv_file)
+    statistics = plane_statistics(df['X (m)'].to_numpy(), df['Y (m)'].to_numpy(), df['Z (m)'].to_numpy(),
+                                  df['PS'].to_numpy())
+    return {name: values['MI'] for name, values in statistics.items()}, df.iloc[0, 5]
+
+
+def streaming(csv_file):
+    statistics, pressure_drop = stream_plane_statistics(csv_file)
+    return {name: values['MI'] for name, values in statistics.items()}, pressure_drop
+
+
+def cached(csv_file):
+    columns, pressure_drop = load_export(csv_file)
+    statistics = plane_statistics(columns['X (m)'], columns['Y (m)'], columns['Z (m)'], columns['PS'])
+    return {name: values['MI'] for name, values in statistics.items()}, pressure_drop
+
+
+def cached_cold(csv_file):
+    shutil.rmtree(cache_folder(csv_file), ignore_errors=True)
+    return cached(csv_file)
+
+
+def measure(function, *args):
+    """Wall time and peak traced memory (MB) of one call; memory-mapped pages are not traced."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def benchmark_folder(folder, num_designs=16, ny=200, nz=100):
+    """Time process_all_csv_files on a generation of exports, serial and with worker processes."""
+    for k in range(1, num_designs + 1):
+        write_large_export(os.path.join(folder, f"Design{k}.csv"), k, ny, nz)
+    output_folder = os.path.join(folder, 'output')
+    summary_file = os.path.join(output_folder, 'summary.csv')
+
+    print(f"\n{num_designs} designs of {len(PLATES) * ny * nz} rows, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'reports':>9} {'summary (s)':>12} {'with reports (s)':>17} {'same summary':>13}")
+    reference = None
+    for num_workers in sorted({1, 4, os.cpu_count() or 1}):
+        for write_reports in [True, False, "deferred"]:
+            start = time.perf_counter()
+            process_all_csv_files(folder, output_folder, summary_file, num_workers=num_workers,
+                                  write_reports=write_reports)
+            summary_time = time.perf_counter() - start
+            wait_for_reports()
+            total_time = time.perf_counter() - start
+            summary = pd.read_csv(summary_file)
+            reference = summary if reference is None else reference
+            print(f"{num_workers:>8} {str(write_reports):>9} {summary_time:>12.2f} {total_time:>17.2f} "
+                  f"{str(summary.equals(reference)):>13}")
+
+
+if __name__ == "__main__":
+    # Grid sizes per plane (ny, nz); rows = 5 * ny * nz
+    sizes = [(400, 250), (800, 500), (1000, 1000)] if len(sys.argv) < 2 else [tuple(map(int, sys.argv[1].split('x')))]
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'rows':>10} {'MB on disk':>11} {'method':>22} {'time (s)':>9} {'peak (MB)':>10} {'max |dMI|':>10}")
+        for ny, nz in sizes:
+            csv_file = os.path.join(folder, f"Design_{ny}x{nz}.csv")
+            write_large_export(csv_file, 0, ny, nz)
+            rows = len(PLATES) * ny * nz
+            size = os.path.getsize(csv_file) / 1e6
+
+            reference = None
+            for label, function in [("pandas + pivot tables", full_read_legacy),
+                                    ("pandas + single pass", full_read_vectorized),
+                                    ("streaming", streaming),
+                                    ("binary cache, cold", cached_cold),
+                                    ("binary cache, warm", cached)]:
+                elapsed, peak, (mi_values, pressure_drop) = measure(function, csv_file)
+                reference = reference or mi_values
+                difference = max(abs(mi_values[name] - reference[name]) for name in reference)
+                print(f"{rows:>10} {size:>11.1f} {label:>22} {elapsed:>9.2f} {peak:>10.1f} {difference:>10.1e}")
+            shutil.rmtree(cache_folder(csv_file), ignore_errors=True)
+            os.remove(csv_file)
+
+        benchmark_folder(folder)
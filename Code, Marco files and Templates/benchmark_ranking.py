@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import random
+import time
+
+import numpy as np
+
+from optimization import dominates_solution, identify_pareto_front, non_dominated_sorting
+from ranking import _ranks_nd, non_dominated_ranks, to_minimization
+
+
+## Benchmark of non-dominated sorting and Pareto-front extraction
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def reference_non_dominated_sorting(population):
+    """The original O(N^2) pairwise sorting on solution dicts, used to check the ranking engine."""
+    fronts = []
+    domination_counts = [0] * len(population)
+    dominates = [set() for _ in range(len(population))]
+
+    for i, sol_i in enumerate(population):
+        for j, sol_j in enumerate(population):
+            if dominates_solution(sol_i, sol_j):
+                dominates[i].add(j)
+            elif dominates_solution(sol_j, sol_i):
+                domination_counts[i] += 1
+        if domination_counts[i] == 0:
+            sol_i["rank"] = 0
+            if len(fronts) == 0:
+                fronts.append([])
+            fronts[0].append(i)
+
+    current_rank = 0
+    while len(fronts[current_rank]) > 0:
+        next_front = []
+        for i in fronts[current_rank]:
+            for j in dominates[i]:
+                domination_counts[j] -= 1
+                if domination_counts[j] == 0:
+                    population[j]["rank"] = current_rank + 1
+                    next_front.append(j)
+        fronts.append(next_front)
+        current_rank += 1
+
+    return [sol["rank"] for sol in population]
+
+
+def synthetic_objectives(n, seed=0):
+    """Random (MI, pressure drop) pairs with ties, as produced by the cached evaluations."""
+    rng = np.random.default_rng(seed)
+    mi = np.round(rng.uniform(0.1, 0.6, n), 3)
+    pressure_drop = np.round(2 + 10 * mi + rng.normal(0, 1.5, n), 2)
+    return np.column_stack([mi, pressure_drop])
+
+
+def as_population(objectives):
+    return [{"variables": [], "objectives": list(row)} for row in objectives.tolist()]
+
+
+def timed(function, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    random.seed(0)
+
+    # Correctness against the original pairwise sorting and the generic n-objective path
+    for n in [10, 100, 1000]:
+        objectives = synthetic_objectives(n, seed=n)
+        expected = reference_non_dominated_sorting(as_population(objectives))
+        assert non_dominated_ranks(objectives).tolist() == expected, f"rank mismatch for N = {n}"
+        assert _ranks_nd(to_minimization(objectives)).tolist() == expected, f"n-objective mismatch for N = {n}"
+    print("Ranks match the original non_dominated_sorting.\n")
+
+    print(f"{'N':>8} {'ranks (s)':>12} {'sorting (s)':>12} {'pareto (s)':>12} {'original (s)':>13} {'fronts':>7}")
+    for n in [10, 100, 1000, 10000, 100000]:
+        objectives = synthetic_objectives(n)
+        population = as_population(objectives)
+
+        ranks_time, ranks = timed(non_dominated_ranks, objectives)
+        sorting_time, _ = timed(non_dominated_sorting, population)
+        pareto_time, _ = timed(identify_pareto_front, population, n // 10 + 1)
+        if n <= 1000:
+            original_time, _ = timed(reference_non_dominated_sorting, as_population(objectives), repeat=1)
+            original = f"{original_time:13.4f}"
+        else:
+            original = f"{'-':>13}"
+
+        print(f"{n:>8} {ranks_time:12.4f} {sorting_time:12.4f} {pareto_time:12.4f} {original} {ranks.max() + 1:>7}")
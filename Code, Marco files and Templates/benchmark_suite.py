@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark_population import array_generation, dict_generation
+from benchmark_postprocessing import write_large_export
+from benchmark_ranking import as_population, synthetic_objectives
+from optimization import Mixer, calculate_hypervolume, generate_initial_population, identify_pareto_front, non_dominated_sorting
+from population import Population
+from postprocessing import PLATES, process_all_csv_files, process_csv
+from steady_state import stand_in_objectives
+
+
+## Benchmark suite of the optimizer and post-processing hot paths
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# python benchmark_suite.py                      quick scales, results in benchmark_results/{commit}.json
+# python benchmark_suite.py --full               adds the largest scales (10^5 solutions, 10^7-row exports)
+# python benchmark_suite.py --compare a.json b.json   ratios of b over a, slower cases flagged
+#
+# Every case is run `repeat` times after one warm-up call; best and median wall times are stored.
+
+SCALES = {
+    "repair": ([100, 1000, 10000], [100000]),
+    "ranking": ([10, 100, 1000, 10000], [100000]),
+    "hypervolume": ([10, 100, 1000, 10000], [100000]),
+    "generation": ([100, 1000], [5000]),
+    "process_csv": ([10 ** 4, 10 ** 5, 10 ** 6], [10 ** 7]),
+    "process_all_csv_files": ([10 ** 4, 10 ** 5], [10 ** 6]),
+}
+REGRESSION_THRESHOLD = 1.2  # Flag cases at least 20 % slower in --compare
+NOISE_FLOOR = 1e-3  # Cases faster than this (s) are reported but not flagged, their timing is mostly noise
+
+
+def measure(function, repeat):
+    """Best and median wall time of repeat calls, after one warm-up call."""
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def repair_inputs(problem, n, adversarial, seed=0):
+    """
+    n layouts for Mixer.repair_solution: random draws of 4 edges, or adversarial ones (infeasible layouts
+    blocking the channel, and layouts with repeated edges).
+    """
+    rng = np.random.default_rng(seed)
+    if not adversarial:
+        return rng.integers(1, len(problem.edges) + 1, size=(n, problem.num_variables)).tolist()
+    table = problem.feasibility
+    blocked = table.layouts[~table.feasible] + 1
+    layouts = blocked[rng.integers(len(blocked), size=n)].tolist()
+    for layout in layouts[::4]:
+        layout[1] = layout[0]
+    return layouts
+
+
+def front_points(n, seed=0):
+    """n mutually non-dominated (MI, pressure drop) points."""
+    rng = np.random.default_rng(seed)
+    mi = np.sort(rng.uniform(0.1, 0.6, n))
+    pressure_drop = 2 + 10 * mi + np.sort(rng.uniform(0, 1, n))
+    return np.column_stack([mi, pressure_drop]).tolist()
+
+
+def export_shape(rows):
+    """(ny, nz) of an export with about rows rows over the five plates."""
+    per_plate = max(rows // len(PLATES), 4)
+    nz = max(int(np.sqrt(per_plate / 2)), 2)
+    return per_plate // nz, nz
+
+
+def run_suite(full=False, repeat=3, cases=None):
+    """
+    Run the benchmark cases.
+
+    :param full: Include the largest scales
+    :param repeat: Timed calls per case
+    :param cases: Optional list of case groups (keys of SCALES) to run
+    :return: List of result dicts
+    """
+    random.seed(0)
+    problem = Mixer()
+    reference_point = [-1.0, 50.0]
+    results = []
+
+    def scales(group):
+        quick, large = SCALES[group]
+        return quick + large if full else quick
+
+    def record(group, name, n, function, case_repeat=repeat, **params):
+        best, median = measure(function, case_repeat)
+        results.append({"group": group, "name": name, "n": n, "params": params, "repeat": case_repeat,
+                        "best": best, "median": median, "unit": "s"})
+        print(f"{group:>22} {name:>28} {n:>10} {best:>11.5f} {median:>11.5f}")
+
+    print(f"{'group':>22} {'case':>28} {'n':>10} {'best (s)':>11} {'median (s)':>11}")
+    selected = cases or list(SCALES)
+
+    if "repair" in selected:
+        for n in scales("repair"):
+            for adversarial in (False, True):
+                layouts = repair_inputs(problem, n, adversarial)
+                record("repair", "repair_solution " + ("adversarial" if adversarial else "random"), n,
+                       lambda: [problem.repair_solution(layout) for layout in layouts])
+
+    if "ranking" in selected:
+        for n in scales("ranking"):
+            population = as_population(synthetic_objectives(n))
+            record("ranking", "non_dominated_sorting", n, lambda: non_dominated_sorting(population))
+            record("ranking", "identify_pareto_front", n, lambda: identify_pareto_front(population, n // 10 + 1))
+
+    if "hypervolume" in selected:
+        for n in scales("hypervolume"):
+            front = front_points(n)
+            record("hypervolume", "calculate_hypervolume", n, lambda: calculate_hypervolume(front, reference_point))
+
+    if "generation" in selected:
+        for n in scales("generation"):
+            solutions = generate_initial_population(problem, n)
+            for solution in solutions:
+                solution["objectives"] = list(stand_in_objectives(problem, solution["variables"]))
+            population = Population.from_solutions(problem.feasibility, solutions).select(n, "crowding",
+                                                                                          reference_point)
+            # The dict generation is quadratic in N, it is timed once at the larger scales
+            record("generation", "offspring + survival (dicts)", n,
+                   lambda: dict_generation(problem, [dict(s) for s in solutions], n, reference_point),
+                   case_repeat=repeat if n <= 1000 else 1)
+            record("generation", "offspring + survival (arrays)", n,
+                   lambda: array_generation(problem, population, n, reference_point))
+
+    if "process_csv" in selected or "process_all_csv_files" in selected:
+        folder = tempfile.mkdtemp()
+        try:
+            output_folder = os.path.join(folder, "output")
+            for rows in scales("process_csv") if "process_csv" in selected else []:
+                ny, nz = export_shape(rows)
+                csv_file = os.path.join(folder, "single", "Design1.csv")
+                os.makedirs(os.path.dirname(csv_file), exist_ok=True)
+                write_large_export(csv_file, 0, ny, nz)
+                size = len(PLATES) * ny * nz
+                case_repeat = repeat if rows < 10 ** 6 else 1
+                record("process_csv", "process_csv", size,
+                       lambda: process_csv(csv_file, output_folder, write_report=False), case_repeat=case_repeat)
+                record("process_csv", "process_csv chunked", size,
+                       lambda: process_csv(csv_file, output_folder, chunksize=500_000, write_report=False),
+                       case_repeat=case_repeat, chunksize=500_000)
+                shutil.rmtree(os.path.dirname(csv_file))
+
+            num_designs = 8
+            for rows in scales("process_all_csv_files") if "process_all_csv_files" in selected else []:
+                ny, nz = export_shape(rows)
+                generation_folder = os.path.join(folder, "generation")
+                os.makedirs(generation_folder, exist_ok=True)
+                for k in range(1, num_designs + 1):
+                    write_large_export(os.path.join(generation_folder, f"Design{k}.csv"), k, ny, nz)
+                summary_file = os.path.join(output_folder, "summary.csv")
+                record("process_all_csv_files", f"{num_designs} designs, summary only", len(PLATES) * ny * nz,
+                       lambda: process_all_csv_files(generation_folder, output_folder, summary_file,
+                                                     write_reports=False),
+                       case_repeat=1, designs=num_designs)
+                shutil.rmtree(generation_folder)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    return results
+
+
+def environment():
+    """Commit, interpreter, library versions and machine of the run."""
+    folder = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=folder, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain"], cwd=folder, capture_output=True,
+                                    text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = "unknown", False
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(baseline_file, current_file, threshold=REGRESSION_THRESHOLD, noise_floor=NOISE_FLOOR):
+    """
+    Print the ratio of the best times of two result files, case by case.
+
+    :return: Number of cases slower than threshold times the baseline
+    """
+    with open(baseline_file, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(current_file, 'r', encoding='utf-8') as file:
+        current = json.load(file)
+    reference = {(r["group"], r["name"], r["n"]): r["best"] for r in baseline["results"]}
+
+    print(f"{baseline['environment']['commit']} -> {current['environment']['commit']}")
+    print(f"{'case':>50} {'n':>10} {'before (s)':>11} {'after (s)':>11} {'ratio':>7}")
+    regressions = 0
+    for result in current["results"]:
+        key = (result["group"], result["name"], result["n"])
+        if key not in reference:
+            continue
+        ratio = result["best"] / reference[key] if reference[key] > 0 else float('inf')
+        slower = ratio >= threshold and max(result["best"], reference[key]) >= noise_floor
+        flag = " slower" if slower else ""
+        regressions += slower
+        print(f"{result['group'] + ': ' + result['name']:>50} {result['n']:>10} {reference[key]:>11.5f} "
+              f"{result['best']:>11.5f} {ratio:>7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark suite of the optimizer and post-processing.")
+    parser.add_argument("--full", action="store_true", help="Include the largest scales")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls per case")
+    parser.add_argument("--cases", nargs="+", choices=list(SCALES), help="Case groups to run")
+    parser.add_argument("--output", help="Result file (default: benchmark_results/{commit}.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare) else 0)
+
+    info = environment()
+    results = run_suite(args.full, args.repeat, args.cases)
+    output_file = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results",
+                                              f"{info['commit']}{'-dirty' if info['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as file:
+        json.dump({"environment": info, "full": args.full, "results": results}, file, indent=2)
+    print(f"\nResults saved to: {output_file}")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import random
+import statistics
+
+import numpy as np
+
+from evaluation_cache import design_key
+from hypervolume import ParetoArchive
+from optimization import (
+    Mixer,
+    calculate_hypervolume,
+    crossover,
+    generate_initial_population,
+    is_duplicate,
+    mutate,
+    non_dominated_sorting,
+    select_next_generation,
+    tournament_selection,
+)
+from ranking import pareto_front_indices
+from steady_state import stand_in_objectives
+
+
+## Benchmark: evaluations needed to reach a target hypervolume with different survival schemes
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Every distinct design counts as one evaluation (one CFD run); designs seen before are free, as with the
+# evaluation cache. The synthetic evaluator is the analytic stand-in of steady_state.py.
+
+def optimal_hypervolume(problem, reference_point):
+    """Hypervolume of the true Pareto front, by enumerating all feasible layouts."""
+    table = problem.feasibility
+    layouts = table.layouts[table.feasible_rows] + 1
+    objectives = np.array([stand_in_objectives(problem, list(layout)) for layout in layouts])
+    front = np.unique(objectives[pareto_front_indices(objectives)], axis=0)
+    return calculate_hypervolume(front.tolist(), reference_point)
+
+
+def run_ga(problem, population_size, max_evaluations, target_hv, density, reference_point,
+           crossover_rate=0.7, mutation_rate=0.3):
+    """
+    Generational loop of Main.py on the synthetic evaluator.
+
+    :return: Number of evaluations when the archive hypervolume reached target_hv (None if never reached)
+    """
+    evaluated = {}
+    archive = ParetoArchive(reference_point)
+
+    def evaluate(population):
+        for solution in population:
+            key = design_key(solution["variables"])
+            if key not in evaluated:
+                evaluated[key] = stand_in_objectives(problem, solution["variables"])
+                archive.insert(*evaluated[key])
+                if archive.hypervolume >= target_hv:
+                    return True
+            solution["objectives"] = list(evaluated[key])
+        return False
+
+    population = generate_initial_population(problem, population_size)
+    if evaluate(population):
+        return len(evaluated)
+    population = select_next_generation(population, population_size, density, reference_point)
+
+    while len(evaluated) < max_evaluations:
+        non_dominated_sorting(population)
+        offspring = []
+        attempts = 0
+        while len(offspring) < population_size and attempts < 100 * population_size:
+            attempts += 1
+            parent1 = tournament_selection(population)
+            parent2 = tournament_selection(population)
+            child1, child2 = crossover(parent1, parent2, crossover_rate, problem)
+            for child in (child1, child2):
+                child = mutate({"variables": list(child["variables"]), "objectives": [0.0, 0.0]}, mutation_rate, problem)
+                if len(offspring) < population_size and not is_duplicate(child, offspring):
+                    offspring.append(child)
+
+        if evaluate(offspring):
+            return len(evaluated)
+        population = select_next_generation(population + offspring, population_size, density, reference_point)
+    return None
+
+
+if __name__ == "__main__":
+    problem = Mixer()
+    reference_point = [-1.0, 50.0]
+    population_size = 8
+    max_evaluations = 400
+    runs = 30
+
+    best_hv = optimal_hypervolume(problem, reference_point)
+    target_hv = 0.995 * best_hv
+    print(f"Optimal HyperVolume {best_hv:.4f}, target {target_hv:.4f} (99.5 %)\n")
+
+    print(f"{'survival':>12} {'reached':>8} {'median evals':>13} {'mean evals':>11}")
+    for density in [None, "crowding", "hypervolume"]:
+        counts = []
+        for seed in range(runs):
+            random.seed(seed)
+            result = run_ga(problem, population_size, max_evaluations, target_hv, density, reference_point)
+            # Runs that miss the target count with the whole budget
+            counts.append(result if result is not None else max_evaluations)
+        reached = len([count for count in counts if count < max_evaluations])
+        label = density or "list order"
+        print(f"{label:>12} {reached:>5}/{runs} {statistics.median(counts):>13.1f} {statistics.mean(counts):>11.1f}")
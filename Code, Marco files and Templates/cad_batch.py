@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import os
+import random
+import time
+
+from geometry import BLOCK_FIELDS, format_geometry
+
+
+## Manifest-driven CAD batches
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Creating3D.bas builds every design listed in the manifest of its folder (cad_manifest.csv, next to the
+# copy of test.swp that runs it), so the macro itself is the same for every generation and population size:
+#
+#   design_id,part_template,x_t_file,sldprt_file,block1_x1,...,block4_angle
+#   Design1,D:\...\Blank.SLDPRT,D:\...\T_3\Design1.x_t,D:\...\T_3\Design1.SLDPRT,-0.0052192130000000001,...
+#
+# Designs whose .x_t file already exists are skipped. For every design the macro appends
+# "design_id,status,error code,seconds" to cad_status.csv, status being built, skipped or failed; cad_report
+# combines it with the files on disk.
+
+MANIFEST_FILE = "cad_manifest.csv"
+STATUS_FILE = "cad_status.csv"
+MANIFEST_COLUMNS = (["design_id", "part_template", "x_t_file", "sldprt_file"] +
+                    [f"block{b}_{field}" for b in range(1, 5) for field in BLOCK_FIELDS])
+
+
+def write_cad_manifest(population, folder, part_template, design_ids=None, save_sldprt=True):
+    """
+    Write the manifest of a CAD batch.
+
+    :param population: List of solutions
+    :param folder: Folder of the batch; the models are saved there
+    :param part_template: Blank part the obstacles are cut into (Blank.SLDPRT)
+    :param design_ids: Names of the designs, Design1..Design{n} by default
+    :param save_sldprt: Also save the SolidWorks part of every design, not only the .x_t file
+    :return: Path to the manifest
+    """
+    design_ids = design_ids or [f"Design{k}" for k in range(1, len(population) + 1)]
+    os.makedirs(folder, exist_ok=True)
+    manifest_file = os.path.join(folder, MANIFEST_FILE)
+    temporary_file = manifest_file + ".tmp"
+    with open(temporary_file, 'w', encoding='utf-8', newline='\r\n') as file:
+        file.write(",".join(MANIFEST_COLUMNS) + "\n")
+        for design_id, values in zip(design_ids, format_geometry(population)):
+            sldprt_file = os.path.join(folder, f"{design_id}.SLDPRT") if save_sldprt else ""
+            row = [design_id, part_template, os.path.join(folder, f"{design_id}.x_t"), sldprt_file] + values
+            if any("," in field for field in row[:4]):
+                raise ValueError(f"Paths in the CAD manifest must not contain commas: {row[:4]}")
+            file.write(",".join(row) + "\n")
+    os.replace(temporary_file, manifest_file)
+    print(f"CAD manifest of {len(design_ids)} designs saved to '{manifest_file}'.")
+    return manifest_file
+
+
+def read_cad_manifest(folder):
+    """Rows of the manifest of a folder as dicts, in design order."""
+    with open(os.path.join(folder, MANIFEST_FILE), 'r', encoding='utf-8') as file:
+        lines = [line.rstrip('\r\n') for line in file if line.strip()]
+    header = lines[0].split(",")
+    return [dict(zip(header, line.split(","))) for line in lines[1:]]
+
+
+def cad_report(folder):
+    """
+    Per-design result of the CAD batches of a folder: the last status reported by the macro, and whether the
+    .x_t file exists.
+
+    :return: List of dicts {design, status, code, seconds, x_t}, in manifest order; status is "missing" for
+             designs the macro did not report (e.g. SolidWorks crashed before)
+    """
+    reported = {}
+    status_file = os.path.join(folder, STATUS_FILE)
+    if os.path.exists(status_file):
+        with open(status_file, 'r', encoding='utf-8', errors='replace') as file:
+            for line in file:
+                fields = [field.strip() for field in line.split(",")]
+                if len(fields) == 4:
+                    reported[fields[0]] = fields[1:]
+
+    report = []
+    for row in read_cad_manifest(folder):
+        status, code, seconds = reported.get(row["design_id"], ("missing", "", ""))
+        x_t_file = row["x_t_file"]
+        report.append({
+            "design": row["design_id"],
+            "status": status,
+            "code": int(code) if code.lstrip("-").isdigit() else None,
+            "seconds": float(seconds) if seconds else None,
+            "x_t": os.path.exists(x_t_file) and os.path.getsize(x_t_file) > 0,
+        })
+    return report
+
+
+def run_cad_batch(folder, run_macro, max_attempts=2):
+    """
+    Run the CAD macro on the manifest of a folder until every design has its .x_t file. Later attempts only
+    build the designs that failed, the macro skips the others.
+
+    :param folder: Folder containing the manifest
+    :param run_macro: Callable running test.swp / Creating3D.bas once, e.g. a SolidWorksSession.run_macros call
+    :param max_attempts: Macro runs before giving up
+    :return: Report of cad_report
+    """
+    status_file = os.path.join(folder, STATUS_FILE)
+    if os.path.exists(status_file):
+        os.remove(status_file)
+
+    for attempt in range(1, max_attempts + 1):
+        run_macro()
+        report = cad_report(folder)
+        counts = {status: sum(r["status"] == status for r in report) for status in ("built", "skipped", "failed")}
+        missing = [r for r in report if not r["x_t"]]
+        print(f"CAD batch (attempt {attempt}): {counts['built']} built, {counts['skipped']} skipped, "
+              f"{counts['failed']} failed, {len(missing)} without .x_t file.")
+        for r in missing:
+            print(f"    {r['design']}: {r['status']}" + (f" (error {r['code']})" if r["code"] else ""))
+        if not missing:
+            return report
+    raise RuntimeError(f"CAD failed for {', '.join(r['design'] for r in missing)} after {max_attempts} attempts.")
+
+
+def emulate_cad_macro(folder, build_time=0.0, failure_rate=0.0, rng=None):
+    """
+    Python stand-in for Creating3D.bas, for running and timing the batch logic without SolidWorks: follows
+    the manifest, skips existing .x_t files, writes placeholder models and reports every design.
+    """
+    rng = rng or random.Random(0)
+    with open(os.path.join(folder, STATUS_FILE), 'a', encoding='utf-8') as status_file:
+        for row in read_cad_manifest(folder):
+            start = time.time()
+            x_t_file = row["x_t_file"]
+            if os.path.exists(x_t_file) and os.path.getsize(x_t_file) > 0:
+                status, code = "skipped", 0
+            elif rng.random() < failure_rate:
+                status, code = "failed", 1
+            else:
+                time.sleep(build_time)
+                geometry = ",".join(row[column] for column in MANIFEST_COLUMNS[4:])
+                with open(x_t_file, 'w', encoding='utf-8') as file:
+                    file.write(f"placeholder model of {row['design_id']}: {geometry}\n")
+                status, code = "built", 0
+            status_file.write(f"{row['design_id']},{status},{code},{time.time() - start:.2f}\n")
+            status_file.flush()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from optimization import Mixer, generate_initial_population
+
+    # A population far larger than the two rows the macro used to build, with designs failing at random
+    population = generate_initial_population(Mixer(), 200)
+    folder = tempfile.mkdtemp()
+    write_cad_manifest(population, folder, r"D:\Close_loop_in_silico_optimization_showcase\Blank.SLDPRT")
+    rng = random.Random(1)
+    start = time.perf_counter()
+    report = run_cad_batch(folder, lambda: emulate_cad_macro(folder, failure_rate=0.05, rng=rng), max_attempts=3)
+    print(f"{sum(r['x_t'] for r in report)}/{len(population)} designs built in {time.perf_counter() - start:.2f} s")
+
+    # A second run (e.g. after a restart) skips every design
+    report = run_cad_batch(folder, lambda: emulate_cad_macro(folder, rng=rng))
+    print(f"Second run: {sum(r['status'] == 'skipped' for r in report)} designs skipped")
+
+    # The same folder reused for other designs: the stale models are removed first, as in main.py, so every
+    # design is built again from its own geometry
+    from checkpoint import clear_design_files, manifest_matches, write_manifest
+
+    write_manifest(folder, population)
+    other = generate_initial_population(Mixer(), 200)
+    removed = clear_design_files(folder) if not manifest_matches(folder, other) else []
+    write_manifest(folder, other)
+    write_cad_manifest(other, folder, r"D:\Close_loop_in_silico_optimization_showcase\Blank.SLDPRT")
+    report = run_cad_batch(folder, lambda: emulate_cad_macro(folder, rng=rng))
+    assert all(r["status"] == "built" for r in report), "Models of the earlier designs were reused"
+    for k, values in enumerate(format_geometry(other), start=1):
+        with open(os.path.join(folder, f"Design{k}.x_t"), 'r', encoding='utf-8') as file:
+            assert file.read().strip().endswith(",".join(values)), f"Design{k}.x_t holds the geometry of another design"
+    print(f"Folder reused for other designs: {len(removed)} stale files removed, "
+          f"{sum(r['status'] == 'built' for r in report)} designs built again")
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import os
+import random
+import subprocess
+import threading
+import time
+
+from instrumentation import record
+
+
+## COM backends
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# A backend launches the CAD application and connects to its COM object. The session below only talks to
+# the backend, so the same start-up, health check and restart logic runs against SolidWorks on Windows and
+# against FakeComBackend on any platform.
+
+class WindowsComBackend:
+    """
+    SolidWorks through pywin32. win32com and pythoncom are imported when used, so this module can be imported
+    on machines without them.
+    """
+    def __init__(self, executable, file_path=None, program_id="SldWorks.Application"):
+        """
+        :param executable: Path to SLDWORKS.exe
+        :param file_path: Optional document opened at start-up (e.g. Blank.SLDPRT)
+        :param program_id: COM ProgID of the application
+        """
+        self.executable = executable
+        self.file_path = file_path
+        self.program_id = program_id
+
+    def initialize(self):
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def uninitialize(self):
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+    def launch(self):
+        if not os.path.exists(self.executable):
+            raise FileNotFoundError(f"SolidWorks executable path does not exist: {self.executable}")
+        command = [self.executable] + ([self.file_path] if self.file_path else [])
+        print(f"Executing command: {subprocess.list2cmdline(command)}")
+        return subprocess.Popen(command)
+
+    def connect(self):
+        """The running application object; raises while it is not registered yet."""
+        import win32com.client
+        return win32com.client.GetActiveObject(self.program_id)
+
+    def kill(self, process):
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+
+
+class FakeComError(Exception):
+    """Stands in for pywintypes.com_error."""
+
+
+class FakeProcess:
+    """Process handle of the fake application, with the subset of subprocess.Popen used by the session."""
+    def __init__(self, startup_time):
+        self.pid = random.randint(1000, 99999)
+        self.launched = time.monotonic()
+        self.startup_time = startup_time
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.returncode = 1
+
+    @property
+    def ready(self):
+        return self.returncode is None and time.monotonic() - self.launched >= self.startup_time
+
+
+class FakeSolidWorks:
+    """
+    Fake SolidWorks application object. Every call fails like a COM call to a dead server once the process
+    has exited; RunMacro takes macro_time seconds and crashes the process with probability crash_rate.
+    """
+    def __init__(self, process, macro_time, crash_rate, rng):
+        self.process = process
+        self.macro_time = macro_time
+        self.crash_rate = crash_rate
+        self.rng = rng
+        self.Visible = False
+        self.StartupProcessCompleted = True
+        self.macros_run = 0
+
+    def _check(self):
+        if self.process.poll() is not None:
+            raise FakeComError("The RPC server is unavailable.")
+
+    def RevisionNumber(self):
+        self._check()
+        return "32.1.0"
+
+    def RunMacro(self, macro_path, module, procedure):
+        self._check()
+        time.sleep(self.macro_time)
+        if self.rng.random() < self.crash_rate:
+            self.process.terminate()
+            raise FakeComError("The remote procedure call failed.")
+        self.macros_run += 1
+        return True
+
+    def CloseAllDocuments(self, include_unsaved=True):
+        self._check()
+        return True
+
+    def Quit(self):
+        self._check()
+        self.process.returncode = 0
+
+
+class FakeComBackend:
+    """
+    Backend without SolidWorks: the application becomes available startup_time seconds after launch and
+    its macros crash it with probability crash_rate. launches counts the cold starts.
+    """
+    def __init__(self, startup_time=1.0, macro_time=0.1, crash_rate=0.0, seed=0):
+        self.startup_time = startup_time
+        self.macro_time = macro_time
+        self.crash_rate = crash_rate
+        self.rng = random.Random(seed)
+        self.process = None
+        self.launches = 0
+
+    def initialize(self):
+        pass
+
+    def uninitialize(self):
+        pass
+
+    def launch(self):
+        self.launches += 1
+        self.process = FakeProcess(self.startup_time)
+        return self.process
+
+    def connect(self):
+        if self.process is None or not self.process.ready:
+            raise FakeComError("Operation unavailable.")
+        return FakeSolidWorks(self.process, self.macro_time, self.crash_rate, self.rng)
+
+    def kill(self, process):
+        process.terminate()
+
+
+## Persistent CAD session
+# ----------------------------------------------------------------------------------------------------------------------------
+
+class SolidWorksSession:
+    """
+    SolidWorks session shared by all generations: the application is started once, polled until its COM
+    object answers, and only restarted when the process died or a COM call failed.
+
+    Usage:
+        session = SolidWorksSession(WindowsComBackend(solidworks_exe, blank_part))
+        session.run_macros(macro_file, [("Module1", "main"), ("Module2", "main")])  # Every generation
+        session.close()  # End of the campaign
+    """
+    def __init__(self, backend, startup_timeout=300.0, poll_interval=1.0, max_restarts=2, visible=True):
+        """
+        :param backend: WindowsComBackend or FakeComBackend
+        :param startup_timeout: Seconds to wait for the COM object after launching the application
+        :param poll_interval: Seconds between two connection attempts
+        :param max_restarts: Restarts allowed per run_macros call before giving up
+        :param visible: Show the application window
+        """
+        self.backend = backend
+        self.startup_timeout = startup_timeout
+        self.poll_interval = poll_interval
+        self.max_restarts = max_restarts
+        self.visible = visible
+
+        self.process = None
+        self.app = None
+        self.app_thread = None  # COM objects belong to the thread that connected
+        self.com_threads = set()  # Threads in which COM is initialized
+        self.restarts = 0
+        self.startup_times = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_alive(self):
+        """True if the process is running and the application answers a COM call."""
+        if self.app is None or self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.app.RevisionNumber()
+        except Exception:
+            return False
+        return True
+
+    def start(self):
+        """
+        Launch the application if the session is not alive, and wait until its COM object is ready.
+
+        :return: The application object
+        """
+        thread = threading.get_ident()
+        if thread not in self.com_threads:
+            self.backend.initialize()
+            self.com_threads.add(thread)
+        if self.app is not None and self.app_thread != thread:
+            # Called from another thread (steady-state workers): connect to the running application again
+            try:
+                self.app = self.backend.connect()
+                self.app_thread = thread
+            except Exception:
+                self.app = None
+        if self.is_alive():
+            return self.app
+        # A process that no longer answers is killed before a new one is launched
+        self.terminate()
+
+        start = time.monotonic()
+        self.process = self.backend.launch()
+        last_error = None
+        while time.monotonic() - start < self.startup_timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"SolidWorks exited during start-up with code {self.process.returncode}.")
+            try:
+                app = self.backend.connect()
+                if getattr(app, "StartupProcessCompleted", True):
+                    app.RevisionNumber()
+                    self.app = app
+                    self.app_thread = thread
+                    break
+            except Exception as e:
+                last_error = e
+            time.sleep(self.poll_interval)
+        else:
+            self.terminate()
+            raise TimeoutError(f"SolidWorks was not ready after {self.startup_timeout} s: {last_error}")
+
+        self.app.Visible = self.visible
+        self.startup_times.append(time.monotonic() - start)
+        record("cad_startup", self.startup_times[-1])
+        print(f"Connected to SolidWorks after {self.startup_times[-1]:.1f} s.")
+        return self.app
+
+    def restart(self):
+        """Terminate the current application and start a new one."""
+        self.restarts += 1
+        print(f"Restarting SolidWorks (restart {self.restarts}).")
+        self.terminate()
+        return self.start()
+
+    def run_macros(self, macro_path, procedures):
+        """
+        Run macro procedures one after the other in the session. A COM error or a dead process restarts
+        the application and runs all procedures again; a macro that returns False is only reported.
+
+        :param macro_path: Path to the .swp macro file
+        :param procedures: List of (module, procedure) names
+        :return: List of RunMacro results, one per procedure
+        """
+        if not os.path.exists(macro_path):
+            raise FileNotFoundError(f"Macro file path does not exist: {macro_path}")
+
+        for attempt in range(self.max_restarts + 1):
+            try:
+                app = self.start() if attempt == 0 else self.restart()
+                results = []
+                for index, (module, procedure) in enumerate(procedures, start=1):
+                    print(f"Running macro {index}: Module={module}, Procedure={procedure}")
+                    result = app.RunMacro(macro_path, module, procedure)
+                    if result == True:
+                        print(f"Macro {index} executed successfully!")
+                    else:
+                        print(f"Macro {index} execution failed, error code: {result}")
+                    results.append(result)
+                # Leave a clean session for the next generation
+                app.CloseAllDocuments(True)
+                return results
+            except (TimeoutError, RuntimeError):
+                if attempt == self.max_restarts:
+                    raise
+            except Exception as e:
+                print(f"SolidWorks session failed: {e}")
+                if attempt == self.max_restarts:
+                    raise RuntimeError(f"SolidWorks failed {attempt + 1} times, giving up.") from e
+
+    def terminate(self):
+        """Kill the application without closing documents, e.g. after a crash."""
+        if self.process is not None and self.process.poll() is None:
+            self.backend.kill(self.process)
+        self.process = None
+        self.app = None
+
+    def close(self):
+        """Close all documents, quit the application and release COM."""
+        if self.app is not None:
+            try:
+                self.app.CloseAllDocuments(True)
+                self.app.Quit()
+                self.process.wait(timeout=30)
+            except Exception as e:
+                print(f"Error closing SolidWorks: {e}")
+        self.terminate()
+        if threading.get_ident() in self.com_threads:
+            self.backend.uninitialize()
+            self.com_threads.discard(threading.get_ident())
+
+
+def run_per_generation(backend, macro_path, procedures, fixed_wait):
+    """
+    Former behaviour, for comparison: launch, sleep fixed_wait seconds, connect, run the macros and kill the
+    application, once per generation.
+    """
+    process = backend.launch()
+    time.sleep(fixed_wait)
+    try:
+        app = backend.connect()
+        return [app.RunMacro(macro_path, module, procedure) for module, procedure in procedures]
+    finally:
+        backend.kill(process)
+
+
+if __name__ == "__main__":
+    # Time scale of the demo: 1 s here stands for 1 min; the former code slept 60 s for a start-up that
+    # takes 20-40 s, so the fixed wait is 1.0 and the start-up 0.5
+    generations = 20
+    procedures = [("Module1", "main"), ("Module2", "main")]
+    macro_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test.swp")
+
+    start = time.perf_counter()
+    backend = FakeComBackend(startup_time=0.5, macro_time=0.05)
+    for _ in range(generations):
+        run_per_generation(backend, macro_path, procedures, fixed_wait=1.0)
+    per_generation = time.perf_counter() - start
+    print(f"Launch, fixed wait and kill per generation: {per_generation:.2f} s, {backend.launches} launches")
+
+    start = time.perf_counter()
+    backend = FakeComBackend(startup_time=0.5, macro_time=0.05)
+    with SolidWorksSession(backend, startup_timeout=5.0, poll_interval=0.05) as session:
+        for _ in range(generations):
+            session.run_macros(macro_path, procedures)
+    persistent = time.perf_counter() - start
+    print(f"Persistent session: {persistent:.2f} s, {backend.launches} launches")
+
+    # Recovery: macros crash the application at random, every generation must still complete
+    backend = FakeComBackend(startup_time=0.2, macro_time=0.01, crash_rate=0.15, seed=1)
+    completed = 0
+    with SolidWorksSession(backend, startup_timeout=5.0, poll_interval=0.05, max_restarts=5) as session:
+        for _ in range(generations):
+            completed += all(session.run_macros(macro_path, procedures))
+        restarts = session.restarts
+    print(f"With a 15 % crash rate per macro: {completed}/{generations} generations completed, "
+          f"{restarts} restarts, {backend.launches} launches")
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import os
+import re
+import subprocess
+import sys
+import time
+
+from instrumentation import record
+from postprocessing import natural_key
+
+
+## Concurrent STAR-CCM+ job pool
+# ----------------------------------------------------------------------------------------------------------------------------
+
+class CFDJob:
+    """
+    Description of the simulation of a single design, passed to the solver through a job file.
+    """
+    def __init__(self, design_id, sim_template, x_t_file, csv_file, sim_file, cores, job_file=None, log_file=None,
+                 init_sim_file=None):
+        self.design_id = design_id
+        self.sim_template = sim_template
+        self.x_t_file = x_t_file
+        self.csv_file = csv_file
+        self.sim_file = sim_file
+        self.stop_file = os.path.splitext(sim_file)[0] + ".stop"  # Created to stop the solver early
+        self.cores = cores
+        self.init_sim_file = init_sim_file  # Converged .sim the solution is initialized from (warm start)
+        self.init_source = None
+        folder = os.path.dirname(csv_file)
+        self.job_file = job_file or os.path.join(folder, f"{design_id}.job")
+        self.log_file = log_file or os.path.join(folder, f"{design_id}.log")
+
+        self.status = "queued"
+        self.returncode = None
+        self.started = None
+        self.finished = None
+        self.iterations = None
+        self.monitor = None
+        self.stop_reason = None
+        self.log_offset = 0
+        self.partial_line = ""
+
+    def __repr__(self):
+        return f"CFDJob({self.design_id}, status={self.status}, cores={self.cores})"
+
+    @property
+    def wall_time(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def initialization(self):
+        return "warm" if self.init_sim_file else "cold"
+
+    def write_job_file(self):
+        """
+        Write the job as a key=value file, read by Run_CFD.java (java.util.Properties, so backslashes are escaped).
+        """
+        entries = {
+            "sim_template": self.sim_template,
+            "sim_file": self.sim_file,
+            "stop_file": self.stop_file,
+            "x_t_file": self.x_t_file,
+            "csv_file": self.csv_file,
+            "cores": str(self.cores),
+        }
+        if self.init_sim_file:
+            entries["init_sim_file"] = self.init_sim_file
+        with open(self.job_file, 'w', encoding='utf-8') as file:
+            for key, value in entries.items():
+                file.write(f"{key}={value.replace(chr(92), chr(92) * 2)}\n")
+        return self.job_file
+
+
+def make_cfd_jobs(folder, sim_template, cores):
+    """
+    Create one job per Design{k}.x_t file in a folder, in natural order.
+
+    :param folder: Folder containing the .x_t files of a generation
+    :param sim_template: Path to the .sim template (Design_blank.sim)
+    :param cores: Number of cores per job
+    :return: List of CFDJob
+    """
+    filenames = [f for f in os.listdir(folder) if f.lower().endswith('.x_t')]
+    filenames.sort(key=natural_key)
+    return [make_cfd_job(folder, os.path.splitext(filename)[0], sim_template, cores, filename)
+            for filename in filenames]
+
+
+def make_cfd_job(folder, design_id, sim_template, cores, x_t_filename=None):
+    """Job of a single design of a folder, e.g. as soon as its .x_t file is built."""
+    return CFDJob(
+        design_id=design_id,
+        sim_template=sim_template,
+        x_t_file=os.path.join(folder, x_t_filename or f"{design_id}.x_t"),
+        csv_file=os.path.join(folder, f"{design_id}.csv"),
+        sim_file=os.path.join(folder, f"{design_id}.sim"),
+        cores=cores,
+    )
+
+
+def csv_has_pressure_drop(csv_file):
+    """Check that a CSV export exists and that Run_CFD.java has appended the pressure drop column."""
+    if not os.path.exists(csv_file):
+        return False
+    with open(csv_file, 'r', encoding='utf-8', errors='replace') as file:
+        header = file.readline()
+    return "Pressure_drop" in header
+
+
+ITERATIONS_PATTERN = re.compile(r"Solver iterations: (\d+)")
+
+
+def read_iterations(log_file):
+    """Number of solver iterations reported by Run_CFD.java in the log of a job, None if not reported."""
+    if not os.path.exists(log_file):
+        return None
+    with open(log_file, 'r', encoding='utf-8', errors='replace') as file:
+        matches = ITERATIONS_PATTERN.findall(file.read())
+    return int(matches[-1]) if matches else None
+
+
+class CFDJobPool:
+    """
+    Runs independent solver processes at the same time, one per design, within a core budget.
+
+    The solver command is a list of arguments in which '{cores}' and '{macro}' are replaced per job, e.g.
+    [r"C:\\...\\star\\bin\\starccm+", "-np", "{cores}", "-batch", "{macro}"]. The job file path is passed
+    in the CFD_JOB_FILE environment variable.
+
+    With a monitor factory, the log of every running job is read as it grows (see solver_monitor.py): a
+    converged run is asked to stop through its stop file, a diverged one is killed.
+    """
+    def __init__(self, solver_command, macro_file, core_budget, poll_interval=1.0, timeout=None, cwd=None,
+                 monitor_factory=None):
+        """
+        :param solver_command: Solver command template (list of arguments)
+        :param macro_file: Java macro run by every job
+        :param core_budget: Total number of cores available to the running jobs
+        :param poll_interval: Seconds between two checks of the running processes
+        :param timeout: Optional wall-time limit per job in seconds; longer jobs are killed
+        :param cwd: Working directory of the solver processes
+        :param monitor_factory: Callable returning a new SolverMonitor per job, None to let every run reach the
+                                stopping criteria of the simulation
+        """
+        self.solver_command = list(solver_command)
+        self.macro_file = macro_file
+        self.core_budget = core_budget
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.cwd = cwd
+        self.monitor_factory = monitor_factory
+
+        self.queue = []
+        self.running = {}
+        self.completed = []
+
+    def submit(self, job):
+        """Add a job to the queue."""
+        if job.cores > self.core_budget:
+            print(f"{job.design_id} requests {job.cores} cores, limited to the budget of {self.core_budget}.")
+            job.cores = self.core_budget
+        job.status = "queued"
+        self.queue.append(job)
+
+    def cores_in_use(self):
+        return sum(job.cores for job in self.running.values())
+
+    def _start(self, job):
+        job.write_job_file()
+        if os.path.exists(job.stop_file):
+            os.remove(job.stop_file)
+        job.monitor = self.monitor_factory() if self.monitor_factory else None
+        job.log_offset, job.partial_line, job.stop_reason = 0, "", None
+        command = [arg.replace("{cores}", str(job.cores)).replace("{macro}", self.macro_file)
+                   for arg in self.solver_command]
+        env = dict(os.environ, CFD_JOB_FILE=job.job_file)
+
+        log = open(job.log_file, 'w', encoding='utf-8')
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=self.cwd)
+        process.log = log
+
+        job.status = "running"
+        job.started = time.time()
+        self.running[process] = job
+        print(f"Started {job.design_id} on {job.cores} cores ({self.cores_in_use()}/{self.core_budget} in use).")
+
+    def _check_monitor(self, process, job):
+        """Feed the new lines of the log of a running job to its monitor and act on its decision."""
+        with open(job.log_file, 'r', encoding='utf-8', errors='replace') as file:
+            file.seek(job.log_offset)
+            text = job.partial_line + file.read()
+            job.log_offset = file.tell()
+        lines = text.split("\n")
+        job.partial_line = lines.pop()  # Not terminated yet
+        for line in lines:
+            decision = job.monitor.feed(line)
+            if decision == "converged":
+                job.stop_reason = f"converged at iteration {job.monitor.decision_iteration}: {job.monitor.reason}"
+                print(f"{job.design_id} {job.stop_reason}, stopping.")
+                with open(job.stop_file, 'w', encoding='utf-8') as file:
+                    file.write(job.stop_reason + "\n")
+            elif decision == "diverged":
+                job.stop_reason = f"diverged at iteration {job.monitor.decision_iteration}: {job.monitor.reason}"
+                print(f"{job.design_id} {job.stop_reason}, terminating.")
+                job.status = "diverged"
+                process.kill()
+                process.wait()
+                return
+
+    def _finish(self, process, job):
+        if job.monitor is not None and job.status != "diverged":
+            self._check_monitor(process, job)  # Output written after the last poll
+        process.log.close()
+        job.finished = time.time()
+        job.returncode = process.returncode
+        if os.path.exists(job.stop_file):
+            os.remove(job.stop_file)
+        if job.status not in ("timeout", "diverged"):
+            job.status = "done" if job.returncode == 0 and csv_has_pressure_drop(job.csv_file) else "failed"
+        job.iterations = read_iterations(job.log_file)
+        if job.iterations is None and job.monitor is not None:
+            job.iterations = job.monitor.iteration  # Killed before reporting its iterations
+        self.completed.append(job)
+        print(f"{job.design_id} {job.status} after {job.wall_time:.1f} s, {job.iterations} iterations, "
+              f"{job.initialization} start (return code {job.returncode}).")
+        record("cfd_job", job.wall_time, job.started, design=job.design_id, files=[job.csv_file], status=job.status,
+               cores=job.cores, initialization=job.initialization, init_source=job.init_source,
+               iterations=job.iterations, stop_reason=job.stop_reason)
+
+    def poll(self):
+        """
+        Collect finished processes and start queued jobs while cores are free.
+
+        :return: List of jobs that finished during this call
+        """
+        finished = []
+        for process, job in list(self.running.items()):
+            if process.poll() is None and job.monitor is not None:
+                self._check_monitor(process, job)
+            if process.poll() is None and self.timeout is not None and time.time() - job.started > self.timeout:
+                print(f"{job.design_id} exceeded the time limit of {self.timeout} s, terminating.")
+                job.status = "timeout"
+                process.kill()
+                process.wait()
+            if process.poll() is not None:
+                del self.running[process]
+                self._finish(process, job)
+                finished.append(job)
+
+        # Start jobs in queue order while they fit into the core budget
+        while self.queue and self.cores_in_use() + self.queue[0].cores <= self.core_budget:
+            self._start(self.queue.pop(0))
+        return finished
+
+    def run(self, jobs=None):
+        """
+        Run the given (and already queued) jobs and wait until all of them have finished.
+
+        :param jobs: Optional list of CFDJob to submit first
+        :return: List of the jobs finished by this call, in submission order
+        """
+        for job in jobs or []:
+            self.submit(job)
+        batch = list(self.queue)
+
+        self.poll()
+        while self.running or self.queue:
+            time.sleep(self.poll_interval)
+            self.poll()
+
+        done = len([job for job in batch if job.status == "done"])
+        print(f"CFD job pool finished: {done}/{len(batch)} jobs done.")
+        return batch
+
+    def results(self):
+        """Status summary of all finished jobs: {design_id: (status, wall_time, csv_file)}."""
+        return {job.design_id: (job.status, job.wall_time, job.csv_file) for job in self.completed}
+
+
+if __name__ == "__main__":
+    # Throughput scaling with the dummy solver: the same 8 designs on 16 cores, split into 1, 2, 4 and 8 processes
+    import tempfile
+
+    dummy_solver = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_starccm.py")
+    os.environ.setdefault("DUMMY_SOLVER_SECONDS", "4.0")
+    num_designs = 8
+    core_budget = 16
+
+    for cores in [16, 8, 4, 2]:
+        with tempfile.TemporaryDirectory() as folder:
+            for k in range(1, num_designs + 1):
+                with open(os.path.join(folder, f"Design{k}.x_t"), 'w') as file:
+                    file.write(f"design {k}\n")
+
+            pool = CFDJobPool([sys.executable, dummy_solver, "-np", "{cores}", "-batch", "{macro}"],
+                              macro_file="Run_CFD_Modified.java", core_budget=core_budget, poll_interval=0.05)
+            start = time.time()
+            jobs = pool.run(make_cfd_jobs(folder, "Design_blank.sim", cores))
+            elapsed = time.time() - start
+
+        print(f"\n{core_budget // cores} concurrent jobs x {cores} cores: {num_designs} designs in {elapsed:.2f} s, "
+              f"{num_designs / elapsed * 3600:.0f} designs per hour, "
+              f"{len([job for job in jobs if job.status == 'done'])} done\n")
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import json
+import os
+import random
+import re
+import shutil
+import time
+
+import numpy as np
+
+from evaluation_cache import design_key
+from hypervolume import ParetoArchive
+from postprocessing import load_summary_rows
+from summary_watcher import export_complete
+
+
+## Campaign checkpoints
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# The generational loop of Main.py saves its state to {output_directory}/checkpoint.json after every stage
+# of a generation:
+#   offspring  - the offspring are drawn (random state after the draw), none of them is evaluated yet
+#   evaluated  - the objectives of the offspring are known
+#   survived   - the next population is selected, the generation is finished
+# python Main.py --resume continues after the last saved stage.
+#
+# The progress of the designs inside an evaluation is read back from the generation folder instead:
+# designs.json lists the design keys of Design1..Design{n}, so the .x_t files, exports and summary rows on
+# disk are only trusted if they were produced for the same designs (design_status). A folder written for
+# other designs is emptied before it is reused (clear_design_files), otherwise the CAD macro would skip the
+# new designs because their .x_t files exist.
+
+STAGES = ("offspring", "evaluated", "survived")
+MANIFEST_FILE = "designs.json"
+# Design{k}.x_t, .SLDPRT, .csv, .sim, .job, .log, .stop, .columns/, Design{k}_restructured.xlsx, ...
+DESIGN_FILE_PATTERN = re.compile(r"design\d+([._]|$)", re.IGNORECASE)
+
+
+def random_state():
+    """State of the random and numpy.random generators, as JSON-serializable lists."""
+    version, internal_state, gauss = random.getstate()
+    name, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        "random": [version, list(internal_state), gauss],
+        "numpy": [name, keys.tolist(), int(position), int(has_gauss), float(cached_gaussian)],
+    }
+
+
+def set_random_state(state):
+    """Restore the generators from random_state()."""
+    version, internal_state, gauss = state["random"]
+    random.setstate((version, tuple(internal_state), gauss))
+    name, keys, position, has_gauss, cached_gaussian = state["numpy"]
+    np.random.set_state((name, np.array(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+
+
+def _to_json(value):
+    """json.dump fallback for the numpy values in the solutions (objectives read with pandas)."""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def write_json(path, data):
+    """Write a JSON file atomically: a crash leaves either the previous or the new file, never a partial one."""
+    temporary_file = path + ".tmp"
+    with open(temporary_file, 'w', encoding='utf-8') as file:
+        json.dump(data, file, default=_to_json)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_file, path)
+
+
+class CampaignCheckpoint:
+    """
+    State of a generational campaign, rewritten after every stage.
+
+    Usage:
+        checkpoint = CampaignCheckpoint(os.path.join(output_directory, "checkpoint.json"))
+        checkpoint.save(i, "offspring", population, offspring, pareto_archive, hypervolume_history)
+        state = checkpoint.load()  # None if there is no checkpoint
+    """
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+        checkpoint_dir = os.path.dirname(checkpoint_file)
+        if checkpoint_dir and not os.path.exists(checkpoint_dir):
+            os.makedirs(checkpoint_dir)
+
+    def save(self, generation, stage_name, population, offspring=None, archive=None, hypervolume_history=None):
+        """
+        :param generation: Generation number
+        :param stage_name: Last finished stage of the generation, one of STAGES
+        :param population: Parent population of the generation (the next one once it "survived")
+        :param offspring: Offspring of the generation, with their objectives once "evaluated"
+        :param archive: ParetoArchive of all evaluated designs
+        :param hypervolume_history: List of (generation, hypervolume) of the finished generations
+        """
+        if stage_name not in STAGES:
+            raise ValueError(f"Unknown stage '{stage_name}', expected one of {STAGES}.")
+        write_json(self.checkpoint_file, {
+            "generation": generation,
+            "stage": stage_name,
+            "population": population,
+            "offspring": offspring or [],
+            "archive": [[mi, pressure_drop, payload] for (mi, pressure_drop), payload in
+                        zip(archive.points(), archive.payloads)] if archive is not None else [],
+            "hypervolume_history": hypervolume_history or [],
+            "random_state": random_state(),
+            "saved": time.time(),
+        })
+
+    def load(self):
+        """The saved state as a dict, None if there is no checkpoint."""
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        with open(self.checkpoint_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+
+
+def restore_archive(entries, reference_point):
+    """Rebuild a ParetoArchive from the "archive" entries of a checkpoint."""
+    archive = ParetoArchive(reference_point)
+    for mi, pressure_drop, payload in entries:
+        archive.insert(mi, pressure_drop, payload)
+    return archive
+
+
+## Progress of the designs of a generation folder
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def write_manifest(folder, population):
+    """Record which design is Design{k} in a generation folder."""
+    os.makedirs(folder, exist_ok=True)
+    write_json(os.path.join(folder, MANIFEST_FILE), [design_key(solution["variables"]) for solution in population])
+
+
+def read_manifest(folder):
+    manifest_file = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def manifest_matches(folder, population):
+    """Whether the files of a generation folder were produced for the designs of population."""
+    return read_manifest(folder) == [design_key(solution["variables"]) for solution in population]
+
+
+def clear_design_files(folder):
+    """
+    Remove the artifacts of the designs of a folder: the models, exports, simulations, job files and logs of
+    every Design{k}, their export caches, and the reports and summary in output/.
+
+    :return: List of the removed paths
+    """
+    removed = []
+    for directory in (folder, os.path.join(folder, 'output')):
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if DESIGN_FILE_PATTERN.match(name) or name in ("summary.csv", "cad_status.csv"):
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed.append(path)
+    return removed
+
+
+def design_status(folder, population):
+    """
+    Work already done for the designs of a generation folder. Nothing is considered done if the folder was
+    written for other designs (manifest missing or different).
+
+    :param folder: Generation folder (T_{generation} or S_{evaluation_id})
+    :param population: Solutions evaluated in the folder; Design{k} is population[k - 1]
+    :return: List of dicts {index, design, x_t, export, summarized}, one per design
+    """
+    trusted = manifest_matches(folder, population)
+    # The CAD macro saves Design{k}.X_T, the file names are compared in lower case
+    filenames = {f.lower(): f for f in os.listdir(folder)} if trusted else {}
+    summary_file = os.path.join(folder, 'output', 'summary.csv')
+    summary_rows = load_summary_rows(summary_file) if trusted else {}
+    summary_time = os.path.getmtime(summary_file) if summary_rows else 0
+
+    statuses = []
+    for k in range(1, len(population) + 1):
+        csv_file = os.path.join(folder, f"Design{k}.csv")
+        x_t_file = filenames.get(f"design{k}.x_t")
+        export = f"design{k}.csv" in filenames and export_complete(csv_file)
+        # A summary row is out of date if the export was rewritten after the summary
+        summarized = f"Design{k}.csv" in summary_rows and (not export or os.path.getmtime(csv_file) <= summary_time)
+        statuses.append({
+            "index": k,
+            "design": f"Design{k}",
+            "x_t": x_t_file is not None and os.path.getsize(os.path.join(folder, x_t_file)) > 0,
+            "export": export,
+            "summarized": summarized,
+        })
+    return statuses
+
+
+def describe_status(statuses):
+    """One-line progress of design_status, e.g. '4/10 built, 2/10 simulated, 1/10 post-processed'."""
+    n = len(statuses)
+    return (f"{sum(s['x_t'] for s in statuses)}/{n} built, {sum(s['export'] for s in statuses)}/{n} simulated, "
+            f"{sum(s['summarized'] for s in statuses)}/{n} post-processed")
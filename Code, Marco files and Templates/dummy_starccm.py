@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import zlib
+
+
+## Dummy STAR-CCM+ solver for testing the CFD job pool on Linux
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Usage mirrors the real solver: dummy_starccm.py -np 4 -batch Run_CFD_Modified.java
+# The job is read from the file in the CFD_JOB_FILE environment variable, as in Run_CFD.java.
+# DUMMY_SOLVER_SECONDS sets the single-core run time of a cold start; the parallel part scales with -np.
+# A job with init_sim_file (warm start) needs fewer iterations the fewer obstacles differ from the source.
+# The residual table has the layout of STAR-CCM+ with the Pressure_drop and mixing index monitors, which
+# level off well before the last iteration; creating the stop file of the job stops the run after the
+# current iteration. DUMMY_DIVERGENCE_RATE is the share of designs whose run diverges.
+
+PLATE_POSITIONS = [0.001, 0.002, 0.003, 0.004, 0.005]
+
+
+def read_job_file(job_file):
+    """Read a key=value job file written by CFDJob.write_job_file."""
+    job = {}
+    with open(job_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            job[key.strip()] = value.strip().replace('\\\\', '\\')
+    return job
+
+
+def design_seed(x_t_file):
+    """Deterministic seed of a design, taken from the geometry file (or its path if it does not exist)."""
+    if os.path.exists(x_t_file):
+        with open(x_t_file, 'rb') as file:
+            return zlib.crc32(file.read())
+    return zlib.crc32(x_t_file.encode())
+
+
+def design_blocks(text):
+    """
+    Obstacles of a placeholder model of cad_batch.emulate_cad_macro (its geometry fields in groups of 7); any
+    other content counts as one obstacle.
+    """
+    fields = text.split(":", 1)[-1].strip().split(",")
+    if len(fields) % 7:
+        return [text.strip()]
+    return [tuple(fields[k:k + 7]) for k in range(0, len(fields), 7)]
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as file:
+        return file.read()
+
+
+def solver_iterations(job, cold_iterations):
+    """Iterations to convergence: all of them from the cold field, a share of them from a similar design."""
+    init_sim_file = job.get('init_sim_file')
+    if not init_sim_file or not os.path.exists(init_sim_file) or not os.path.exists(job['x_t_file']):
+        return cold_iterations
+    blocks = design_blocks(read_text(job['x_t_file']))
+    # The state of the dummy solver is the model it was solved for, after the first line
+    source = design_blocks(read_text(init_sim_file).split("\n", 1)[-1])
+    changed = len([block for block in blocks if block not in source])
+    return max(1, round(cold_iterations * (0.3 + 0.7 * changed / len(blocks))))
+
+
+def write_synthetic_export(csv_file, seed, ny=20, nz=10, pressure_drop=None, mixing_rate=None):
+    """
+    Write a CSV in the format of the 'mixing index' XyzInternalTable export, with the pressure drop
+    appended to the first data row as Run_CFD.java does.
+
+    :param csv_file: Output CSV path
+    :param seed: Seed of the design; the mixing rate and pressure drop depend on it
+    :param ny: Number of sample points across the channel width
+    :param nz: Number of sample points across the channel height
+    :param pressure_drop: Pressure drop to append, derived from the seed if None
+    :param mixing_rate: Widening rate of the interface (0.1 to 0.8), derived from the seed if None
+    """
+    rng = random.Random(seed)
+    seed_mixing_rate = rng.uniform(0.1, 0.8)
+    mixing_rate = seed_mixing_rate if mixing_rate is None else mixing_rate
+    if pressure_drop is None:
+        pressure_drop = 2.0 + 12.0 * mixing_rate ** 1.5 + rng.uniform(0.0, 0.5)
+
+    lines = ['"X (m)","Y (m)","Z (m)","PS","Pressure (Pa)","Pressure_drop"']
+    first_row = True
+    for plate_index, x in enumerate(PLATE_POSITIONS):
+        # The interface between the two streams widens downstream, faster for better mixers
+        width = 0.1 + mixing_rate * plate_index
+        for iz in range(nz):
+            z = round(-0.00025 + iz * 0.0005 / (nz - 1), 7)
+            for iy in range(ny):
+                y = round(-0.0005 + iy * 0.001 / (ny - 1), 7)
+                ps = 0.5 + 0.5 * math.tanh(z / 0.00025 / width) + rng.gauss(0.0, 0.01)
+                ps = min(max(ps, 0.0), 1.0)
+                pressure = pressure_drop * (1 - x / 0.006)
+                row = f"{x},{y},{z},{ps:.6f},{pressure:.6f}"
+                if first_row:
+                    row += f",{pressure_drop}"
+                    first_row = False
+                lines.append(row)
+
+    with open(csv_file, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dummy stand-in for starccm+ -batch.")
+    parser.add_argument('-np', dest='cores', type=int, default=1)
+    parser.add_argument('-batch', dest='macro', default=None)
+    args, _ = parser.parse_known_args(argv)
+
+    job_file = os.environ.get('CFD_JOB_FILE')
+    if not job_file:
+        print("CFD_JOB_FILE is not set, nothing to do.")
+        return 1
+    job = read_job_file(job_file)
+
+    base_seconds = float(os.environ.get('DUMMY_SOLVER_SECONDS', '4.0'))
+    serial_fraction = 0.2
+    duration = base_seconds * (serial_fraction + (1 - serial_fraction) / max(args.cores, 1))
+
+    seed = design_seed(job['x_t_file'])
+    cold_iterations = 100
+    iterations = solver_iterations(job, cold_iterations)
+    print(f"Dummy solver: {job['x_t_file']} on {args.cores} cores, {duration * iterations / cold_iterations:.2f} s, "
+          f"initialized from {job.get('init_sim_file') or 'the blank simulation'}")
+    stop_file = job.get('stop_file')
+    if stop_file:
+        print(f"Stop file: {stop_file}")
+    header = ("  Iteration    Continuity    X-momentum    Y-momentum    Z-momentum    Pressure_drop Monitor    "
+              "mixing index Monitor")
+    print(header)
+    sys.stdout.flush()
+
+    rng = random.Random(seed)
+    diverges = rng.random() < float(os.environ.get('DUMMY_DIVERGENCE_RATE', '0'))
+    pressure_drop, mixing_index = rng.uniform(2.0, 14.0), rng.uniform(0.15, 0.55)
+    offset = cold_iterations - iterations  # A warm start begins closer to the converged state
+    iteration = 0
+    while iteration < iterations:
+        if stop_file and os.path.exists(stop_file):
+            print("Stopping criterion Stop File satisfied.")
+            break
+        iteration += 1
+        time.sleep(duration / cold_iterations)
+        if iteration % 20 == 1 and iteration > 1:
+            print(header)  # STAR-CCM+ reprints the header during the run
+        progress = iteration + offset
+        residual = 10 ** (-progress * 0.05)
+        transient = 0.3 * math.exp(-progress / 6) + 1e-5 * math.sin(iteration)
+        if diverges and iteration > iterations // 3:
+            residual *= 10 ** ((iteration - iterations // 3) * 0.5)
+            transient *= 10 ** ((iteration - iterations // 3) * 0.2)
+        residuals = " ".join(f"{residual * factor:13.6e}" for factor in (1.0, 0.6, 0.8, 0.7))
+        print(f"{iteration:>11d} {residuals} {pressure_drop * (1 + transient):24.6e} "
+              f"{mixing_index * (1 - transient):23.6e}")
+        sys.stdout.flush()
+    print(f"Solver iterations: {iteration}")
+    if diverges:
+        print("Floating point exception: the solution diverged.")
+        return 1
+
+    write_synthetic_export(job['csv_file'], seed)
+    print(f"CSV file saved successfully: {job['csv_file']}")
+
+    with open(job['sim_file'], 'w', encoding='utf-8') as file:
+        file.write(f"dummy simulation state of {job['x_t_file']}\n")
+        if os.path.exists(job['x_t_file']):
+            file.write(read_text(job['x_t_file']))
+    print(f"Simulation state saved successfully: {job['sim_file']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+## Persistent evaluation cache
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def design_key(variables):
+    """
+    Canonical key of a design: the sorted set of Mixer.edges indices, e.g. '3-7-12-30'.
+    Two solutions with the same obstacles in a different order share the same key.
+    """
+    return "-".join(str(v) for v in sorted({int(v) for v in variables}))
+
+
+class EvaluationCache:
+    """
+    On-disk SQLite store of simulated designs.
+
+    Each row holds the MI value of every plate, obj1/obj2 and the paths of the artifacts
+    (.x_t, .sim, .csv, report) produced for the design. The file survives restarts and can be
+    shared by several campaigns, so a design is only sent to SolidWorks and STAR-CCM+ once.
+    With a symmetry group (symmetry.py), a design is also found under any of its mirror images.
+    """
+    def __init__(self, db_path, symmetry=None):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self.db_path = db_path
+        self.symmetry = symmetry
+        # The connection is shared with the worker threads of the steady-state mode
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        # WAL lets several campaigns read the cache while another one writes to it
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS evaluations (
+                design_key TEXT PRIMARY KEY,
+                variables TEXT NOT NULL,
+                mi_values TEXT NOT NULL,
+                obj1 REAL NOT NULL,
+                obj2 REAL NOT NULL,
+                artifacts TEXT NOT NULL,
+                campaign TEXT,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+
+    def __contains__(self, variables):
+        return self.lookup(variables) is not None
+
+    def lookup(self, variables):
+        """
+        Look up a design in the cache.
+
+        :param variables: Edge indices of the design (any order)
+        :return: Dictionary with the stored results, or None on a cache miss
+        """
+        keys = self.symmetry.image_keys(variables) if self.symmetry is not None else [design_key(variables)]
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT variables, mi_values, obj1, obj2, artifacts, campaign FROM evaluations WHERE design_key IN "
+                f"({', '.join('?' * len(keys))}) ORDER BY design_key LIMIT 1",
+                keys,
+            ).fetchone()
+        if row is None:
+            return None
+
+        return {
+            "variables": json.loads(row[0]),
+            "mi_values": json.loads(row[1]),
+            "objectives": [row[2], row[3]],
+            "artifacts": json.loads(row[4]),
+            "campaign": row[5],
+        }
+
+    def store(self, variables, mi_values, obj1, obj2, artifacts=None, campaign=None):
+        """
+        Insert or replace the results of a simulated design.
+
+        :param variables: Edge indices of the design
+        :param mi_values: Dictionary of MI values per plate, e.g. {'plate1': 0.21, ...}
+        :param obj1: Average mixing index
+        :param obj2: Pressure drop
+        :param artifacts: Dictionary of artifact paths, e.g. {'x_t': ..., 'csv': ...}
+        :param campaign: Name of the campaign that produced the result
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    design_key(variables),
+                    json.dumps(sorted(int(v) for v in variables)),
+                    json.dumps({name: float(value) for name, value in mi_values.items()}),
+                    float(obj1),
+                    float(obj2),
+                    json.dumps(artifacts or {}),
+                    campaign,
+                    time.time(),
+                ),
+            )
+            self.connection.commit()
+
+    def entries(self):
+        """
+        All cached designs, e.g. to train a surrogate model on every result collected so far.
+
+        :return: List of (variables, [obj1, obj2]) tuples
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT variables, obj1, obj2 FROM evaluations").fetchall()
+        return [(json.loads(row[0]), [row[1], row[2]]) for row in rows]
+
+    def split_cached(self, population):
+        """
+        Split a population into cached designs and designs that still have to be simulated.
+        Objectives of cached designs are assigned in place.
+
+        :param population: List of solutions
+        :return: A tuple (cached, misses) of solution lists
+        """
+        cached, misses = [], []
+        for solution in population:
+            entry = self.lookup(solution["variables"])
+            if entry is None:
+                misses.append(solution)
+            else:
+                solution["objectives"] = list(entry["objectives"])
+                cached.append(solution)
+        return cached, misses
+
+    def store_summary(self, population, summary_file, design_folder, campaign=None):
+        """
+        Store the rows of a generation summary file. Row 'Design{k}.csv' belongs to population[k - 1].
+        Designs without a valid pressure drop are not stored, so they are simulated again.
+
+        :param population: List of solutions written to the template, in design order
+        :param summary_file: Path to the summary CSV file
+        :param design_folder: Folder containing the Design{k} artifacts
+        :param campaign: Name of the campaign that produced the results
+        :return: Number of stored designs
+        """
+        summary_df = pd.read_csv(summary_file)
+        plate_columns = [column for column in summary_df.columns if column.startswith('plate')]
+
+        stored = 0
+        for _, row in summary_df.iterrows():
+            match = re.search(r'(\d+)', str(row['Design']))
+            if match is None or not 1 <= int(match.group(1)) <= len(population):
+                print(f"Summary row '{row['Design']}' does not match any design, skipped.")
+                continue
+
+            k = int(match.group(1))
+            obj1 = pd.to_numeric(row['obj1'], errors='coerce')
+            obj2 = pd.to_numeric(row['obj2'], errors='coerce')
+            if np.isnan(obj1) or np.isnan(obj2):
+                print(f"Design{k} has no valid objectives, not cached.")
+                continue
+
+            artifacts = {
+                "x_t": os.path.join(design_folder, f"Design{k}.x_t"),
+                "sim": os.path.join(design_folder, f"Design{k}.sim"),
+                "csv": os.path.join(design_folder, f"Design{k}.csv"),
+                "report": os.path.join(design_folder, 'output', f"Design{k}_restructured.xlsx"),
+            }
+            mi_values = {column: row[column] for column in plate_columns}
+            self.store(population[k - 1]["variables"], mi_values, obj1, obj2, artifacts, campaign)
+            stored += 1
+
+        print(f"Stored {stored} designs in the evaluation cache ({len(self)} in total).")
+        return stored
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
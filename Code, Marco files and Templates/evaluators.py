@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import abc
+import os
+import time
+import zlib
+
+from checkpoint import design_status, write_manifest
+from dummy_starccm import write_synthetic_export
+from evaluation_cache import design_key
+from instrumentation import stage
+from postprocessing import PLATES, process_all_csv_files, write_summary
+from steady_state import stand_in_objectives
+
+
+## Evaluator backends
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# An evaluator turns designs into a summary file in the format of process_all_csv_files (one row
+# 'Design{k}.csv' per design with the MI of every plate, obj1 and obj2), so Main.py reads the objectives
+# and fills the evaluation cache the same way whatever produced them. CadCfdEvaluator in Main.py runs
+# SolidWorks and STAR-CCM+; SyntheticEvaluator below needs neither and runs on any platform.
+
+class Evaluator(abc.ABC):
+    """
+    Interface of the evaluator backends. A backend that does not implement evaluate and evaluate_single
+    cannot be instantiated.
+    """
+    @abc.abstractmethod
+    def evaluate(self, population, generation):
+        """
+        Evaluate the designs of one generation in folder T_{generation}.
+
+        :param population: List of solutions; Design{k} is population[k - 1]
+        :param generation: Generation number
+        :return: A tuple (summary file, folder of the Design{k} artifacts)
+        """
+
+    @abc.abstractmethod
+    def evaluate_single(self, solution, evaluation_id):
+        """
+        Evaluate one design in folder S_{evaluation_id} (steady-state mode). May be called from several
+        threads at the same time.
+
+        :return: A tuple (summary file, folder of the Design1 artifacts)
+        """
+
+    def close(self):
+        """Release the resources of the backend at the end of the campaign."""
+
+
+class SyntheticEvaluator(Evaluator):
+    """
+    Headless stand-in for CAD + CFD. The objectives are the deterministic analytic function of the Mixer.edges
+    layout in steady_state.stand_in_objectives. Either the summary is written directly, or every design gets
+    a synthetic XYZ export in the STAR-CCM+ format (interface widening with the analytic MI, analytic
+    pressure drop) that goes through the real post-processing.
+    """
+    # MI of the plates relative to obj1, increasing downstream; their mean is 1 so obj1 is unchanged
+    PLATE_PROFILE = [0.2, 0.6, 1.0, 1.4, 1.8]
+
+    def __init__(self, problem, output_directory, write_exports=False, export_shape=(20, 10), delay=0.0,
+                 postprocessing_options=None):
+        """
+        :param problem: Problem definition (Mixer)
+        :param output_directory: Folder of the T_{generation} and S_{evaluation_id} folders
+        :param write_exports: Write Design{k}.csv exports and post-process them instead of writing the summary
+        :param export_shape: (ny, nz) sample points per plate of the synthetic exports
+        :param delay: Seconds of simulated run time per design
+        :param postprocessing_options: Keyword arguments of process_all_csv_files
+        """
+        self.problem = problem
+        self.output_directory = output_directory
+        self.write_exports = write_exports
+        self.export_shape = export_shape
+        self.delay = delay
+        self.postprocessing_options = postprocessing_options or {}
+
+    def objectives(self, variables):
+        return stand_in_objectives(self.problem, variables)
+
+    def evaluate(self, population, generation):
+        return self._evaluate_folder(population, os.path.join(self.output_directory, f"T_{generation}"))
+
+    def evaluate_single(self, solution, evaluation_id):
+        return self._evaluate_folder([solution], os.path.join(self.output_directory, f"S_{evaluation_id}"))
+
+    def _evaluate_folder(self, population, folder):
+        output_folder = os.path.join(folder, 'output')
+        summary_file = os.path.join(output_folder, 'summary.csv')
+        os.makedirs(output_folder, exist_ok=True)
+
+        # Like the CAD + CFD evaluator, designs finished before a restart are not evaluated again
+        statuses = design_status(folder, population)
+        if all(s["summarized"] for s in statuses):
+            return summary_file, folder
+        write_manifest(folder, population)
+
+        if self.delay > 0:
+            with stage("synthetic_delay"):
+                time.sleep(self.delay * sum(not s["export"] for s in statuses))
+
+        if not self.write_exports:
+            summary_data = []
+            for k, solution in enumerate(population, start=1):
+                obj1, obj2 = self.objectives(solution["variables"])
+                mi_values = {name: obj1 * weight for (name, _), weight in zip(PLATES, self.PLATE_PROFILE)}
+                summary_data.append((f"Design{k}.csv", mi_values, obj2))
+            write_summary(summary_data, summary_file)
+            return summary_file, folder
+
+        # Exports of an earlier, larger batch in the same folder would shift the summary rows
+        simulated = {f"{s['design']}.csv" for s in statuses if s["export"]}
+        for filename in os.listdir(folder):
+            if filename.startswith("Design") and filename.endswith(".csv") and filename not in simulated:
+                os.remove(os.path.join(folder, filename))
+
+        ny, nz = self.export_shape
+        with stage("synthetic_exports"):
+            for k, solution in enumerate(population, start=1):
+                if f"Design{k}.csv" in simulated:
+                    continue
+                obj1, obj2 = self.objectives(solution["variables"])
+                # stand_in_objectives gives MI between 0.15 and 0.55; faster widening mixes better
+                mixing_rate = min(max(0.1 + 0.7 * (obj1 - 0.15) / 0.4, 0.1), 0.8)
+                seed = zlib.crc32(design_key(solution["variables"]).encode())
+                write_synthetic_export(os.path.join(folder, f"Design{k}.csv"), seed, ny, nz, pressure_drop=obj2,
+                                       mixing_rate=mixing_rate)
+        with stage("postprocessing"):
+            process_all_csv_files(folder, output_folder, summary_file, num_designs=len(population),
+                                  **self.postprocessing_options)
+        return summary_file, folder
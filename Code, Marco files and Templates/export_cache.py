@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+## Columnar binary cache of the CFD exports
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Design{k}.csv is converted once into the folder Design{k}.columns next to it: one .npy file per column
+# (float64, memory-mapped when read) and meta.json with the row count, the pressure drop and the size and
+# modification time of the CSV. The cache is rebuilt when the CSV changes.
+
+CACHE_VERSION = 1
+CACHE_COLUMNS = {'X (m)': 'x', 'Y (m)': 'y', 'Z (m)': 'z', 'PS': 'ps'}  # CSV column -> file name
+CONVERSION_CHUNKSIZE = 1_000_000  # Rows per chunk while converting
+
+
+def cache_folder(csv_file):
+    """Folder of the columnar cache of an export."""
+    return os.path.splitext(csv_file)[0] + '.columns'
+
+
+def _source_signature(csv_file):
+    stat = os.stat(csv_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _count_lines(csv_file, block_size=1 << 24):
+    """Upper bound of the number of data rows: newlines, plus an unterminated last line, minus the header."""
+    lines, last = 0, b'\n'
+    with open(csv_file, 'rb') as file:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return max(lines + (last != b'\n') - 1, 0)
+
+
+def read_meta(csv_file):
+    """Metadata of a valid cache, None if there is no cache or it is out of date."""
+    meta_file = os.path.join(cache_folder(csv_file), 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    try:
+        with open(meta_file, 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != CACHE_VERSION or meta.get('source') != _source_signature(csv_file):
+        return None
+    return meta
+
+
+def convert_export(csv_file, chunksize=CONVERSION_CHUNKSIZE):
+    """
+    Convert an export into its columnar cache, reading the CSV in chunks.
+
+    :param csv_file: Path to the CSV export
+    :param chunksize: Rows per chunk
+    :return: Metadata of the new cache
+    """
+    folder = cache_folder(csv_file)
+    temporary = folder + '.tmp'
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    source = _source_signature(csv_file)
+    capacity = _count_lines(csv_file)
+    columns = {
+        name: np.lib.format.open_memmap(os.path.join(temporary, f'{file_name}.npy'), mode='w+', dtype=np.float64,
+                                        shape=(capacity,))
+        for name, file_name in CACHE_COLUMNS.items()
+    }
+
+    rows = 0
+    pressure_drop = None
+    dtypes = {name: np.float64 for name in list(CACHE_COLUMNS) + ['Pressure_drop']}
+    reader = pd.read_csv(csv_file, usecols=lambda column: column in dtypes, dtype=dtypes, chunksize=chunksize)
+    for index, chunk in enumerate(reader):
+        if index == 0 and 'Pressure_drop' in chunk.columns and len(chunk) > 0:
+            # Run_CFD.java appends the pressure drop to the first data row only
+            pressure_drop = float(chunk['Pressure_drop'].iloc[0])
+        for name, column in columns.items():
+            column[rows:rows + len(chunk)] = chunk[name].to_numpy()
+        rows += len(chunk)
+    for column in columns.values():
+        column.flush()
+    del columns
+
+    meta = {
+        'version': CACHE_VERSION,
+        'source': source,
+        'rows': rows,
+        'columns': CACHE_COLUMNS,
+        'pressure_drop': None if pressure_drop is None or np.isnan(pressure_drop) else pressure_drop,
+    }
+    with open(os.path.join(temporary, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=2)
+
+    # Replace an outdated cache only once the new one is complete
+    shutil.rmtree(folder, ignore_errors=True)
+    os.replace(temporary, folder)
+    return meta
+
+
+def load_export(csv_file, rebuild=False):
+    """
+    Columns of an export, memory-mapped from its cache; the cache is built first if it is missing or stale.
+
+    :param csv_file: Path to the CSV export
+    :param rebuild: Convert the CSV again even if the cache is valid
+    :return: A tuple (columns, pressure drop); columns maps the CSV column names to read-only arrays
+    """
+    meta = None if rebuild else read_meta(csv_file)
+    if meta is None:
+        meta = convert_export(csv_file)
+
+    folder = cache_folder(csv_file)
+    columns = {
+        name: np.load(os.path.join(folder, f'{file_name}.npy'), mmap_mode='r')[:meta['rows']]
+        for name, file_name in meta['columns'].items()
+    }
+    return columns, meta['pressure_drop']
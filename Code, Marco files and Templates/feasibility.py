@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import itertools
+import os
+import random
+from math import comb
+
+import numpy as np
+
+
+## Precomputed feasibility table of obstacle layouts
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def blocks_channel(edge_list, top_nodes, bottom_nodes):
+    """
+    Check whether a set of obstacle edges forms a path from a top node to a bottom node (union-find).
+    """
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for a, b in edge_list:
+        parent[find(a)] = find(b)
+
+    top_roots = {find(node) for node in top_nodes}
+    return any(find(node) in top_roots for node in bottom_nodes)
+
+
+class FeasibilityTable:
+    """
+    Feasibility of every layout of num_variables obstacles on the edges of the lattice, C(36, 4) = 58,905
+    combinations for the Mixer problem. The table is computed once and cached on disk.
+
+    Layouts are stored as sorted 0-based edge indices in colex order, so the colex rank of a layout is its
+    row in the table. Positions passed in and returned are 1-based, as in solution["variables"].
+    """
+    def __init__(self, edges, top_nodes, bottom_nodes, num_variables=4, cache_file=None):
+        self.edges = [tuple(edge) for edge in edges]
+        self.top_nodes = sorted(top_nodes)
+        self.bottom_nodes = sorted(bottom_nodes)
+        self.num_variables = num_variables
+        self.num_edges = len(self.edges)
+        self.cache_file = cache_file
+
+        # Binomial coefficients for the colex rank: binomials[n, k] = C(n, k)
+        self.binomials = np.array(
+            [[comb(n, k) for k in range(num_variables + 1)] for n in range(self.num_edges + 1)], dtype=np.int64
+        )
+
+        # All layouts in colex order
+        layouts = np.array(list(itertools.combinations(range(self.num_edges), num_variables)), dtype=np.int16)
+        self.layouts = layouts[np.argsort(self.rank_array(layouts), kind='stable')]
+
+        self.feasible = self._load() if cache_file else None
+        if self.feasible is None:
+            self.feasible = self._build()
+            if cache_file:
+                self._save()
+
+        self.feasible_rows = np.flatnonzero(self.feasible)
+        self._build_subset_index()
+
+    def _build(self):
+        print(f"Building feasibility table of {len(self.layouts)} layouts...")
+        feasible = np.zeros(len(self.layouts), dtype=bool)
+        for row, layout in enumerate(self.layouts):
+            edge_list = [self.edges[index] for index in layout]
+            feasible[row] = not blocks_channel(edge_list, self.top_nodes, self.bottom_nodes)
+        print(f"{int(feasible.sum())} of {len(feasible)} layouts are feasible.")
+        return feasible
+
+    def _load(self):
+        if not os.path.exists(self.cache_file):
+            return None
+        try:
+            with np.load(self.cache_file) as data:
+                # Rebuild if the lattice definition changed since the table was saved
+                if (data['edges'].tolist() != [list(edge) for edge in self.edges]
+                        or data['top_nodes'].tolist() != self.top_nodes
+                        or data['bottom_nodes'].tolist() != self.bottom_nodes
+                        or int(data['num_variables']) != self.num_variables):
+                    print(f"Feasibility table '{self.cache_file}' is out of date, rebuilding.")
+                    return None
+                return np.unpackbits(data['feasible'])[:len(self.layouts)].astype(bool)
+        except Exception as e:
+            print(f"Unable to read feasibility table '{self.cache_file}': {e}")
+            return None
+
+    def _save(self):
+        np.savez(
+            self.cache_file,
+            edges=np.array(self.edges),
+            top_nodes=np.array(self.top_nodes),
+            bottom_nodes=np.array(self.bottom_nodes),
+            num_variables=np.array(self.num_variables),
+            feasible=np.packbits(self.feasible),
+        )
+        print(f"Feasibility table saved to '{self.cache_file}'.")
+
+    def _subset_code(self, values):
+        """Integer code of sorted 0-based edge indices (last axis), unique per subset."""
+        values = np.asarray(values, dtype=np.int64)
+        weights = (self.num_edges + 1) ** np.arange(values.shape[-1], dtype=np.int64)
+        return ((values + 1) * weights).sum(axis=-1)
+
+    def _build_subset_index(self):
+        # For every subset of 1..num_variables-1 edges, the feasible layouts that contain it
+        self.subset_index = {}
+        feasible_layouts = self.layouts[self.feasible_rows]
+        for size in range(1, self.num_variables):
+            codes, rows = [], []
+            for columns in itertools.combinations(range(self.num_variables), size):
+                codes.append(self._subset_code(feasible_layouts[:, columns]))
+                rows.append(self.feasible_rows)
+            codes = np.concatenate(codes)
+            rows = np.concatenate(rows)
+            order = np.argsort(codes, kind='stable')
+            self.subset_index[size] = (codes[order], rows[order])
+
+    def rank_array(self, layouts):
+        """Colex rank of an (N, k) array of sorted 0-based layouts."""
+        layouts = np.asarray(layouts, dtype=np.int64)
+        return self.binomials[layouts, np.arange(1, layouts.shape[1] + 1)].sum(axis=1)
+
+    def rank(self, positions):
+        """Colex rank (row in the table) of a layout given as 1-based positions in any order."""
+        indices = sorted(int(pos) - 1 for pos in positions)
+        return int(sum(self.binomials[index, i + 1] for i, index in enumerate(indices)))
+
+    def is_feasible(self, positions):
+        """Check a layout of num_variables distinct 1-based positions."""
+        if len(set(positions)) != self.num_variables:
+            return False
+        return bool(self.feasible[self.rank(positions)])
+
+    def sample(self):
+        """Draw a feasible layout uniformly at random."""
+        row = self.feasible_rows[random.randrange(len(self.feasible_rows))]
+        variables = [int(index) + 1 for index in self.layouts[row]]
+        random.shuffle(variables)
+        return variables
+
+    def completions(self, kept):
+        """
+        Feasible layouts that contain all the kept positions.
+
+        :param kept: Distinct 1-based positions, fewer than num_variables
+        :return: (M, num_variables) array of 1-based layouts
+        """
+        if not kept:
+            return self.layouts[self.feasible_rows] + 1
+        codes, rows = self.subset_index[len(kept)]
+        code = self._subset_code(sorted(int(pos) - 1 for pos in kept))
+        start, end = np.searchsorted(codes, code, side='left'), np.searchsorted(codes, code, side='right')
+        return self.layouts[rows[start:end]] + 1
+
+    def _complete(self, kept, exclude):
+        """Random feasible completion of the kept positions avoiding exclude, as a list of new positions."""
+        candidates = self.completions(kept)
+        if len(candidates) == 0:
+            return None
+        exclude = list(set(exclude) - set(kept))
+        if exclude:
+            allowed = ~np.isin(candidates, exclude).any(axis=1)
+            if allowed.any():
+                candidates = candidates[allowed]
+        layout = candidates[random.randrange(len(candidates))]
+        new_positions = [int(pos) for pos in layout if int(pos) not in kept]
+        random.shuffle(new_positions)
+        return new_positions
+
+    def nearest_feasible(self, positions, exclude=()):
+        """
+        Map a layout to a feasible one that keeps as many of its positions as possible.
+
+        :param positions: 1-based positions, possibly with duplicates or forming a blocked channel
+        :param exclude: Positions that should not be added, if avoidable
+        :return: List of num_variables positions; kept positions stay in their order, new ones follow
+        """
+        unique = [pos for pos in dict.fromkeys(int(pos) for pos in positions) if 1 <= pos <= self.num_edges]
+        unique = unique[:self.num_variables]
+        if len(unique) == self.num_variables and self.is_feasible(unique):
+            return unique
+
+        # Keep the largest subset of the given positions that still has a feasible completion
+        for size in range(min(len(unique), self.num_variables - 1), -1, -1):
+            subsets = list(itertools.combinations(unique, size))
+            random.shuffle(subsets)
+            for subset in subsets:
+                new_positions = self._complete(list(subset), exclude)
+                if new_positions is not None:
+                    return [pos for pos in unique if pos in subset] + new_positions
+        return self.sample()
+
+    def resample(self, positions, slots):
+        """
+        Replace the positions at the given slots with a feasible completion of the other positions.
+        New positions differ from the replaced ones whenever possible.
+
+        :param positions: Feasible list of 1-based positions
+        :param slots: Indices of the positions to replace
+        :return: New list of positions with the same slot order
+        """
+        slots = sorted(set(slots))
+        if not slots:
+            return self.nearest_feasible(positions)
+        kept = [pos for i, pos in enumerate(positions) if i not in slots]
+        new_positions = self._complete(list(dict.fromkeys(kept)), exclude=positions)
+        if new_positions is None:
+            return self.nearest_feasible(positions)
+
+        result = list(positions)
+        for i in slots:
+            result[i] = new_positions.pop()
+        if new_positions:
+            # Duplicates among the kept positions also get new values
+            return self.nearest_feasible(result + new_positions)
+        return result
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+
+## Obstacle geometry of the edge indices
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Test.xlsx converts the edge indices of the 'simple' sheet into the obstacle coordinates read by
+# Creating3D.bas: the 'rule' sheet holds the geometry of the 36 edges (formulas on a 1 mm lattice) and the
+# 'Solidworks' sheet looks every block up with INDEX/MATCH. The same conversion is done here with numpy, for
+# the whole population at once, and written to the CAD manifest that the macro reads line by line
+# (cad_batch.py) or to a flat CSV (OBSTACLE_COLUMNS). validate_against_template checks the conversion against the formulas of the workbook.
+
+X0, Y0 = -5.219213, 4.713037  # Lower left corner of the lattice, in mm
+LENGTH, THICKNESS = 0.5, 0.1  # Obstacle size on the straight edges, in mm
+DIAGONAL_HEIGHT = 5.420143 - Y0  # y extent of the obstacles on the diagonal edges ($I$20 in the 'rule' sheet)
+ANGLES = (7 * math.pi / 4, math.pi / 4)  # Rotation of the two obstacles of a diagonal pair, in radians
+SCALE = 0.001  # mm -> m, the SolidWorks API works in metres
+
+BLOCK_FIELDS = ["x1", "y1", "z1", "x2", "y2", "z2", "angle"]
+OBSTACLE_COLUMNS = ["Design_No."] + [f"block{b}_{field}" for b in range(1, 5) for field in BLOCK_FIELDS]
+
+
+def obstacle_table():
+    """
+    Geometry of the 36 edges, as in the 'rule' sheet: two corners (x1, y1, z1), (x2, y2, z2) in mm and the
+    rotation in radians.
+
+    Edges 1-12 are the obstacles along y (4 columns of 3), edges 13-18 the obstacles along x (3 columns of 2)
+    and edges 19-36 the diagonal pairs (3 columns of 3 pairs, rotated by 7/4 pi and 1/4 pi).
+
+    :return: Array of shape (36, 7), row e - 1 is edge e
+    """
+    table = np.zeros((36, 7))
+    n = np.arange(12)
+    table[:12, 0] = X0 + n // 3
+    table[:12, 1] = Y0 + n % 3
+    table[:12, 3] = table[:12, 0] + THICKNESS
+    table[:12, 4] = table[:12, 1] + LENGTH
+
+    n = np.arange(6)
+    table[12:18, 0] = X0 + LENGTH + n // 2
+    table[12:18, 1] = Y0 + LENGTH + n % 2
+    table[12:18, 3] = table[12:18, 0] + LENGTH
+    table[12:18, 4] = table[12:18, 1] + THICKNESS
+
+    n = np.arange(18)
+    table[18:, 0] = X0 + LENGTH + n // 6
+    table[18:, 1] = Y0 + (n % 6) // 2
+    table[18:, 3] = table[18:, 0] + THICKNESS
+    table[18:, 4] = table[18:, 1] + DIAGONAL_HEIGHT
+    table[18:, 6] = np.where(n % 2 == 0, ANGLES[0], ANGLES[1])
+    return table
+
+
+def obstacle_geometry(layouts, table=None):
+    """
+    Obstacle coordinates of a population, as read by Creating3D.bas (coordinates in m, rotation in radians).
+
+    :param layouts: Array-like of shape (n, 4) of 1-based edge indices, e.g. [sol["variables"] for sol in population]
+    :param table: Edge geometry, obstacle_table() by default
+    :return: Array of shape (n, 4, 7)
+    """
+    table = obstacle_table() if table is None else table
+    geometry = table[np.asarray(layouts, dtype=np.int64) - 1]
+    geometry[..., :6] *= SCALE
+    return geometry
+
+
+def format_geometry(population):
+    """
+    Obstacle geometry of a population as CSV fields, with 17 significant digits so the macro reads the same
+    doubles as computed here.
+
+    :return: List of lists of 28 strings (x1, y1, z1, x2, y2, z2, angle of blocks 1 to 4), one per design
+    """
+    geometry = obstacle_geometry([solution["variables"] for solution in population]).reshape(len(population), -1)
+    return [[f"{value:.17g}" for value in values] for values in geometry]
+
+
+def write_obstacle_file(population, output_file):
+    """
+    Write the obstacle geometry of a population to a CSV file for Creating3D.bas: a header line and one line
+    per design (OBSTACLE_COLUMNS), Design{k} on line k + 1. The file is replaced at once.
+
+    :param population: List of solutions
+    :param output_file: Path to the CSV file
+    :return: Path to the CSV file
+    """
+    output_dir = os.path.dirname(output_file)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    temporary_file = output_file + ".tmp"
+    with open(temporary_file, 'w', encoding='ascii', newline='\r\n') as file:
+        file.write(",".join(OBSTACLE_COLUMNS) + "\n")
+        for k, values in enumerate(format_geometry(population), start=1):
+            file.write(f"{k}," + ",".join(values) + "\n")
+    os.replace(temporary_file, output_file)
+    print(f"Obstacle geometry of {len(population)} designs saved to '{output_file}'.")
+    return output_file
+
+
+def read_obstacle_file(obstacle_file):
+    """Read a file of write_obstacle_file back as an array of shape (n, 4, 7)."""
+    values = np.loadtxt(obstacle_file, delimiter=",", skiprows=1, ndmin=2)
+    return values[:, 1:].reshape(len(values), 4, 7)
+
+
+## Validation against Test.xlsx
+# ----------------------------------------------------------------------------------------------------------------------------
+
+CELL_PATTERN = re.compile(r"\$?([A-Z]+)\$?(\d+)")
+
+
+def evaluate_sheet(sheet):
+    """
+    Values of a sheet whose formulas are arithmetic on cells of the same sheet (the 'rule' sheet).
+
+    :return: Dict {cell coordinate: value}
+    """
+    cells = {cell.coordinate: cell.value for row in sheet.iter_rows() for cell in row if cell.value is not None}
+    values = {}
+
+    def value(coordinate):
+        if coordinate not in values:
+            content = cells.get(coordinate, 0)
+            if isinstance(content, str) and content.startswith("="):
+                expression = CELL_PATTERN.sub(lambda m: repr(value(m.group(1) + m.group(2))), content[1:])
+                if not re.fullmatch(r"[\d.eE+\-*/() ]+", expression):
+                    raise ValueError(f"Unsupported formula in {coordinate}: {content}")
+                content = eval(expression, {"__builtins__": {}})
+            values[coordinate] = content
+        return values[coordinate]
+
+    for coordinate in cells:
+        value(coordinate)
+    return values
+
+
+def validate_against_template(template_file, tolerance=1e-12):
+    """
+    Compare the conversion with the workbook: obstacle_table() with the formulas of the 'rule' sheet, the
+    column layout with the INDEX/MATCH formulas of the 'Solidworks' sheet, and obstacle_geometry() with the
+    values Excel last computed for the designs of the 'simple' sheet.
+
+    :return: Number of designs compared with the computed values of the 'Solidworks' sheet
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(template_file)
+    rule = evaluate_sheet(workbook["rule"])
+    sheet_table = np.array([[float(rule.get(f"{column}{row}", 0)) for column in "BCDEFGH"] for row in range(2, 38)])
+    difference = np.abs(sheet_table - obstacle_table()).max()
+    if difference > tolerance:
+        raise AssertionError(f"The edge geometry differs from the 'rule' sheet by {difference}.")
+
+    # Solidworks!{column}2 = INDEX(rule!B:H, MATCH(simple!{block column}2, rule!A:A, 0), COLUMN()-{offset})[*0.001]
+    formula_pattern = re.compile(r"=INDEX\(rule!B:H, MATCH\(simple!([A-Z])2, rule!A:A, 0\), COLUMN\(\)-(\d+)\)(\*0\.001)?")
+    for index, cell in enumerate(workbook["Solidworks"][2][1:1 + 4 * 7]):
+        block, field = divmod(index, 7)
+        formula = getattr(cell.value, "text", cell.value)
+        match = formula_pattern.fullmatch(str(formula))
+        if match is None:
+            raise AssertionError(f"Unexpected formula in Solidworks!{cell.coordinate}: {formula}")
+        simple_column, offset, scaled = match.groups()
+        # The scale only matters for non-zero fields (block 4 reads z2 = 0 without it)
+        scale_differs = bool(scaled) != (field < 6) and np.any(sheet_table[:, field])
+        if simple_column != "BCDE"[block] or cell.column - int(offset) != field + 1 or scale_differs:
+            raise AssertionError(f"Solidworks!{cell.coordinate} does not read field {BLOCK_FIELDS[field]} of block "
+                                 f"{block + 1}: {formula}")
+
+    # Values cached by Excel for the designs of the 'simple' sheet
+    cached = load_workbook(template_file, data_only=True)
+    compared = 0
+    for row in range(2, cached["Solidworks"].max_row + 1):
+        layout = [cached["simple"].cell(row=row, column=column).value for column in range(2, 6)]
+        values = [cached["Solidworks"].cell(row=row, column=column).value for column in range(2, 30)]
+        if None in layout or None in values:
+            continue
+        difference = np.abs(obstacle_geometry([layout]).ravel() - np.array(values, dtype=float)).max()
+        if difference > tolerance:
+            raise AssertionError(f"Design in row {row} ({layout}) differs from the 'Solidworks' sheet by {difference}.")
+        compared += 1
+    return compared
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from openpyxl import load_workbook
+
+    from optimization import Mixer, generate_initial_population
+
+    template_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test.xlsx")
+    compared = validate_against_template(template_file)
+    print(f"Edge geometry matches the 'rule' and 'Solidworks' sheets ({compared} computed designs compared).")
+
+    # Former handoff (load the template, write the 'simple' sheet, save a copy) against the obstacle file
+    population = generate_initial_population(Mixer(), 100)
+    folder = tempfile.mkdtemp()
+    start = time.perf_counter()
+    workbook = load_workbook(template_file)
+    for row, solution in enumerate(population, start=2):
+        for column, variable in enumerate(solution["variables"], start=2):
+            workbook["simple"].cell(row=row, column=column, value=variable)
+    workbook.save(os.path.join(folder, "Test_1.xlsx"))
+    xlsx_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    obstacle_file = write_obstacle_file(population, os.path.join(folder, "Obstacles.csv"))
+    csv_time = time.perf_counter() - start
+    assert np.array_equal(read_obstacle_file(obstacle_file), obstacle_geometry([s["variables"] for s in population]))
+    print(f"100 designs: Test.xlsx copy {xlsx_time * 1000:.0f} ms ({os.path.getsize(os.path.join(folder, 'Test_1.xlsx')) / 1e3:.0f} kB), "
+          f"obstacle file {csv_time * 1000:.1f} ms ({os.path.getsize(obstacle_file) / 1e3:.0f} kB)")
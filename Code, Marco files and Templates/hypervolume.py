@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+
+## Incremental 2-D Pareto archive with hypervolume bookkeeping
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Points are (MI, pressure drop): MI is maximized, the pressure drop is minimized. The reference point is given
+# in the same objective space as in calculate_hypervolume, e.g. [-1.0, 50.0].
+# Internally a point is stored as (x, y) = (-MI, pressure drop), both minimized.
+
+def hypervolume_contributions(front, reference_point):
+    """
+    Exclusive hypervolume contribution of every point of a mutually non-dominated front.
+
+    :param front: (N, 2) array-like of (MI, pressure drop)
+    :param reference_point: [ref_MI, ref_pressure_drop]
+    :return: (N,) array of contributions, in the order of the input
+    """
+    front = np.asarray(front, dtype=float).reshape(-1, 2)
+    if len(front) == 0:
+        return np.empty(0)
+    rx, ry = -reference_point[0], reference_point[1]
+    x, y = -front[:, 0], front[:, 1]
+
+    order = np.lexsort((y, x))
+    xs, ys = x[order], y[order]
+    next_x = np.minimum(np.append(xs[1:], rx), rx)
+    previous_y = np.minimum(np.insert(ys[:-1], 0, ry), ry)
+    contributions = np.clip(next_x - xs, 0, None) * np.clip(previous_y - ys, 0, None)
+
+    result = np.empty(len(front))
+    result[order] = contributions
+    return result
+
+
+class ParetoArchive:
+    """
+    Maintained 2-D Pareto archive. The members are kept sorted by x in blocks of LOAD to 2 * LOAD members,
+    four parallel lists per block (x, y, payload, exclusive contribution) and the first x of every block for
+    bisection. Insertion bisects the block heads and one block (O(log N)), removes the run of k members the
+    new point dominates and updates the dominated hypervolume and the exclusive contributions of the direct
+    neighbours locally, so an insertion is O(log N + k): splicing shifts at most one block, and the list of
+    blocks only changes when a block is split or merged. The hypervolume can thus be logged after every single
+    evaluation without recomputing the whole front.
+    """
+    LOAD = 64
+
+    def __init__(self, reference_point):
+        self.reference_point = list(reference_point)
+        self.rx = -reference_point[0]
+        self.ry = reference_point[1]
+
+        # Blocks sorted by x ascending, so y is strictly descending across the whole archive
+        self._xs = []
+        self._ys = []
+        self._payloads = []
+        self._contributions = []
+        self._firsts = []
+        self.hypervolume = 0.0
+
+    def __len__(self):
+        return sum(len(block) for block in self._xs)
+
+    @property
+    def payloads(self):
+        """Payloads of the members, sorted by MI descending."""
+        return [payload for block in self._payloads for payload in block]
+
+    @property
+    def contributions(self):
+        """Exclusive hypervolume contributions of the members, sorted by MI descending."""
+        return [contribution for block in self._contributions for contribution in block]
+
+    def points(self):
+        """Archive members as a list of (MI, pressure drop), sorted by MI descending."""
+        return [(-x, y) for xs, ys in zip(self._xs, self._ys) for x, y in zip(xs, ys)]
+
+    def _columns(self):
+        return self._xs, self._ys, self._payloads, self._contributions
+
+    def _position(self, x):
+        """(block, offset) of the first member with an x not smaller than x; the offset may be the block length."""
+        if not self._xs:
+            return 0, 0
+        block = max(bisect_right(self._firsts, x) - 1, 0)
+        return block, bisect_left(self._xs[block], x)
+
+    def _step(self, block, offset, step):
+        """(block, offset) of the member step (-1 or +1) places away, or None past either end."""
+        offset += step
+        if offset < 0:
+            if block == 0:
+                return None
+            return block - 1, len(self._xs[block - 1]) - 1
+        if offset >= len(self._xs[block]):
+            if block + 1 == len(self._xs):
+                return None
+            return block + 1, 0
+        return block, offset
+
+    def _member(self, block, offset):
+        """(block, offset) of the member at a position returned by _position(), or None at the end."""
+        if not self._xs:
+            return None
+        if offset < len(self._xs[block]):
+            return block, offset
+        return self._step(block, offset - 1, 1)
+
+    def _locate(self, index):
+        """(block, offset) of the member at an index of the sorted archive."""
+        if index < 0:
+            index += len(self)
+        for block, xs in enumerate(self._xs):
+            if index < len(xs):
+                return block, index
+            index -= len(xs)
+        raise IndexError("ParetoArchive index out of range")
+
+    def _split(self, block):
+        if len(self._xs[block]) > 2 * self.LOAD:
+            for column in self._columns():
+                column.insert(block + 1, column[block][self.LOAD:])
+                del column[block][self.LOAD:]
+            self._firsts.insert(block + 1, self._xs[block + 1][0])
+
+    def _merge(self, block):
+        """Merge a block that fell below LOAD / 2 members into a neighbour."""
+        if not 0 <= block < len(self._xs) or len(self._xs) == 1 or len(self._xs[block]) >= self.LOAD // 2:
+            return
+        if block + 1 == len(self._xs):
+            block -= 1
+        for column in self._columns():
+            column[block].extend(column[block + 1])
+            del column[block + 1]
+        del self._firsts[block + 1]
+        self._split(block)
+
+    def _insert(self, x, y, payload):
+        if not self._xs:
+            for column, value in zip(self._columns(), (x, y, payload, 0.0)):
+                column.append([value])
+            self._firsts.append(x)
+            return
+        block, offset = self._position(x)
+        for column, value in zip(self._columns(), (x, y, payload, 0.0)):
+            column[block].insert(offset, value)
+        if offset == 0:
+            self._firsts[block] = x
+        self._split(block)
+
+    def _delete(self, block, offset, count):
+        """Delete count consecutive members from (block, offset) on."""
+        first_block = block
+        while count:
+            n = min(count, len(self._xs[block]) - offset)
+            for column in self._columns():
+                del column[block][offset:offset + n]
+            count -= n
+            if not self._xs[block]:
+                for column in self._columns():
+                    del column[block]
+                del self._firsts[block]
+            else:
+                self._firsts[block] = self._xs[block][0]
+                block += 1
+            offset = 0
+        # At most the first and the last block of the run are left partially filled, and they are now adjacent
+        self._merge(first_block + 1)
+        self._merge(first_block)
+
+    def _refresh(self, x):
+        """Recompute the exclusive contribution of the member with the given x."""
+        block, offset = self._position(x)
+        following = self._step(block, offset, 1)
+        previous = self._step(block, offset, -1)
+        next_x = self._xs[following[0]][following[1]] if following else self.rx
+        previous_y = self._ys[previous[0]][previous[1]] if previous else self.ry
+        self._contributions[block][offset] = (max(0.0, min(next_x, self.rx) - self._xs[block][offset])
+                                              * max(0.0, min(previous_y, self.ry) - self._ys[block][offset]))
+
+    def _term(self, x, y, next_x):
+        """Staircase area between a member and the next member (or the reference point)."""
+        return max(0.0, min(next_x, self.rx) - x) * max(0.0, self.ry - y)
+
+    def dominated(self, mi, pressure_drop):
+        """Check whether a point is dominated by (or equal to) an archive member."""
+        x, y = -float(mi), float(pressure_drop)
+        block, offset = self._position(x)
+        member = self._member(block, offset)
+        if member is not None and self._xs[member[0]][member[1]] == x and self._ys[member[0]][member[1]] <= y:
+            return True
+        previous = self._step(block, offset, -1) if self._xs else None
+        return previous is not None and self._ys[previous[0]][previous[1]] <= y
+
+    def insert(self, mi, pressure_drop, payload=None):
+        """
+        Insert an evaluated point.
+
+        :param mi: Mixing index (maximized)
+        :param pressure_drop: Pressure drop (minimized)
+        :param payload: Optional object stored with the point, e.g. the solution dict
+        :return: List of payloads of the members removed because the new point dominates them, or None if
+                 the new point itself is dominated (the archive is then unchanged)
+        """
+        x, y = -float(mi), float(pressure_drop)
+        if np.isnan(x) or np.isnan(y) or self.dominated(mi, pressure_drop):
+            return None
+
+        block, offset = self._position(x)
+        previous = self._step(block, offset, -1) if self._xs else None
+
+        # Members dominated by the new point follow it directly: x >= new x and y >= new y
+        start = member = self._member(block, offset)
+        run_xs, run_ys, removed = [], [], []
+        while member is not None and self._ys[member[0]][member[1]] >= y:
+            run_xs.append(self._xs[member[0]][member[1]])
+            run_ys.append(self._ys[member[0]][member[1]])
+            removed.append(self._payloads[member[0]][member[1]])
+            member = self._step(*member, 1)
+        next_x = self._xs[member[0]][member[1]] if member is not None else self.rx
+
+        # Hypervolume change, restricted to the previous member and the run it replaces
+        before = sum(self._term(run_x, run_y, following)
+                     for run_x, run_y, following in zip(run_xs, run_ys, run_xs[1:] + [next_x]))
+        after = self._term(x, y, next_x)
+        if previous is not None:
+            previous_x, previous_y = self._xs[previous[0]][previous[1]], self._ys[previous[0]][previous[1]]
+            before += self._term(previous_x, previous_y, run_xs[0] if run_xs else next_x)
+            after += self._term(previous_x, previous_y, x)
+        self.hypervolume += after - before
+
+        if removed:
+            self._delete(*start, len(removed))
+        self._insert(x, y, payload)
+
+        # Only the new member and its direct neighbours change their exclusive contribution
+        self._refresh(x)
+        if previous is not None:
+            self._refresh(previous_x)
+        if member is not None:
+            self._refresh(next_x)
+        return removed
+
+    def remove(self, index):
+        """
+        Remove the member at the given index of the sorted archive; the hypervolume drops by its exclusive
+        contribution. Locating the index walks the block lengths, O(N / LOAD).
+
+        :return: Payload of the removed member
+        """
+        block, offset = self._locate(index)
+        neighbours = [self._xs[b][o] for b, o in filter(None, (self._step(block, offset, -1),
+                                                                self._step(block, offset, 1)))]
+        self.hypervolume -= self._contributions[block][offset]
+        payload = self._payloads[block][offset]
+        self._delete(block, offset, 1)
+        for x in neighbours:
+            self._refresh(x)
+        return payload
+
+    def least_contributor(self):
+        """Index of the member with the smallest exclusive hypervolume contribution."""
+        return int(np.argmin(self.contributions))
+
+    def contribution_of(self, payload):
+        """Exclusive contribution of the member stored with the given payload (0.0 if it is not a member)."""
+        for i, member in enumerate(self.payloads):
+            if member is payload:
+                return self.contributions[i]
+        return 0.0
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+## Per-stage timing and resource instrumentation
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Every stage of a campaign (offspring generation, template I/O, CAD, CFD, post-processing, survival, ...)
+# is recorded as one JSON line in an append-only log, per generation and, where the work is split by
+# design, per design:
+#
+#   {"stage": "cfd_job", "generation": 3, "design": "Design2", "parent": "cfd", "start": ..., "end": ...,
+#    "wall": 812.4, "cpu": 0.02, "children_cpu": 0.0, "peak_rss_mb": 145.2, "bytes": 48211456, "files": 1}
+#
+# Recording is off until configure() is called, so the modules can be instrumented unconditionally.
+# The log path and the context (generation) are passed to worker processes through environment
+# variables; each event is a single append, so processes can share the log.
+# python instrumentation.py report campaign.jsonl prints the stage breakdown and the critical path.
+
+LOG_VARIABLE = "INSTRUMENTATION_LOG"
+CONTEXT_VARIABLE = "INSTRUMENTATION_CONTEXT"
+
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(log_file):
+    """Start recording to log_file (appended to); None stops recording."""
+    if log_file is None:
+        os.environ.pop(LOG_VARIABLE, None)
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    os.environ[LOG_VARIABLE] = os.path.abspath(log_file)
+
+
+def enabled():
+    return bool(os.environ.get(LOG_VARIABLE))
+
+
+def set_context(**context):
+    """Fields added to every following event of this process and of the processes it starts (e.g. generation)."""
+    current = json.loads(os.environ.get(CONTEXT_VARIABLE, "{}"))
+    current.update(context)
+    os.environ[CONTEXT_VARIABLE] = json.dumps(current)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None if it cannot be read."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1e6
+    except (ImportError, AttributeError):
+        return None
+
+
+def children_cpu_time():
+    """CPU time of the finished child processes (solver runs); always 0 on Windows."""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def file_bytes(files):
+    """Total size of the existing files."""
+    return sum(os.path.getsize(f) for f in files if os.path.isfile(f))
+
+
+def _write(event):
+    line = (json.dumps(event, default=str) + "\n").encode("utf-8")
+    with _lock:
+        file = os.open(os.environ[LOG_VARIABLE], os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        try:
+            os.write(file, line)
+        finally:
+            os.close(file)
+
+
+def record(stage_name, wall, start=None, design=None, files=(), **fields):
+    """
+    Record an event that was timed elsewhere, e.g. a solver process of the CFD job pool.
+
+    :param stage_name: Name of the stage
+    :param wall: Wall time in seconds
+    :param start: Start time (epoch seconds), defaults to now minus wall
+    :param design: Design ID, None for events of a whole batch
+    :param files: Files produced by the stage; their total size is recorded
+    """
+    if not enabled():
+        return
+    end = time.time() if start is None else start + wall
+    stack = getattr(_local, "stack", [])
+    event = json.loads(os.environ.get(CONTEXT_VARIABLE, "{}"))
+    event.update({
+        "stage": stage_name,
+        "design": design,
+        "parent": stack[-1] if stack else None,
+        "pid": os.getpid(),
+        "start": end - wall,
+        "end": end,
+        "wall": wall,
+        "peak_rss_mb": peak_rss_mb(),
+        "bytes": file_bytes(files),
+        "files": len(files),
+    })
+    event.update(fields)
+    _write(event)
+
+
+@contextmanager
+def stage(stage_name, design=None, files=(), **fields):
+    """
+    Time a block of code as one stage:
+
+        with stage("template", generation=i):
+            save_population_to_template(...)
+
+    :param files: Files produced by the stage, or a callable returning them once the stage has finished
+    """
+    if not enabled():
+        yield
+        return
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(stage_name)
+    start, cpu, children = time.time(), time.process_time(), children_cpu_time()
+    try:
+        yield
+    finally:
+        stack.pop()
+        wall = time.time() - start
+        produced = files() if callable(files) else files
+        record(stage_name, wall, start, design, produced, cpu=time.process_time() - cpu,
+               children_cpu=children_cpu_time() - children, **fields)
+
+
+## Report
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def read_log(log_file):
+    """Events of a log; lines that cannot be parsed (e.g. an interrupted write) are skipped."""
+    events = []
+    with open(log_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+def stage_breakdown(events):
+    """
+    Total time per stage.
+
+    :return: List of dicts {stage, parent, count, wall, mean, max, cpu, children_cpu, peak_rss_mb, bytes},
+             sorted by total wall time
+    """
+    groups = defaultdict(list)
+    for event in events:
+        groups[(event["stage"], event.get("parent"))].append(event)
+    rows = []
+    for (name, parent), group in groups.items():
+        walls = [event["wall"] for event in group]
+        rss = [event["peak_rss_mb"] for event in group if event.get("peak_rss_mb") is not None]
+        rows.append({
+            "stage": name,
+            "parent": parent,
+            "count": len(group),
+            "wall": sum(walls),
+            "mean": sum(walls) / len(walls),
+            "max": max(walls),
+            "cpu": sum(event.get("cpu", 0.0) for event in group),
+            "children_cpu": sum(event.get("children_cpu", 0.0) for event in group),
+            "peak_rss_mb": max(rss) if rss else None,
+            "bytes": sum(event.get("bytes", 0) for event in group),
+        })
+    return sorted(rows, key=lambda row: -row["wall"])
+
+
+def critical_path(events):
+    """
+    Per generation: wall time from the first to the last event, the top-level stage that took longest, and
+    the slowest design of every per-design stage, i.e. the design that kept the generation waiting.
+
+    :return: List of dicts {generation, span, stages: {stage: wall}, bottleneck, stragglers: {stage: (design, wall, mean)}}
+    """
+    by_generation = defaultdict(list)
+    for event in events:
+        by_generation[event.get("generation")].append(event)
+
+    rows = []
+    for generation, group in sorted(by_generation.items(), key=lambda item: (item[0] is None, item[0] or 0)):
+        top_level = defaultdict(float)
+        for event in group:
+            if event.get("parent") is None and event.get("design") is None:
+                top_level[event["stage"]] += event["wall"]
+        per_design = defaultdict(list)
+        for event in group:
+            if event.get("design") is not None:
+                per_design[event["stage"]].append(event)
+        stragglers = {}
+        for name, design_events in per_design.items():
+            slowest = max(design_events, key=lambda event: event["wall"])
+            mean = sum(event["wall"] for event in design_events) / len(design_events)
+            stragglers[name] = (slowest["design"], slowest["wall"], mean)
+        rows.append({
+            "generation": generation,
+            "span": max(event["end"] for event in group) - min(event["start"] for event in group),
+            "stages": dict(top_level),
+            "bottleneck": max(top_level, key=top_level.get) if top_level else None,
+            "stragglers": stragglers,
+        })
+    return rows
+
+
+def initialization_breakdown(events):
+    """
+    Solver runs of the CFD job pool grouped by initialization (warm start from a converged design or cold
+    start from the blank simulation).
+
+    :return: List of dicts {initialization, count, wall, iterations}, with the mean wall time and iterations
+    """
+    groups = defaultdict(list)
+    for event in events:
+        if event["stage"] == "cfd_job" and event.get("status") == "done":
+            groups[event.get("initialization", "cold")].append(event)
+    rows = []
+    for initialization, group in sorted(groups.items()):
+        iterations = [event["iterations"] for event in group if event.get("iterations") is not None]
+        rows.append({
+            "initialization": initialization,
+            "count": len(group),
+            "wall": sum(event["wall"] for event in group) / len(group),
+            "iterations": sum(iterations) / len(iterations) if iterations else None,
+        })
+    return rows
+
+
+def print_report(log_file):
+    events = read_log(log_file)
+    if not events:
+        print(f"No events in {log_file}.")
+        return
+    total = max(event["end"] for event in events) - min(event["start"] for event in events)
+    print(f"{len(events)} events, {total:.1f} s from the first to the last one.\n")
+
+    print("Stage breakdown (share of the campaign wall time; nested stages are indented under their parent, "
+          "stages run in parallel can exceed 100 %)")
+    print(f"{'stage':<32} {'count':>6} {'wall (s)':>10} {'share':>7} {'mean (s)':>10} {'max (s)':>10} "
+          f"{'cpu (s)':>9} {'child cpu':>10} {'rss (MB)':>9} {'MB out':>9}")
+    rows = stage_breakdown(events)
+
+    def print_rows(parent, depth):
+        for row in rows:
+            if row["parent"] != parent:
+                continue
+            rss = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+            name = "  " * depth + row["stage"]
+            print(f"{name:<32} {row['count']:>6} {row['wall']:>10.2f} {row['wall'] / total:>7.1%} "
+                  f"{row['mean']:>10.3f} {row['max']:>10.3f} {row['cpu']:>9.2f} {row['children_cpu']:>10.2f} "
+                  f"{rss:>9} {row['bytes'] / 1e6:>9.1f}")
+            if depth < 4:
+                print_rows(row["stage"], depth + 1)
+
+    print_rows(None, 0)
+
+    print("\nCritical path per generation")
+    for row in critical_path(events):
+        label = "-" if row["generation"] is None else row["generation"]
+        stages = ", ".join(f"{name} {wall:.1f} s" for name, wall in
+                           sorted(row["stages"].items(), key=lambda item: -item[1]))
+        print(f"Generation {label}: {row['span']:.1f} s, bottleneck {row['bottleneck']} ({stages})")
+        for name, (design, wall, mean) in sorted(row["stragglers"].items()):
+            print(f"    slowest {name}: {design} {wall:.1f} s (mean {mean:.1f} s, {wall / mean if mean else 0:.1f}x)")
+
+    rows = initialization_breakdown(events)
+    if rows:
+        print("\nCFD runs by initialization")
+        for row in rows:
+            iterations = f"{row['iterations']:.0f}" if row["iterations"] is not None else "-"
+            print(f"{row['initialization']:<6} {row['count']:>6} runs, mean {row['wall']:.1f} s and {iterations} iterations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Instrumentation log tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="Stage breakdown and critical path of a log")
+    report_parser.add_argument("log_file")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print_report(args.log_file)
@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import random
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from feasibility import FeasibilityTable
+from hypervolume import hypervolume_contributions
+from ranking import crowding_distance, fronts_from_ranks, non_dominated_ranks, objectives_array
+
+
+## Functions for optimization algorithm   
+# ----------------------------------------------------------------------------------------------------------------------------
+
+class Mixer:
+    """
+    Custom problem for optimization.
+    """
+    def __init__(self, feasibility_file="feasible_layouts.npz"):
+        self.num_variables = 4
+        self.num_objectives = 2
+        self.lower_bounds = [1] * self.num_variables
+        self.upper_bounds = [36] * self.num_variables
+        self.edges = [
+            (9, 13), (5, 9), (1, 5), (10, 14), (6, 10), (2, 6),
+            (11, 15), (7, 11), (3, 7), (12, 16), (8, 12), (4, 8),
+            (9, 10), (5, 6), (10, 11), (6, 7), (11, 12), (7, 8),
+            (10, 13), (9, 14), (6, 9), (5, 10), (2, 5), (1, 6),
+            (11, 14), (10, 15), (7, 10), (6, 11), (3, 6), (2, 7),
+            (12, 15), (11, 16), (11, 8), (7, 12), (4, 7), (3, 8)
+        ]
+        self.top_nodes = {1, 2, 3, 4}
+        self.bottom_nodes = {13, 14, 15, 16}
+
+        # Feasibility of all C(36, 4) layouts, loaded (or built) on first use
+        self.feasibility_file = feasibility_file
+        self._feasibility = None
+
+    @property
+    def feasibility(self):
+        if self._feasibility is None:
+            self._feasibility = FeasibilityTable(
+                self.edges, self.top_nodes, self.bottom_nodes, self.num_variables, self.feasibility_file
+            )
+        return self._feasibility
+
+    def repair_solution(self, positions):
+        """
+        Repair solution to ensure no invalid connections, no duplicate edges,
+        and maintain the required number of variables.
+        The solution is mapped to the feasible layout that keeps most of its edges, using the precomputed
+        feasibility table, so the cost is constant and the repair always terminates.
+        """
+        return self.feasibility.nearest_feasible(positions)
+
+    def repair_solution_by_graph(self, positions):
+        """
+        Original graph-based repair: removes path edges and adds random edges until no top-to-bottom path remains.
+        """
+        # Ensure positions are integers
+        positions = [int(pos) for pos in positions]
+
+        # Remove duplicates while preserving the order
+        positions = list(dict.fromkeys(positions))
+
+        # Get the edges corresponding to the positions
+        selected_edges = [self.edges[pos - 1] for pos in positions if pos - 1 < len(self.edges)]
+
+        # Build the graph from the selected edges
+        g = nx.Graph()
+        g.add_edges_from(selected_edges)
+
+        # Explicitly add all possible nodes to the graph
+        g.add_nodes_from(range(1, 17))  # Nodes are 1 to 16
+
+        # Ensure no invalid top-to-bottom connections
+        top_nodes = self.top_nodes
+        bottom_nodes = self.bottom_nodes
+
+        # Remove invalid connections
+        while self.has_top_to_bottom_path(g, top_nodes, bottom_nodes):
+            # Get the path causing the issue
+            path = self.get_top_to_bottom_path(g, top_nodes, bottom_nodes)
+
+            # Convert the path into edge tuples
+            path_edges = [(path[i], path[i + 1]) for i in range(len(path) - 1)]
+
+            # Find the first edge in the path to remove
+            edge_to_remove = None
+            for edge in path_edges:
+                if edge in selected_edges or tuple(reversed(edge)) in selected_edges:
+                    edge_to_remove = edge if edge in selected_edges else tuple(reversed(edge))
+                    break
+
+            if edge_to_remove:
+                # Remove the edge from the graph and the selected edges
+                selected_edges.remove(edge_to_remove)
+                g.remove_edge(*edge_to_remove)
+
+                # Add a new random edge not in the solution
+                new_edge = random.choice(
+                    [e for e in self.edges if e not in selected_edges and tuple(reversed(e)) not in selected_edges]
+                )
+                selected_edges.append(new_edge)
+                g.add_edge(*new_edge)
+            else:
+                # If no edge can be removed, break to prevent infinite loops
+                break
+
+        # Ensure unique edges in the solution
+        unique_edges = []
+        edge_set = set()
+        for edge in selected_edges:
+            if edge not in edge_set and tuple(reversed(edge)) not in edge_set:
+                unique_edges.append(edge)
+                edge_set.add(edge)
+
+        # Add new valid unique edges if the solution has fewer than the required number of variables
+        while len(unique_edges) < self.num_variables:
+            new_edge = random.choice(
+                [e for e in self.edges if e not in edge_set and tuple(reversed(e)) not in edge_set]
+            )
+            unique_edges.append(new_edge)
+            edge_set.add(new_edge)
+            g.add_edge(*new_edge)
+
+        # Map repaired edges back to their positions (ensure no duplicates in positions)
+        repaired_positions = [self.edges.index(edge) + 1 for edge in unique_edges]
+        return repaired_positions
+
+    def has_top_to_bottom_path(self, g, top_nodes, bottom_nodes):
+        """ Check if there is a path from any top node to any bottom node. """
+        for top_node in top_nodes:
+            for bottom_node in bottom_nodes:
+                if nx.has_path(g, top_node, bottom_node):
+                    return True
+        return False
+
+    def get_top_to_bottom_path(self, g, top_nodes, bottom_nodes):
+        """ Get any path from top to bottom if it exists. """
+        for top_node in top_nodes:
+            for bottom_node in bottom_nodes:
+                if nx.has_path(g, top_node, bottom_node):
+                    return nx.shortest_path(g, top_node, bottom_node)
+        return None
+
+    def create_solution(self):
+        """
+        Create a random solution, drawn directly from the feasible layouts.
+        """
+        variables = self.feasibility.sample()
+        return {"variables": variables, "objectives": [0.0, 0.0]}
+
+
+def calculate_hypervolume(front, reference_point):
+    """
+    Calculate the HyperVolume (HV) of the Pareto front for mixed objectives.
+
+    Args:
+        front (list of lists): The Pareto front as a list of [obj1, obj2] points.
+        reference_point (list): The reference point as [ref_obj1, ref_obj2].
+
+    Returns:
+        float: The computed hypervolume.
+    """
+    if not front:
+        print("no input front")
+        return 0.0
+
+    # Adjust the front and the reference point for uniform minimization (invert the maximization objective)
+    adjusted_front = [[-obj[0], obj[1]] for obj in front]
+    reference_point = [-reference_point[0], reference_point[1]]
+
+    # Sort the front by the first objective (obj1, descending)
+    sorted_front = sorted(adjusted_front, key=lambda x: x[0], reverse=True)
+
+    # Initialize hypervolume
+    hv = 0.0
+
+    # Calculate the hypervolume using rectangles
+    for i in range(len(sorted_front)):
+        current_point = sorted_front[i]
+
+        # Calculate width (difference in obj1)
+        if i == 0:
+            width = reference_point[0] - current_point[0]
+        else:
+            width = sorted_front[i - 1][0] - current_point[0]
+
+        # Calculate height (difference in obj2)
+        height = reference_point[1] - current_point[1]
+
+        # Only add positive areas
+        if width > 0 and height > 0:
+            hv += width * height
+
+    return hv
+
+
+def ensure_integer_variables(solution):
+    """
+    Ensure that all variables in a solution are integers.
+    """
+    solution["variables"] = [int(var) for var in solution["variables"]]
+    return solution
+
+def evaluate_offspring_from_file(offspring, filepath):
+    """
+    Load fitness values for offspring from a file and assign objectives.
+    """
+    data = pd.read_csv(filepath)
+    print(f"Number of rows in file: {len(data)}")
+    for i, solution in enumerate(offspring):
+        solution["objectives"][0] = data.iloc[i, -2]  # Assuming second last column is Obj1
+        solution["objectives"][1] = data.iloc[i, -1]  # Assuming last column is Obj2
+
+    return offspring
+
+def load_pre_existing_population(filepath, problem):
+    """
+    Load pre-existing solutions from the provided CSV file.
+    """
+    pre_existing_data = pd.read_csv(filepath)
+    population = []
+    for _, row in pre_existing_data.iterrows():
+        solution = {
+            "variables": [
+                row["block1 position"],
+                row["block2 position"],
+                row["block3 position"],
+                row["block4 position"],
+            ],
+            "objectives": [row["Obj1"], row["Obj2"]],
+        }
+        population.append(solution)
+    return population
+
+def identify_pareto_front(population, target_size=3):
+    """
+    Identify a population of size target_size, containing Pareto fronts in sequence.
+    """
+    ranks = non_dominated_ranks(objectives_array(population))
+    order = np.argsort(ranks, kind='stable')[:target_size]
+    return [population[i] for i in order]
+
+def generate_initial_population(problem, population_size):
+    """
+    Generate an initial population with feasible solutions.
+    """
+    population = []
+    while len(population) < population_size:
+        solution = problem.create_solution()
+        solution["variables"] = problem.repair_solution(solution["variables"])  # Ensure feasibility
+        population.append(solution)
+    return population
+
+def dominates(solution_a, solution_b):
+    """
+    Check if solution_a dominates solution_b.
+    """
+    return dominates_solution(solution_a, solution_b)
+
+
+def non_dominated_sorting(population):
+    """
+    Perform non-dominated sorting on the population.
+    Sets the "rank" of every solution and returns the fronts, best first.
+    """
+    ranks = non_dominated_ranks(objectives_array(population))
+    for solution, rank in zip(population, ranks.tolist()):
+        solution["rank"] = rank
+
+    return [[population[i] for i in front] for front in fronts_from_ranks(ranks)]
+
+
+def dominates_solution(sol_a, sol_b):
+    """
+    Check if solution A dominates solution B.
+    Maximize Objective 1 and Minimize Objective 2.
+    """
+    better_in_all = (sol_a["objectives"][0] >= sol_b["objectives"][0]) and (sol_a["objectives"][1] <= sol_b["objectives"][1])
+    better_in_one = (sol_a["objectives"][0] > sol_b["objectives"][0]) or (sol_a["objectives"][1] < sol_b["objectives"][1])
+    return better_in_all and better_in_one
+
+
+def tournament_selection(population, k=2):
+    """
+    Perform tournament selection.
+    Ties in rank are broken by density: the solution in the less crowded region wins.
+    """
+    selected = random.sample(population, k)
+    return min(selected, key=lambda sol: (sol["rank"], -sol.get("density", 0.0)))
+
+def crossover(parent1, parent2, crossover_rate, problem=None):
+    """
+    Perform single-point crossover and ensure unique and valid offspring.
+    """
+    if random.random() > crossover_rate:
+        # If crossover doesn't occur, return parents as offspring
+        # print(f"No crossover applied. Returning parents as offspring.")
+        return parent1, parent2
+
+    # Choose a random crossover point
+    point = random.randint(1, len(parent1["variables"]) - 1)
+
+    # Combine parts from both parents
+    child1_vars = parent1["variables"][:point] + parent2["variables"][point:]
+    child2_vars = parent2["variables"][:point] + parent1["variables"][point:]
+
+    # print(f"Crossover point: {point}")
+    # print(f"Before Repair - Child 1: {child1_vars}")
+    # print(f"Before Repair - Child 2: {child2_vars}")
+
+    # Create offspring solutions
+    child1 = {"variables": child1_vars, "objectives": [0.0, 0.0]}
+    child2 = {"variables": child2_vars, "objectives": [0.0, 0.0]}
+
+    # Repair offspring to ensure validity
+    if problem:
+        child1["variables"] = problem.repair_solution(child1["variables"])
+        child2["variables"] = problem.repair_solution(child2["variables"])
+
+    # Ensure variables are integers
+    child1 = ensure_integer_variables(child1)
+    child2 = ensure_integer_variables(child2)
+
+    return child1, child2
+
+def is_duplicate(candidate, population):
+    """
+    Check if a candidate solution is already in the population.
+    """
+    candidate_vars = set(candidate["variables"])
+    for solution in population:
+        if set(solution["variables"]) == candidate_vars:
+            return True
+    return False
+
+def mutate(solution, mutation_rate, problem=None):
+    """
+    Perform mutation on a solution and ensure unique and valid variables.
+    With a problem definition, mutated variables are drawn directly from the feasible layouts.
+    """
+    slots = [i for i in range(len(solution["variables"])) if random.random() < mutation_rate]
+
+    if problem:
+        solution["variables"] = problem.repair_solution(solution["variables"])
+        solution["variables"] = problem.feasibility.resample(solution["variables"], slots)
+    else:
+        for i in slots:
+            new_var = random.randint(1, 36)
+            # Replace variable at index `i` with a new one that doesn't duplicate
+            while new_var in solution["variables"]:
+                new_var = random.randint(1, 36)
+            solution["variables"][i] = new_var
+    solution["objectives"] = [0.0, 0.0]
+
+    return ensure_integer_variables(solution)
+
+def crowding_density(objectives, reference_point=None):
+    """Crowding distance of every point of a front."""
+    return crowding_distance(objectives)
+
+
+def hypervolume_density(objectives, reference_point):
+    """Exclusive hypervolume contribution of every point of a front."""
+    return hypervolume_contributions(objectives, reference_point)
+
+
+# Density estimators for survival and tournament tie-breaking, on the (N, 2) objectives of one front: larger
+# values mean a more isolated solution
+DENSITY_ESTIMATORS = {
+    "crowding": crowding_density,
+    "hypervolume": hypervolume_density,
+}
+
+
+def front_density(objectives, density, reference_point=None):
+    """
+    Density of the points of one front.
+
+    :param objectives: (N, 2) objectives of the front
+    :param density: Name in DENSITY_ESTIMATORS or a callable density(objectives, reference_point) -> values
+    :param reference_point: Reference point, needed by the hypervolume estimator
+    """
+    if isinstance(density, str) and density not in DENSITY_ESTIMATORS:
+        raise ValueError(f"Unknown density estimator '{density}'.")
+    estimator = DENSITY_ESTIMATORS[density] if isinstance(density, str) else density
+    return np.asarray(estimator(objectives, reference_point), dtype=float)
+
+
+def truncate_points(objectives, size, density, reference_point=None):
+    """
+    Points of a front to keep when only size of them survive. Crowding distance is computed once (NSGA-II);
+    other estimators are recomputed after every removal, so e.g. the least hypervolume contributor is dropped
+    one at a time. Used by truncate_front and by the array-backed Population.select.
+
+    :param objectives: (N, 2) objectives of the front
+    :return: A tuple (indices of the kept points, their densities)
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    values = front_density(objectives, density, reference_point)
+    if density == "crowding":
+        keep = np.argsort(-values, kind='stable')[:size]
+        return keep, values[keep]
+
+    keep = np.arange(len(objectives))
+    while len(keep) > size:
+        keep = np.delete(keep, np.argmin(values))
+        values = front_density(objectives[keep], density, reference_point)
+    return keep, values
+
+
+def assign_density(front, density, reference_point=None):
+    """
+    Set the "density" of every solution of a front.
+
+    :param front: List of solutions of the same rank
+    :param density: Name in DENSITY_ESTIMATORS or a callable, see front_density
+    :param reference_point: Reference point, needed by the hypervolume estimator
+    """
+    for solution, value in zip(front, front_density(objectives_array(front), density, reference_point)):
+        solution["density"] = float(value)
+
+
+def truncate_front(front, size, density, reference_point=None):
+    """Keep the size most isolated solutions of a front, with their density set, see truncate_points."""
+    keep, values = truncate_points(objectives_array(front), size, density, reference_point)
+    survivors = [front[i] for i in keep]
+    for solution, value in zip(survivors, values):
+        solution["density"] = float(value)
+    return survivors
+
+
+def select_next_generation(population, population_size, density=None, reference_point=None):
+    """
+    Perform non-dominated sorting and keep the best unique solutions, front by front.
+
+    :param population: Combined parents and offspring
+    :param population_size: Number of survivors
+    :param density: None to truncate the last front in list order, or a density estimator
+                    ("crowding", "hypervolume" or a callable) used to truncate it and to break tournament ties
+    :param reference_point: Reference point, needed by the hypervolume estimator
+    :return: List of survivors
+    """
+    if density is not None:
+        # Remove duplicate designs before ranking, so copies of one solution do not fill a front
+        unique_population = {}
+        for solution in population:
+            unique_population.setdefault(tuple(sorted(solution["variables"])), solution)
+
+        next_generation = []
+        for front in non_dominated_sorting(list(unique_population.values())):
+            if len(next_generation) + len(front) <= population_size:
+                assign_density(front, density, reference_point)
+                next_generation.extend(front)
+            else:
+                next_generation.extend(truncate_front(front, population_size - len(next_generation), density, reference_point))
+            if len(next_generation) >= population_size:
+                break
+        return next_generation
+
+    fronts = non_dominated_sorting(population)
+    next_generation = []
+    unique_solutions = set()  # Track unique solutions
+
+    for front in fronts:
+        for solution in front:
+            solution_tuple = tuple(sorted(solution["variables"]))
+            if solution_tuple not in unique_solutions:
+                next_generation.append(solution)
+                unique_solutions.add(solution_tuple)
+            if len(next_generation) >= population_size:
+                break
+        if len(next_generation) >= population_size:
+            break
+
+    return next_generation
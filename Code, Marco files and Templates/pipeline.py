@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import queue
+import threading
+import time
+
+from instrumentation import stage
+
+
+## Per-design streaming pipeline
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# The designs of a generation flow through the stages one by one instead of in lockstep batches:
+#
+#   CAD build -> .x_t ready -> CFD solve -> CSV ready -> metrics
+#
+# Every stage has its own worker threads (its concurrency limit, e.g. 1 for SolidWorks and one per solver
+# slot for STAR-CCM+) and hands its designs to the next stage through a bounded queue. A full queue blocks
+# the workers of the stage before it (backpressure), so CAD never runs more than queue_size designs ahead of
+# a busy solver. A stage function that raises or returns None fails the design, which leaves the pipeline.
+
+_DONE = object()  # End of the input of a stage
+
+
+class PipelineStage:
+    def __init__(self, name, function, concurrency=1):
+        """
+        :param name: Name of the stage, also used for the instrumentation events
+        :param function: Callable function(design, payload) returning the payload of the next stage
+        :param concurrency: Number of designs processed at the same time
+        """
+        self.name = name
+        self.function = function
+        self.concurrency = concurrency
+
+
+class DesignPipeline:
+    """
+    Usage:
+        pipeline = DesignPipeline([PipelineStage("cad", build, 1), PipelineStage("cfd", solve, 4),
+                                   PipelineStage("metrics", summarize, 1)], queue_size=2)
+        records = pipeline.run([("Design1", solution1), ("Design2", solution2)])
+    """
+    def __init__(self, stages, queue_size=2):
+        """
+        :param stages: List of PipelineStage, in order
+        :param queue_size: Designs waiting between two stages before the earlier stage is blocked
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def run(self, items):
+        """
+        Pass designs through all stages and wait until every one of them is finished or failed.
+
+        :param items: List of (design ID, payload of the first stage)
+        :return: List of dicts {design, status, stage, result, error, timings}, in the order of items; status
+                 is "done" or "failed", stage the stage that failed, result the return value of the last stage
+                 and timings {stage: {start, end, blocked}} (blocked: seconds spent waiting for the next queue)
+        """
+        records = {design: {"design": design, "status": "queued", "stage": None, "result": None, "error": None,
+                            "timings": {}} for design, _ in items}
+        # The first queue holds all input, the queues between stages are bounded
+        queues = [queue.Queue()] + [queue.Queue(maxsize=self.queue_size) for _ in self.stages[1:]]
+        lock = threading.Lock()
+        remaining = [stage_.concurrency for stage_ in self.stages]
+
+        def worker(index):
+            current = self.stages[index]
+            while True:
+                item = queues[index].get()
+                if item is _DONE:
+                    break
+                design, payload = item
+                record = records[design]
+                start = time.time()
+                try:
+                    with stage(current.name, design=design):
+                        result = current.function(design, payload)
+                    error = None if result is not None else f"{current.name} returned no result"
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+                timing = record["timings"][current.name] = {"start": start, "end": time.time(), "blocked": 0.0}
+
+                if error is not None:
+                    record.update(status="failed", stage=current.name, error=error)
+                    print(f"{design} failed in stage {current.name}: {error}")
+                elif index + 1 < len(self.stages):
+                    record["status"] = self.stages[index + 1].name
+                    # Blocks while the next stage is saturated
+                    queues[index + 1].put((design, result))
+                    timing["blocked"] = time.time() - timing["end"]
+                else:
+                    record.update(status="done", result=result)
+
+            # The last worker of a stage closes the input of the next one
+            with lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].concurrency):
+                    queues[index + 1].put(_DONE)
+
+        threads = [threading.Thread(target=worker, args=(index,), name=f"{stage_.name}-{n}", daemon=True)
+                   for index, stage_ in enumerate(self.stages) for n in range(stage_.concurrency)]
+        for design, payload in items:
+            queues[0].put((design, payload))
+        for _ in range(self.stages[0].concurrency):
+            queues[0].put(_DONE)
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [records[design] for design, _ in items]
+
+
+def overlap_time(records, first, second):
+    """Seconds during which the stages first and second were both busy with some design."""
+    def busy(name):
+        intervals = sorted((r["timings"][name]["start"], r["timings"][name]["end"]) for r in records
+                           if name in r["timings"])
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    return sum(max(0.0, min(end1, end2) - max(start1, start2))
+               for start1, end1 in busy(first) for start2, end2 in busy(second))
+
+
+if __name__ == "__main__":
+    # Stand-in stage executables: the Python CAD macro of cad_batch.py, the dummy solver in the CFD job pool
+    # and the real post-processing. All CAD first, then all CFD, then the metrics, against the pipeline.
+    import os
+    import sys
+    import tempfile
+
+    from cad_batch import emulate_cad_macro, write_cad_manifest
+    from cfd_job_pool import CFDJobPool, make_cfd_job, make_cfd_jobs
+    from optimization import Mixer, generate_initial_population
+    from postprocessing import summarize_csv
+
+    dummy_solver = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_starccm.py")
+    os.environ.setdefault("DUMMY_SOLVER_SECONDS", "2.0")
+    solver_command = [sys.executable, dummy_solver, "-np", "{cores}", "-batch", "{macro}"]
+    build_time, cores, core_budget = 0.3, 4, 16
+    population = generate_initial_population(Mixer(), 8)
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.time()
+        write_cad_manifest(population, folder, "Blank.SLDPRT", save_sldprt=False)
+        emulate_cad_macro(folder, build_time=build_time)
+        CFDJobPool(solver_command, "Run_CFD_Modified.java", core_budget, poll_interval=0.02).run(
+            make_cfd_jobs(folder, "Design_blank.sim", cores))
+        for k in range(1, len(population) + 1):
+            summarize_csv(os.path.join(folder, f"Design{k}.csv"), os.path.join(folder, "output"), write_report=False)
+        batch_time = time.time() - start
+
+    with tempfile.TemporaryDirectory() as folder:
+        cad_lock = threading.Lock()
+
+        def cad(design, solution):
+            with cad_lock:  # One SolidWorks session
+                write_cad_manifest([solution], folder, "Blank.SLDPRT", design_ids=[design], save_sldprt=False)
+                emulate_cad_macro(folder, build_time=build_time)
+            return os.path.join(folder, f"{design}.x_t")
+
+        def cfd(design, x_t_file):
+            job = make_cfd_job(folder, design, "Design_blank.sim", cores)
+            CFDJobPool(solver_command, "Run_CFD_Modified.java", cores, poll_interval=0.02).run([job])
+            return job.csv_file if job.status == "done" else None
+
+        def metrics(design, csv_file):
+            return summarize_csv(csv_file, os.path.join(folder, "output"), write_report=False)
+
+        pipeline = DesignPipeline([PipelineStage("cad", cad, 1), PipelineStage("cfd", cfd, core_budget // cores),
+                                   PipelineStage("metrics", metrics, 1)], queue_size=2)
+        start = time.time()
+        records = pipeline.run([(f"Design{k}", solution) for k, solution in enumerate(population, start=1)])
+        pipeline_time = time.time() - start
+
+    print(f"\nBatches (all CAD, then all CFD, then metrics): {batch_time:.2f} s")
+    print(f"Pipeline: {pipeline_time:.2f} s, {sum(r['status'] == 'done' for r in records)}/{len(records)} designs "
+          f"done, CAD and CFD overlapped for {overlap_time(records, 'cad', 'cfd'):.2f} s")
+    for record in records:
+        timings = record["timings"]
+        print(f"    {record['design']}: " + ", ".join(
+            f"{name} {timing['start'] - start:.2f}-{timing['end'] - start:.2f} s" for name, timing in timings.items()))
+
+    # Backpressure: with one solver slot and a queue of one design, CAD may only run two designs ahead
+    def slow_cfd(design, payload):
+        time.sleep(0.2)
+        return payload
+
+    records = DesignPipeline([PipelineStage("cad", lambda design, payload: payload, 1),
+                              PipelineStage("cfd", slow_cfd, 1)], queue_size=1).run(
+        [(f"Design{k}", k) for k in range(1, 6)])
+    print("Backpressure, seconds CAD waited for the solver per design: " +
+          ", ".join(f"{r['timings']['cad']['blocked']:.2f}" for r in records))
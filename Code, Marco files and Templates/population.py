@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import random
+
+import numpy as np
+
+from optimization import front_density, truncate_points
+from ranking import fronts_from_ranks, non_dominated_ranks, objectives_array
+
+
+## Array-backed population and batched genetic operators
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# A Population holds N designs as an (N, k) int16 matrix of 1-based edge positions (slot order kept, as in
+# solution["variables"]), an (N, 2) float objectives array (NaN until evaluated), rank and density columns,
+# and the colex rank of every layout in the FeasibilityTable as design ID. Two designs are the same layout
+# exactly when their IDs are equal, so deduplication and lookups are integer operations.
+
+def default_rng():
+    """NumPy generator seeded from the random module, so random.seed() also fixes the batched operators."""
+    return np.random.default_rng(random.getrandbits(64))
+
+
+class Population:
+    """
+    Compact population of obstacle layouts.
+    """
+    def __init__(self, table, designs, objectives=None, rank=None, density=None):
+        """
+        :param table: FeasibilityTable of the problem (Mixer.feasibility)
+        :param designs: (N, k) array-like of 1-based positions
+        :param objectives: Optional (N, 2) objectives, NaN for designs that are not evaluated
+        :param rank: Optional (N,) non-dominated ranks
+        :param density: Optional (N,) densities (larger is more isolated)
+        """
+        self.table = table
+        self.designs = np.asarray(designs, dtype=np.int16).reshape(-1, table.num_variables)
+        n = len(self.designs)
+        self.objectives = np.full((n, 2), np.nan) if objectives is None else np.asarray(objectives, dtype=float).reshape(n, 2)
+        self.rank = np.zeros(n, dtype=np.int64) if rank is None else np.asarray(rank, dtype=np.int64)
+        self.density = np.zeros(n) if density is None else np.asarray(density, dtype=float)
+        self.ids = design_ids(table, self.designs)
+
+    def __len__(self):
+        return len(self.designs)
+
+    @classmethod
+    def from_solutions(cls, table, solutions):
+        """Build a population from solution dicts; rank and density are taken over when present."""
+        return cls(
+            table,
+            [solution["variables"] for solution in solutions],
+            objectives_array(solutions),
+            [solution.get("rank", 0) for solution in solutions],
+            [solution.get("density", 0.0) for solution in solutions],
+        )
+
+    def to_solutions(self):
+        """Solution dicts as used by Main.py; objectives of unevaluated designs are [0.0, 0.0]."""
+        objectives = np.nan_to_num(self.objectives, nan=0.0).tolist()
+        return [
+            {"variables": variables, "objectives": values, "rank": rank, "density": density}
+            for variables, values, rank, density in zip(
+                self.designs.tolist(), objectives, self.rank.tolist(), self.density.tolist()
+            )
+        ]
+
+    def take(self, indices):
+        """Sub-population of the given rows, in the given order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return Population(self.table, self.designs[indices], self.objectives[indices], self.rank[indices],
+                          self.density[indices])
+
+    def concatenate(self, other):
+        """This population followed by another one, e.g. parents and offspring."""
+        return Population(
+            self.table,
+            np.concatenate([self.designs, other.designs]),
+            np.concatenate([self.objectives, other.objectives]),
+            np.concatenate([self.rank, other.rank]),
+            np.concatenate([self.density, other.density]),
+        )
+
+    def unique(self):
+        """Population without duplicate layouts; the first occurrence of every design is kept."""
+        _, first = np.unique(self.ids, return_index=True)
+        return self.take(np.sort(first))
+
+    def contains(self, ids):
+        """Boolean array telling which of the given design IDs are in the population."""
+        return np.isin(ids, self.ids)
+
+    def assign_ranks(self):
+        """Set the non-dominated rank of every design and return the fronts as index arrays."""
+        self.rank = non_dominated_ranks(self.objectives)
+        return fronts_from_ranks(self.rank)
+
+    def assign_density(self, front, density, reference_point=None):
+        """Set the density of the rows of one front, see DENSITY_ESTIMATORS in optimization.py."""
+        self.density[front] = front_density(self.objectives[front], density, reference_point)
+
+    def rank_and_density(self, density="crowding", reference_point=None):
+        """Assign rank and per-front density, as done before each generation in Main.py."""
+        for front in self.assign_ranks():
+            if density is not None:
+                self.assign_density(front, density, reference_point)
+
+    def select(self, population_size, density=None, reference_point=None):
+        """
+        Batched select_next_generation: keep the best unique designs front by front.
+
+        :param population_size: Number of survivors
+        :param density: None to truncate the last front in list order, "crowding" or "hypervolume"
+        :param reference_point: Reference point, needed by the hypervolume estimator
+        :return: Population of survivors, with rank (and density) set
+        """
+        if density is None:
+            self.assign_ranks()
+            order = np.argsort(self.rank, kind='stable')
+            _, first = np.unique(self.ids[order], return_index=True)
+            return self.take(order[np.sort(first)][:population_size])
+
+        population = self.unique()
+        survivors = []
+        for front in population.assign_ranks():
+            remaining = population_size - len(survivors)
+            if len(front) > remaining:
+                keep, values = truncate_points(population.objectives[front], remaining, density, reference_point)
+                front = front[keep]
+                population.density[front] = values
+            else:
+                population.assign_density(front, density, reference_point)
+            survivors.extend(front.tolist())
+            if len(survivors) >= population_size:
+                break
+        return population.take(survivors)
+
+
+def design_ids(table, designs):
+    """
+    Colex rank of every layout (row of the feasibility table); rows with repeated positions get -1.
+
+    :param table: FeasibilityTable
+    :param designs: (N, k) array of 1-based positions in any order
+    """
+    layouts = np.sort(np.asarray(designs, dtype=np.int64).reshape(-1, table.num_variables), axis=1) - 1
+    ids = table.rank_array(layouts)
+    ids[(np.diff(layouts, axis=1) == 0).any(axis=1)] = -1
+    return ids
+
+
+def tournament_selection(population, n, k=2, rng=None):
+    """
+    n tournaments of k distinct contestants; the lowest rank wins and ties go to the larger density.
+
+    :return: (n,) array of winner rows
+    """
+    rng = rng or default_rng()
+    size = len(population)
+    contestants = rng.integers(size, size=(n, k))
+    if k > 1 and size >= k:
+        # Redraw tournaments with a repeated contestant
+        repeated = (np.diff(np.sort(contestants, axis=1), axis=1) == 0).any(axis=1)
+        while repeated.any():
+            contestants[repeated] = rng.integers(size, size=(int(repeated.sum()), k))
+            repeated = (np.diff(np.sort(contestants, axis=1), axis=1) == 0).any(axis=1)
+
+    # Rank first, larger density second
+    winner = np.lexsort((-population.density[contestants], population.rank[contestants]), axis=-1)[:, 0]
+    return contestants[np.arange(n), winner]
+
+
+def repair(table, designs):
+    """
+    Make every row a feasible layout. Feasible rows are checked in one vectorized lookup; the few others are
+    repaired with FeasibilityTable.nearest_feasible.
+
+    :param designs: (N, k) array of 1-based positions
+    :return: (N, k) int16 array of feasible layouts
+    """
+    designs = np.array(designs, dtype=np.int16)
+    ids = design_ids(table, designs)
+    infeasible = np.flatnonzero((ids < 0) | ~table.feasible[np.clip(ids, 0, None)])
+    for row in infeasible:
+        designs[row] = table.nearest_feasible(designs[row].tolist())
+    return designs
+
+
+def crossover(table, parents1, parents2, crossover_rate, rng=None):
+    """
+    Single-point crossover of pairs of parent rows, followed by repair. Pairs without crossover are copied.
+
+    :param parents1: (n, k) designs of the first parents
+    :param parents2: (n, k) designs of the second parents
+    :return: (2n, k) children, first all child1 then all child2
+    """
+    rng = rng or default_rng()
+    parents1 = np.asarray(parents1, dtype=np.int16)
+    parents2 = np.asarray(parents2, dtype=np.int16)
+    n, k = parents1.shape
+
+    applied = rng.random(n) <= crossover_rate
+    point = rng.integers(1, k, size=n)
+    from_first = (np.arange(k)[None, :] < point[:, None]) | ~applied[:, None]
+    child1 = np.where(from_first, parents1, parents2)
+    child2 = np.where(from_first, parents2, parents1)
+    return repair(table, np.concatenate([child1, child2]))
+
+
+def mutate(table, designs, mutation_rate, rng=None, max_attempts=50):
+    """
+    Replace every position with probability mutation_rate by a new position. New positions are drawn
+    uniformly among the edges not in the layout and redrawn together until the layout is feasible, which
+    samples the feasible completions of the kept positions uniformly, as FeasibilityTable.resample does.
+
+    :param designs: (N, k) feasible designs
+    :return: (N, k) mutated designs
+    """
+    rng = rng or default_rng()
+    designs = np.array(designs, dtype=np.int16)
+    n, k = designs.shape
+    slots = rng.random((n, k)) < mutation_rate
+    rows = np.flatnonzero(slots.any(axis=1))
+
+    for _ in range(max_attempts):
+        if len(rows) == 0:
+            break
+        original = designs[rows]
+        candidate = original.copy()
+
+        # Random permutation of the edges per row, minus the current positions: take the first free ones
+        keys = rng.random((len(rows), table.num_edges))
+        keys[np.arange(len(rows))[:, None], original - 1] = np.inf
+        free = np.argsort(keys, axis=1)[:, :k] + 1
+        order = np.cumsum(slots[rows], axis=1) - 1
+        candidate[slots[rows]] = free[np.arange(len(rows))[:, None], np.clip(order, 0, None)][slots[rows]]
+
+        ids = design_ids(table, candidate)
+        accepted = (ids >= 0) & table.feasible[np.clip(ids, 0, None)]
+        designs[rows[accepted]] = candidate[accepted]
+        rows = rows[~accepted]
+
+    for row in rows:
+        designs[row] = table.resample(designs[row].tolist(), np.flatnonzero(slots[row]).tolist())
+    return designs
+
+
+def make_offspring(population, n, crossover_rate, mutation_rate, exclude_ids=None, rng=None, max_rounds=100):
+    """
+    Produce n distinct offspring in blocks: tournament selection, crossover and mutation of whole arrays.
+
+    :param population: Ranked parent Population
+    :param n: Number of offspring
+    :param exclude_ids: Optional array of design IDs that must not be produced (e.g. already evaluated)
+    :return: Population of up to n new designs, objectives NaN
+    """
+    rng = rng or default_rng()
+    table = population.table
+    excluded = np.unique(np.asarray([] if exclude_ids is None else exclude_ids, dtype=np.int64))
+    blocks, found = [], np.empty(0, dtype=np.int64)
+
+    for _ in range(max_rounds):
+        pairs = max((n - len(found) + 1) // 2, 1)
+        parents = tournament_selection(population, 2 * pairs, rng=rng)
+        children = crossover(table, population.designs[parents[:pairs]], population.designs[parents[pairs:]],
+                             crossover_rate, rng)
+        children = mutate(table, children, mutation_rate, rng)
+
+        ids = design_ids(table, children)
+        _, first = np.unique(ids, return_index=True)
+        first = np.sort(first)
+        new = first[~np.isin(ids[first], excluded) & ~np.isin(ids[first], found)]
+        new = new[:n - len(found)]
+        blocks.append(children[new])
+        found = np.concatenate([found, ids[new]])
+        if len(found) >= n:
+            break
+
+    return Population(table, np.concatenate(blocks) if blocks else np.empty((0, table.num_variables)))
@@ -0,0 +1,589 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from export_cache import load_export
+from instrumentation import stage
+
+
+## Mixing metrics of the exported CFD planes
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# The STAR-CCM+ export (Design{k}.csv) holds the passive scalar "PS" on sampling planes normal to the flow,
+# with columns "X (m)", "Y (m)", "Z (m)" and "PS"; the pressure drop is the F2 cell (row 0, column 5).
+# Per plane, PS is averaged over Y for every Z, and the mixing index is
+#     MI = 1 - sqrt(mean_Z((c_Z - target) ** 2)) / sqrt(target * (1 - target))
+# which is 1 - rms / 0.5 for the target concentration 0.5.
+
+# Sampling planes (name, X position in m). A position (lower, upper) takes every point with
+# lower <= X <= upper instead, None being unbounded: plate1 is X <= 0.001, as in the former pivot tables,
+# so any point upstream of the first plane counts for plate1.
+PLATES = [
+    ('plate1', (None, 0.001)),
+    ('plate2', 0.002),
+    ('plate3', 0.003),
+    ('plate4', 0.004),
+    ('plate5', 0.005),
+]
+PLANE_TOLERANCE = 1e-7  # Points within this distance (m) of a plane position belong to the plane
+TARGET_CONCENTRATION = 0.5
+
+# Columns read by the streaming reader, with fixed dtypes (no type inference per chunk)
+EXPORT_COLUMNS = {'X (m)': np.float64, 'Y (m)': np.float64, 'Z (m)': np.float64, 'PS': np.float64,
+                  'Pressure_drop': np.float64}
+CSV_CHUNKSIZE = 500_000  # Rows per chunk of the streaming reader
+
+# Background pool writing the deferred xlsx reports
+_report_pool = None
+_report_futures = []
+_report_lock = threading.Lock()
+
+
+def natural_key(string):
+    """Key function for natural sorting, extracting numeric parts of a string."""
+    return [int(text) if text.isdigit() else text.lower() for text in re.split(r'(\d+)', string)]
+
+
+def plane_bounds(position, tolerance=PLANE_TOLERANCE):
+    """(lower, upper) X of the points of a plane, for a position or a (lower, upper) range of PLATES."""
+    if isinstance(position, tuple):
+        lower, upper = position
+        return (-np.inf if lower is None else lower), (np.inf if upper is None else upper)
+    return position - tolerance, position + tolerance
+
+
+def plane_position(position):
+    """X of a plane, the upper bound (or else the lower bound) of a range, e.g. for synthetic exports."""
+    if isinstance(position, tuple):
+        return position[1] if position[1] is not None else position[0]
+    return position
+
+
+def assign_planes(x, positions, tolerance=PLANE_TOLERANCE):
+    """
+    Index of the plane every point belongs to, -1 for points that are not on any plane.
+
+    :param x: (N,) X coordinates
+    :param positions: Plane positions or (lower, upper) ranges, see PLATES; the planes must not overlap
+    :param tolerance: Largest distance between a point and the position of its plane
+    :return: (N,) integer array of indices into positions
+    """
+    x = np.asarray(x, dtype=float)
+    plane = np.full(len(x), -1, dtype=np.int64)
+    for i, position in enumerate(positions):
+        lower, upper = plane_bounds(position, tolerance)
+        plane[(x >= lower) & (x <= upper)] = i
+    return plane
+
+
+def plane_statistics(x, y, z, ps, planes=PLATES, tolerance=PLANE_TOLERANCE, target=TARGET_CONCENTRATION,
+                     return_grids=False):
+    """
+    Mixing statistics of all planes in one pass: points are binned by plane, Z and Y with a single grouping
+    of integer codes, instead of one filtered copy and pivot table per plane.
+
+    :param x, y, z: (N,) coordinates
+    :param ps: (N,) passive scalar
+    :param planes: List of (name, X position)
+    :param tolerance: Plane tolerance in m
+    :param target: Fully mixed concentration
+    :param return_grids: Also return the Z x Y table of mean PS of every plane (as written to the reports)
+    :return: Dictionary name -> statistics, with keys 'MI', 'rms' (deviation of the Z averages from the
+             target), 'cov' (rms / target), 'mean', 'min', 'max' (of the Z averages), 'points', and with
+             return_grids 'grid' = (z values, y values, (nz, ny) array with NaN for empty cells)
+    """
+    names = [name for name, _ in planes]
+    num_planes = len(planes)
+    ps = np.asarray(ps, dtype=float)
+    plane = assign_planes(x, [position for _, position in planes], tolerance)
+    z = np.asarray(z, dtype=float)
+    y = np.asarray(y, dtype=float)
+    valid = (plane >= 0) & ~np.isnan(ps)
+    if not valid.all():
+        plane, ps, z, y = plane[valid], ps[valid], z[valid], y[valid]
+
+    # Hash-based integer codes of the distinct Z and Y values (codes follow the sorted values)
+    z_code, z_values = pd.factorize(z, sort=True)
+    y_code, y_values = pd.factorize(y, sort=True)
+    nz, ny = len(z_values), len(y_values)
+
+    # Mean PS of every occupied (plane, Z, Y) cell, with the cell code built in place
+    cell = plane * nz
+    cell += z_code
+    cell *= ny
+    cell += y_code
+    del z_code, y_code
+    if num_planes * nz * ny <= 4 * len(cell) + 1_000_000:
+        counts = np.bincount(cell, minlength=num_planes * nz * ny)
+        sums = np.bincount(cell, weights=ps, minlength=num_planes * nz * ny)
+        cells = np.flatnonzero(counts)
+        cell_mean = sums[cells] / counts[cells]
+    else:
+        cells, cell_code = np.unique(cell, return_inverse=True)
+        cell_mean = np.bincount(cell_code, weights=ps) / np.bincount(cell_code)
+
+    # Average over Y of every (plane, Z) row
+    rows, row_code = np.unique(cells // ny, return_inverse=True)
+    row_mean = np.bincount(row_code, weights=cell_mean) / np.bincount(row_code)
+    row_plane = rows // nz
+
+    statistics = summarize_planes(names, row_plane, row_mean, np.bincount(plane, minlength=num_planes), target)
+
+    if return_grids:
+        cell_plane = cells // (nz * ny)
+        cell_z = cells // ny % nz
+        cell_y = cells % ny
+        for i, name in enumerate(names):
+            in_plane = cell_plane == i
+            z_index, z_row = np.unique(cell_z[in_plane], return_inverse=True)
+            y_index, y_column = np.unique(cell_y[in_plane], return_inverse=True)
+            grid = np.full((len(z_index), len(y_index)), np.nan)
+            grid[z_row, y_column] = cell_mean[in_plane]
+            statistics[name]['grid'] = (z_values[z_index], y_values[y_index], grid)
+    return statistics
+
+
+def summarize_planes(names, row_plane, row_mean, points, target=TARGET_CONCENTRATION):
+    """
+    Per-plane statistics from the Z averages of all planes.
+
+    :param names: Plane names
+    :param row_plane: (R,) plane index of every Z average
+    :param row_mean: (R,) Z averages of PS
+    :param points: (P,) number of points per plane
+    :return: Dictionary name -> statistics, see plane_statistics
+    """
+    return summarize_moments(names, plane_moments(row_plane, row_mean, len(names), target), points, target)
+
+
+def plane_moments(row_plane, row_mean, num_planes, target=TARGET_CONCENTRATION):
+    """
+    Per-plane count, sum, sum of squared deviations from the target, min and max of Z averages; the moments
+    of disjoint sets of Z averages are combined with merge_moments.
+    """
+    minimum = np.full(num_planes, np.nan)
+    maximum = np.full(num_planes, np.nan)
+    np.fmin.at(minimum, row_plane, row_mean)
+    np.fmax.at(maximum, row_plane, row_mean)
+    return (np.bincount(row_plane, minlength=num_planes),
+            np.bincount(row_plane, weights=row_mean, minlength=num_planes),
+            np.bincount(row_plane, weights=(row_mean - target) ** 2, minlength=num_planes),
+            minimum, maximum)
+
+
+def merge_moments(first, second):
+    """Moments of the union of two disjoint sets of Z averages."""
+    return (first[0] + second[0], first[1] + second[1], first[2] + second[2], np.fmin(first[3], second[3]),
+            np.fmax(first[4], second[4]))
+
+
+def summarize_moments(names, moments, points, target=TARGET_CONCENTRATION):
+    """Per-plane statistics from the moments of the Z averages, see plane_moments."""
+    counts, sums, squares, minimum, maximum = moments
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+        rms = np.sqrt(squares / counts)
+    mi = 1 - rms / np.sqrt(target * (1 - target))
+
+    statistics = {}
+    for i, name in enumerate(names):
+        statistics[name] = {
+            'MI': float(mi[i]),
+            'rms': float(rms[i]),
+            'cov': float(rms[i] / target),
+            'mean': float(mean[i]),
+            'min': float(minimum[i]),
+            'max': float(maximum[i]),
+            'points': int(points[i]),
+        }
+    return statistics
+
+
+SPILL_DTYPE = np.dtype([('plane', np.int64), ('z', np.float64), ('y', np.float64), ('ps', np.float64)])
+
+
+class PlaneAccumulator:
+    """
+    Accumulator of the streaming reader, with peak memory bounded by the chunk size whatever the size of the
+    export. The points of the planes are buffered up to chunk_points and then spilled to a temporary file.
+    statistics() scatters the spilled points into partitions of about chunk_points points by a hash of their
+    (plane, Z) row and reduces one partition at a time: every Z row lies in a single partition, so the Z
+    averages are the averages over Y of the cell means, as in plane_statistics, also when a cell holds
+    several points or none. Across partitions only per-plane sums of the Z averages are kept (and, with
+    profiles, the Z averages themselves, one per Z row, for the report).
+    """
+    def __init__(self, planes=PLATES, tolerance=PLANE_TOLERANCE, target=TARGET_CONCENTRATION,
+                 chunk_points=CSV_CHUNKSIZE):
+        self.names = [name for name, _ in planes]
+        self.positions = [position for _, position in planes]
+        self.tolerance = tolerance
+        self.target = target
+        self.chunk_points = chunk_points
+        self.buffer = []  # Record arrays of the chunks not spilled yet
+        self.buffered = 0
+        self.spill_folder = None
+        self.spilled = 0
+        self.points = np.zeros(len(planes), dtype=np.int64)
+
+    def add(self, x, y, z, ps):
+        """Accumulate a chunk of points."""
+        plane = assign_planes(x, self.positions, self.tolerance)
+        ps = np.asarray(ps, dtype=np.float64)
+        valid = (plane >= 0) & ~np.isnan(ps)
+        if not valid.any():
+            return
+        records = np.empty(int(valid.sum()), dtype=SPILL_DTYPE)
+        records['plane'] = plane[valid]
+        records['z'] = np.asarray(z, dtype=np.float64)[valid]
+        records['y'] = np.asarray(y, dtype=np.float64)[valid]
+        records['ps'] = ps[valid]
+        self.points += np.bincount(records['plane'], minlength=len(self.names))
+
+        self.buffer.append(records)
+        self.buffered += len(records)
+        if self.buffered > self.chunk_points:
+            self._spill()
+
+    def _spill(self):
+        if self.spill_folder is None:
+            self.spill_folder = tempfile.TemporaryDirectory(prefix='plane_spill_')
+        with open(os.path.join(self.spill_folder.name, 'points.bin'), 'ab') as file:
+            for records in self.buffer:
+                records.tofile(file)
+                self.spilled += len(records)
+        self.buffer, self.buffered = [], 0
+
+    def _partitions(self):
+        """Record arrays of all points, one partition of whole Z rows at a time."""
+        if self.spill_folder is None:
+            if self.buffer:
+                yield np.concatenate(self.buffer)
+            return
+        self._spill()
+        folder = self.spill_folder.name
+        spill_file = os.path.join(folder, 'points.bin')
+        num_partitions = -(-self.spilled // self.chunk_points)
+        partition_files = [os.path.join(folder, f'partition{i}.bin') for i in range(num_partitions)]
+        for start in range(0, self.spilled, self.chunk_points):
+            records = np.fromfile(spill_file, dtype=SPILL_DTYPE, count=self.chunk_points,
+                                  offset=start * SPILL_DTYPE.itemsize)
+            # Multiplicative hash of the row; + 0.0 maps -0.0 onto 0.0, which is the same Z
+            row_hash = (records['z'] + 0.0).view(np.uint64) ^ records['plane'].astype(np.uint64)
+            row_hash *= np.uint64(0x9E3779B97F4A7C15)
+            partition = (row_hash >> np.uint64(32)) % np.uint64(num_partitions)
+            order = np.argsort(partition, kind='stable')
+            bounds = np.searchsorted(partition[order], np.arange(num_partitions + 1, dtype=np.uint64))
+            for i in np.flatnonzero(np.diff(bounds)):
+                with open(partition_files[i], 'ab') as file:
+                    records[order[bounds[i]:bounds[i + 1]]].tofile(file)
+            del records, row_hash, partition, order
+        os.remove(spill_file)
+        for partition_file in partition_files:
+            if os.path.exists(partition_file):
+                yield np.fromfile(partition_file, dtype=SPILL_DTYPE)
+                os.remove(partition_file)
+
+    def statistics(self, profiles=False):
+        """
+        Per-plane statistics, as returned by plane_statistics; with profiles also 'profile' = (z values,
+        Z averages) of every plane, as written to the reports of the streaming reader.
+        """
+        num_planes = len(self.names)
+        moments = plane_moments(np.empty(0, dtype=np.int64), np.empty(0), num_planes, self.target)
+        profile_parts = []
+        try:
+            for records in self._partitions():
+                records = records[np.lexsort((records['y'], records['z'], records['plane']))]
+                plane, z, y = records['plane'], records['z'], records['y']
+
+                # Runs of equal (plane, Z) are the rows, runs of equal (plane, Z, Y) within them the cells
+                new_row = np.empty(len(records), dtype=bool)
+                new_row[0] = True
+                np.not_equal(plane[1:], plane[:-1], out=new_row[1:])
+                new_row[1:] |= z[1:] != z[:-1]
+                new_cell = new_row.copy()
+                new_cell[1:] |= y[1:] != y[:-1]
+                cell_starts = np.flatnonzero(new_cell)
+                cell_mean = np.add.reduceat(records['ps'], cell_starts) / np.diff(cell_starts, append=len(records))
+                row_starts = np.flatnonzero(new_row[cell_starts])
+                row_mean = np.add.reduceat(cell_mean, row_starts) / np.diff(row_starts, append=len(cell_starts))
+                row_plane = plane[cell_starts[row_starts]]
+
+                moments = merge_moments(moments, plane_moments(row_plane, row_mean, num_planes, self.target))
+                if profiles:
+                    profile_parts.append((row_plane, z[cell_starts[row_starts]], row_mean))
+                del records, plane, z, y, new_row, new_cell, cell_starts, cell_mean
+        finally:
+            self.close()
+
+        statistics = summarize_moments(self.names, moments, self.points, self.target)
+        if profiles:
+            row_plane, row_z, row_mean = (np.concatenate([part[i] for part in profile_parts] or [np.empty(0)])
+                                          for i in range(3))
+            order = np.lexsort((row_z, row_plane))
+            row_plane, row_z, row_mean = row_plane[order], row_z[order], row_mean[order]
+            for i, name in enumerate(self.names):
+                in_plane = row_plane == i
+                statistics[name]['profile'] = (row_z[in_plane], row_mean[in_plane])
+        return statistics
+
+    def close(self):
+        """Remove the spilled points."""
+        self.buffer, self.buffered, self.spilled = [], 0, 0
+        if self.spill_folder is not None:
+            self.spill_folder.cleanup()
+            self.spill_folder = None
+
+
+def stream_plane_statistics(file_path, planes=PLATES, tolerance=PLANE_TOLERANCE, target=TARGET_CONCENTRATION,
+                            chunksize=CSV_CHUNKSIZE, profiles=False):
+    """
+    Per-plane statistics of an export read in chunks of fixed-dtype columns (EXPORT_COLUMNS); peak memory
+    is bounded by the chunk size instead of the file size, see PlaneAccumulator.
+
+    :param file_path: Path to the CSV export
+    :param chunksize: Rows per chunk
+    :param profiles: Also return the Z averages of every plane, see PlaneAccumulator.statistics
+    :return: A tuple (statistics, pressure drop); the pressure drop is None if the export has none
+    """
+    accumulator = PlaneAccumulator(planes, tolerance, target, chunksize)
+    pressure_drop = None
+    try:
+        reader = pd.read_csv(file_path, usecols=lambda column: column in EXPORT_COLUMNS, dtype=EXPORT_COLUMNS,
+                             chunksize=chunksize)
+        for index, chunk in enumerate(reader):
+            if index == 0 and 'Pressure_drop' in chunk.columns and len(chunk) > 0:
+                # Run_CFD.java appends the pressure drop to the first data row only
+                pressure_drop = chunk['Pressure_drop'].iloc[0]
+            accumulator.add(chunk['X (m)'].to_numpy(), chunk['Y (m)'].to_numpy(), chunk['Z (m)'].to_numpy(),
+                            chunk['PS'].to_numpy())
+            del chunk
+        return accumulator.statistics(profiles), pressure_drop
+    finally:
+        accumulator.close()
+
+
+def process_csv(file_path, output_folder, planes=PLATES, tolerance=PLANE_TOLERANCE, target=TARGET_CONCENTRATION,
+                chunksize=None, use_cache=False, write_report=True):
+    """
+    Processes a CSV file, calculates MI values for each plate, and saves results to an Excel file.
+
+    :param file_path: Path to the CSV file
+    :param output_folder: Directory to save the processed Excel files
+    :param planes: List of (name, X position) of the sampling planes
+    :param chunksize: Read the file in chunks of this many rows (the report then holds the Z averages of
+                      every plate instead of the full Z x Y table); None reads the whole file at once
+    :param use_cache: Read the columns from the binary cache next to the CSV (built on first use, see
+                      export_cache.py) instead of parsing the CSV
+    :param write_report: Write the {name}_restructured.xlsx report
+    :return: A tuple containing the base file name, MI values, and the F2 value
+    """
+    # Generate output Excel file name based on the input CSV file name
+    base_name = os.path.basename(file_path)
+    output_file_name = os.path.splitext(base_name)[0] + '_restructured.xlsx'
+    output_path = os.path.join(output_folder, output_file_name)
+
+    if use_cache:
+        columns, f2_value = load_export(file_path)
+        statistics = plane_statistics(columns['X (m)'], columns['Y (m)'], columns['Z (m)'], columns['PS'],
+                                      planes, tolerance, target, return_grids=write_report)
+    elif chunksize:
+        statistics, f2_value = stream_plane_statistics(file_path, planes, tolerance, target, chunksize,
+                                                       profiles=write_report)
+    else:
+        df = pd.read_csv(file_path)
+
+        # Extract the value of the F2 cell (row 0, column 5)
+        f2_value = df.iloc[0, 5] if df.shape[1] > 5 and df.shape[0] > 0 else None
+
+        statistics = plane_statistics(df['X (m)'].to_numpy(), df['Y (m)'].to_numpy(), df['Z (m)'].to_numpy(),
+                                      df['PS'].to_numpy(), planes, tolerance, target, return_grids=write_report)
+    mi_values = {name: statistics[name]['MI'] for name, _ in planes}
+
+    if not write_report:
+        return base_name, mi_values, f2_value
+
+    # Create a new Excel writer object
+    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
+        for plate_name, _ in planes:
+            if chunksize and not use_cache:
+                z_values, averages = statistics[plate_name]['profile']
+                pivot_table = pd.DataFrame({'Average': averages}, index=pd.Index(z_values, name='Z (m)'))
+            else:
+                z_values, y_values, grid = statistics[plate_name]['grid']
+                pivot_table = pd.DataFrame(grid, index=pd.Index(z_values, name='Z (m)'),
+                                           columns=pd.Index(y_values, name='Y (m)'))
+                pivot_table['Average'] = pivot_table.mean(axis=1)
+            pivot_table['(c-ci)^2'] = (pivot_table['Average'] - target) ** 2
+
+            # Write the pivot table and MI value to a new sheet
+            pivot_table.to_excel(writer, sheet_name=plate_name)
+            worksheet = writer.sheets[plate_name]
+            worksheet.write('AI1', f'MI_{plate_name}')
+            worksheet.write('AI2', mi_values[plate_name])
+
+    print(f'File saved to: {output_path}')
+    return base_name, mi_values, f2_value
+
+
+def summarize_csv(file_path, output_folder, planes=PLATES, chunksize=None, use_cache=False, write_report=True):
+    """
+    process_csv with per-file error isolation, run in the worker processes of process_all_csv_files.
+
+    :return: A tuple (base name, MI values, F2 value, error); MI values are NaN and error is the message
+             if the file could not be processed, error is None otherwise
+    """
+    try:
+        with stage("postprocess_design", design=os.path.splitext(os.path.basename(file_path))[0], files=[file_path],
+                   parent="postprocessing"):
+            base_name, mi_values, f2_value = process_csv(file_path, output_folder, planes, chunksize=chunksize,
+                                                         use_cache=use_cache, write_report=write_report)
+        return base_name, mi_values, f2_value, None
+    except Exception as e:
+        return os.path.basename(file_path), {name: np.nan for name, _ in planes}, None, f"{type(e).__name__}: {e}"
+
+
+def defer_reports(file_paths, output_folder, planes=PLATES, chunksize=None, use_cache=False, num_workers=1):
+    """
+    Write the xlsx reports of the given exports in a background process pool, while the caller continues.
+    """
+    global _report_pool
+    with _report_lock:
+        if _report_pool is None:
+            _report_pool = ProcessPoolExecutor(max_workers=max(num_workers, 1))
+        for file_path in file_paths:
+            _report_futures.append(_report_pool.submit(summarize_csv, file_path, output_folder, planes, chunksize,
+                                                       use_cache))
+
+
+def wait_for_reports():
+    """Wait until all deferred reports are written; failures are printed."""
+    global _report_futures
+    with _report_lock:
+        futures, _report_futures = _report_futures, []
+    for future in futures:
+        base_name, _, _, error = future.result()
+        if error is not None:
+            print(f"Report of {base_name} failed: {error}")
+
+
+def write_summary(summary_data, summary_file, planes=PLATES):
+    """
+    Write the summary CSV: one row per design with the MI of every plane, their average (obj1) and the
+    pressure drop (obj2). The file is replaced at once, so readers never see a partial summary.
+
+    :param summary_data: List of (base name, MI values, F2 value), in design order
+    """
+    summary_rows = []
+    for base_name, mi_values, f2_value in summary_data:
+        row = [base_name]
+        row.extend(mi_values.values())
+        average_value = np.mean(list(mi_values.values())) if mi_values else None
+        row.append(average_value)  # Add the average value
+        row.append(f2_value if f2_value is not None else 'N/A')
+        summary_rows.append(row)
+
+    # Create a DataFrame for summary data
+    summary_df = pd.DataFrame(summary_rows, columns=['Design'] + [name for name, _ in planes] + ['obj1', 'obj2'])
+
+    # Save summary to CSV
+    temporary_file = summary_file + '.tmp'
+    summary_df.to_csv(temporary_file, index=False)
+    os.replace(temporary_file, summary_file)
+    print(f'Summary file saved to: {summary_file}')
+
+
+def load_summary_rows(summary_file, planes=PLATES):
+    """
+    Rows of an existing summary file with valid objectives, in the format of write_summary.
+
+    :return: Dict {base name: (base name, MI values, F2 value)}, empty if the file does not exist
+    """
+    if not os.path.exists(summary_file):
+        return {}
+    summary_df = pd.read_csv(summary_file)
+    rows = {}
+    for _, row in summary_df.iterrows():
+        obj1 = pd.to_numeric(row.get('obj1'), errors='coerce')
+        obj2 = pd.to_numeric(row.get('obj2'), errors='coerce')
+        if pd.isna(obj1) or pd.isna(obj2):
+            continue
+        rows[row['Design']] = (row['Design'], {name: row[name] for name, _ in planes}, obj2)
+    return rows
+
+
+def design_filenames(num_designs):
+    """Export file names of a batch of designs: Design1.csv to Design{num_designs}.csv."""
+    return [f"Design{k}.csv" for k in range(1, num_designs + 1)]
+
+
+def process_all_csv_files(input_folder, output_folder, summary_file, planes=PLATES, chunksize=None, use_cache=False,
+                          num_workers=1, write_reports=True, num_designs=None):
+    """
+    Processes all CSV files in a folder and generates a summary file with MI values and averages.
+    With num_designs, the summary has one row per design, Design1 to Design{num_designs} in order, and a
+    design whose export is missing or cannot be processed gets a row with NaN values, so the rows stay
+    aligned with the designs.
+
+    :param input_folder: Directory containing the input CSV files
+    :param output_folder: Directory to save the processed files
+    :param summary_file: Path to save the summary CSV file
+    :param planes: List of (name, X position) of the sampling planes
+    :param chunksize: Rows per chunk for streaming large exports, None to read whole files
+    :param use_cache: Read the exports through their binary columnar cache
+    :param num_workers: Number of worker processes; 1 processes the files one after the other
+    :param write_reports: True to write the xlsx reports, False to skip them, "deferred" to write them in
+                          the background after the summary (see wait_for_reports)
+    :param num_designs: Number of designs of the batch; None summarizes every CSV file of the folder
+    """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    if num_designs is not None:
+        filenames = design_filenames(num_designs)
+    else:
+        # Get file names and sort them naturally
+        filenames = [f for f in os.listdir(input_folder) if f.endswith(".csv")]
+        filenames.sort(key=natural_key)
+    file_paths = [os.path.join(input_folder, filename) for filename in filenames]
+
+    arguments = (file_paths, repeat(output_folder), repeat(planes), repeat(chunksize), repeat(use_cache),
+                 repeat(write_reports is True))
+    if num_workers > 1 and len(file_paths) > 1:
+        # map returns the results in the order of the files
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(file_paths))) as pool:
+            summary_data = list(pool.map(summarize_csv, *arguments))
+    else:
+        summary_data = list(map(summarize_csv, *arguments))
+
+    for base_name, _, _, error in summary_data:
+        if error is not None:
+            print(f"Post-processing of {base_name} failed: {error}")
+    write_summary([result[:3] for result in summary_data], summary_file, planes)
+
+    if write_reports == "deferred":
+        defer_reports([path for path in file_paths if os.path.exists(path)], output_folder, planes, chunksize,
+                      use_cache, num_workers)
+
+
+def read_summary_csv(summary_file):
+
+    # Read the CSV file
+    df = pd.read_csv(summary_file)
+
+    # Assuming the last two columns are Mixing Index and Pressure Drop
+    mixing_indices = df.iloc[:, -2].tolist()
+    pressure_drops = df.iloc[:, -1].tolist()
+
+    return mixing_indices, pressure_drops
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+
+## Vectorized non-dominated ranking
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Objectives follow the Mixer convention: objective 1 (mixing index) is maximized, objective 2 (pressure drop)
+# is minimized. Internally every objective is turned into a minimization; missing values rank last.
+
+MAXIMIZE = (True, False)
+
+
+def objectives_array(population):
+    """
+    Collect the objectives of a list of solutions into an (N, M) float array. Non-numeric values become NaN.
+    """
+    if not population:
+        return np.empty((0, 2))
+    return np.array(
+        [[_to_float(value) for value in solution["objectives"]] for solution in population], dtype=float
+    )
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def to_minimization(objectives, maximize=MAXIMIZE):
+    """
+    Convert an (N, M) objective array to minimization: maximized columns are negated, NaN becomes +inf.
+    """
+    objectives = np.asarray(objectives, dtype=float).reshape(len(objectives), -1)
+    signs = np.where(np.asarray(maximize[:objectives.shape[1]], dtype=bool), -1.0, 1.0)
+    minimized = objectives * signs
+    minimized[np.isnan(minimized)] = np.inf
+    return minimized
+
+
+def _ranks_2d(points):
+    """
+    O(N log N) ranking of 2-objective minimization points.
+
+    Points are swept in lexicographic order; each front keeps the second objective of its last member,
+    and these values are non-decreasing from front to front, so the front of a point is found by bisection.
+    """
+    n = len(points)
+    ranks = np.empty(n, dtype=np.int64)
+    if n == 0:
+        return ranks
+
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    f1 = points[order, 0].tolist()
+    f2 = points[order, 1].tolist()
+
+    front_last = []
+    previous = None
+    for position, index in enumerate(order.tolist()):
+        current = (f1[position], f2[position])
+        if current == previous:
+            # Identical points do not dominate each other
+            ranks[index] = rank
+            continue
+        rank = bisect_right(front_last, current[1])
+        if rank == len(front_last):
+            front_last.append(current[1])
+        else:
+            front_last[rank] = current[1]
+        ranks[index] = rank
+        previous = current
+    return ranks
+
+
+def _ranks_nd(points, block_size=2048):
+    """
+    Ranking for any number of objectives by peeling fronts with a vectorized dominance test.
+    """
+    n = len(points)
+    ranks = np.full(n, -1, dtype=np.int64)
+    remaining = np.arange(n)
+    rank = 0
+    while len(remaining):
+        candidates = points[remaining]
+        dominated = np.zeros(len(remaining), dtype=bool)
+        for start in range(0, len(remaining), block_size):
+            block = candidates[start:start + block_size]
+            # dominates[i, j]: candidate i dominates block member j
+            no_worse = (candidates[:, None, :] <= block[None, :, :]).all(axis=2)
+            better = (candidates[:, None, :] < block[None, :, :]).any(axis=2)
+            dominated[start:start + block_size] = (no_worse & better).any(axis=0)
+        ranks[remaining[~dominated]] = rank
+        remaining = remaining[dominated]
+        rank += 1
+    return ranks
+
+
+def non_dominated_ranks(objectives, maximize=MAXIMIZE):
+    """
+    Non-dominated rank of every point (0 for the Pareto front).
+
+    :param objectives: (N, M) array of objective values
+    :param maximize: Per objective, True if it is maximized
+    :return: (N,) integer array of ranks
+    """
+    points = to_minimization(objectives, maximize)
+    if points.shape[1] == 2:
+        return _ranks_2d(points)
+    return _ranks_nd(points)
+
+
+def fronts_from_ranks(ranks):
+    """
+    Group point indices by rank.
+
+    :return: List of index arrays, front 0 first; indices are ascending within a front
+    """
+    ranks = np.asarray(ranks)
+    if len(ranks) == 0:
+        return []
+    order = np.argsort(ranks, kind='stable')
+    boundaries = np.flatnonzero(np.diff(ranks[order])) + 1
+    return np.split(order, boundaries)
+
+
+def pareto_front_indices(objectives, maximize=MAXIMIZE):
+    """Indices of the non-dominated points."""
+    return np.flatnonzero(non_dominated_ranks(objectives, maximize) == 0)
+
+
+def crowding_distance(objectives):
+    """
+    NSGA-II crowding distance of the points of one front; boundary points get infinity.
+
+    :param objectives: (N, M) array of objective values
+    :return: (N,) array of distances
+    """
+    points = to_minimization(objectives, (False,) * np.shape(objectives)[-1])
+    n = len(points)
+    distance = np.zeros(n)
+    if n <= 2:
+        distance[:] = np.inf
+        return distance
+
+    for j in range(points.shape[1]):
+        order = np.argsort(points[:, j], kind='stable')
+        values = points[order, j]
+        distance[order[0]] = distance[order[-1]] = np.inf
+        span = values[-1] - values[0]
+        if span > 0 and np.isfinite(span):
+            distance[order[1:-1]] += (values[2:] - values[:-2]) / span
+    return distance
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import argparse
+import math
+import os
+import re
+from collections import deque
+
+
+## Convergence monitor of the solver output
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# In batch mode STAR-CCM+ prints a table of the residuals and of the printed report monitors, one row per
+# iteration:
+#
+#    Iteration    Continuity    X-momentum    Y-momentum    Z-momentum    Pressure_drop Monitor    mixing index Monitor
+#            1  1.000000e+00  1.000000e+00  1.000000e+00  1.000000e+00             1.234567e+01            2.345678e-01
+#
+# SolverMonitor reads the output line by line as it is written. STAR-CCM+ reprints the header every few dozen
+# iterations; a reprint only updates the columns, a new run starts at "Stop file: ..." or when the iteration
+# number goes down. A run has converged once the report
+# monitors (Pressure_drop, mixing index) changed by less than report_tolerance over the last window
+# iterations and the residuals are below residual_tolerance; it has diverged once a value is not finite or
+# a residual grew divergence_factor times above its minimum. Run_CFD.java prints the stop file of every
+# design ("Stop file: ..."), which it registers as the Stop File criterion: creating that file makes the
+# solver stop after the current iteration, and the macro exports the design as usual. Diverged runs are
+# killed by the CFD job pool instead.
+#
+# python solver_monitor.py replay Design*.log replays recorded logs offline, e.g. to tune the tolerances.
+
+STOP_FILE_PATTERN = re.compile(r"Stop file: (.+)")
+
+
+def parse_number(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class SolverMonitor:
+    """
+    Plateau and divergence detection on the streamed solver output of one run (or of several runs one after
+    the other, a stop file line or a lower iteration number starts a new run).
+
+    Usage:
+        monitor = SolverMonitor(window=50, report_tolerance=1e-3)
+        for line in output:
+            if monitor.feed(line) == "converged":
+                open(monitor.stop_file, 'w').close()
+    """
+    def __init__(self, window=50, report_tolerance=1e-3, residual_tolerance=1e-3, min_iterations=100,
+                 divergence_factor=1e3, report_columns=("Pressure_drop", "mixing index")):
+        """
+        :param window: Iterations over which the report monitors must not change
+        :param report_tolerance: Largest relative change (max - min) / |mean| of every report monitor over the window
+        :param residual_tolerance: Largest residual at convergence, None to only look at the report monitors
+        :param min_iterations: Iterations before a run may be stopped
+        :param divergence_factor: A residual this many times above its minimum means divergence
+        :param report_columns: Columns of the report monitors, matched case-insensitively as substrings;
+                               all other columns but the iteration are residuals
+        """
+        self.window = window
+        self.report_tolerance = report_tolerance
+        self.residual_tolerance = residual_tolerance
+        self.min_iterations = min_iterations
+        self.divergence_factor = divergence_factor
+        self.report_columns = [name.lower() for name in report_columns]
+        self.stop_file = None
+        self.columns = None
+        self.iteration = None
+        self.finished_run = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the current run, e.g. when the solver starts the next design; the columns are kept. The result
+        of the forgotten run is kept in finished_run (see replay).
+        """
+        if self.iteration is not None:
+            self.finished_run = {
+                "stop_file": self.stop_file,
+                "iterations": self.iteration,
+                "decision": self.decision,
+                "decision_iteration": self.decision_iteration,
+                "reason": self.reason,
+            }
+        self.history = {column: deque(maxlen=self.window) for column in self.columns or []}
+        self.minimum = {}
+        self.iteration = None
+        self.decision = None
+        self.decision_iteration = None
+        self.reason = None
+
+    def is_report(self, column):
+        return any(name in column.lower() for name in self.report_columns)
+
+    def feed(self, line):
+        """
+        Read one line of solver output.
+
+        :return: "converged" or "diverged" on the line where the run is first found to be so, else None
+        """
+        match = STOP_FILE_PATTERN.search(line)
+        if match:
+            self.reset()
+            self.stop_file = match.group(1).strip()
+            return None
+
+        fields = line.split()
+        if not fields:
+            return None
+        if fields[0] == "Iteration":
+            # Column names may contain single spaces ("Pressure_drop Monitor"), columns are separated by more.
+            # The header is reprinted during a run: the history of the columns that remain is kept
+            self.columns = re.split(r"\s{2,}", line.strip())[1:]
+            self.history = {column: self.history.get(column, deque(maxlen=self.window)) for column in self.columns}
+            return None
+        if self.columns is None or not fields[0].isdigit() or len(fields) != len(self.columns) + 1:
+            return None
+        values = [parse_number(field) for field in fields[1:]]
+        if None in values:
+            return None
+
+        iteration = int(fields[0])
+        if self.iteration is not None and iteration <= self.iteration:
+            # The solver started another run without printing a stop file
+            self.reset()
+            self.stop_file = None
+        self.iteration = iteration
+        for column, value in zip(self.columns, values):
+            self.history[column].append(value)
+            if not self.is_report(column) and math.isfinite(value) and value > 0:
+                self.minimum[column] = min(self.minimum.get(column, value), value)
+        if self.decision is not None:
+            return None
+
+        decision = self._diverged(values) or self._converged()
+        if decision:
+            self.decision, self.reason = decision
+            self.decision_iteration = self.iteration
+            return self.decision
+        return None
+
+    def _diverged(self, values):
+        for column, value in zip(self.columns, values):
+            if not math.isfinite(value):
+                return "diverged", f"{column} is {value}"
+            if not self.is_report(column) and column in self.minimum and \
+                    value > self.divergence_factor * self.minimum[column]:
+                return "diverged", f"{column} {value:.3g} is {value / self.minimum[column]:.0f}x its minimum"
+        return None
+
+    def _converged(self):
+        if self.iteration < self.min_iterations:
+            return None
+        changes = []
+        for column in self.columns:
+            history = self.history[column]
+            if self.is_report(column):
+                if len(history) < self.window:
+                    return None
+                mean = sum(history) / len(history)
+                change = (max(history) - min(history)) / abs(mean) if mean else float("inf")
+                if change > self.report_tolerance:
+                    return None
+                changes.append(f"{column} {change:.1e}")
+            elif self.residual_tolerance is not None and history[-1] > self.residual_tolerance:
+                return None
+        if not changes and self.residual_tolerance is None:
+            return None  # Neither report monitors nor residuals to judge the run by
+        return "converged", (f"plateau over {self.window} iterations ({', '.join(changes)})" if changes else
+                             f"residuals below {self.residual_tolerance}")
+
+
+## Offline replay
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def replay(lines, monitor):
+    """
+    Replay solver output through a monitor.
+
+    :param lines: Lines of a solver log
+    :param monitor: SolverMonitor; its options decide when the runs would have been stopped
+    :return: List of dicts {stop_file, iterations, decision, decision_iteration, reason}, one per run in the log
+    """
+    runs = []
+    for line in lines:
+        monitor.feed(line)
+        if monitor.finished_run is not None:
+            runs.append(monitor.finished_run)
+            monitor.finished_run = None
+    monitor.reset()
+    if monitor.finished_run is not None:
+        runs.append(monitor.finished_run)
+        monitor.finished_run = None
+    return runs
+
+
+def replay_files(log_files, **options):
+    """Replay solver logs with the options of SolverMonitor, print and return the result of every run."""
+    results = []
+    for log_file in log_files:
+        with open(log_file, 'r', encoding='utf-8', errors='replace') as file:
+            runs = replay(file, SolverMonitor(**options))
+        for run in runs:
+            run["log_file"] = log_file
+            outcome = f"{run['decision']} at {run['decision_iteration']} ({run['reason']})" if run["decision"] else "not stopped"
+            print(f"{os.path.basename(log_file)}: {run['iterations']} iterations, {outcome}")
+            results.append(run)
+    run_iterations = sum(run["iterations"] for run in results)
+    saved = sum(run["iterations"] - run["decision_iteration"] for run in results if run["decision"])
+    if run_iterations:
+        print(f"{len(results)} runs, {run_iterations} iterations, {saved} ({saved / run_iterations:.0%}) saved "
+              f"by stopping, {sum(run['decision'] == 'diverged' for run in results)} diverged")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solver convergence monitor.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="Replay recorded solver logs offline")
+    replay_parser.add_argument("log_files", nargs="+")
+    replay_parser.add_argument("--window", type=int, default=50)
+    replay_parser.add_argument("--report-tolerance", type=float, default=1e-3)
+    replay_parser.add_argument("--residual-tolerance", type=float, default=1e-3,
+                               help="Largest residual at convergence, a negative value ignores the residuals")
+    replay_parser.add_argument("--min-iterations", type=int, default=100)
+    replay_parser.add_argument("--divergence-factor", type=float, default=1e3)
+    subparsers.add_parser("demo", help="Designs solved by the dummy solver in the CFD job pool, with and without "
+                                        "the monitor, and the logs of the unmonitored runs replayed offline")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        replay_files(args.log_files, window=args.window, report_tolerance=args.report_tolerance,
+                     residual_tolerance=args.residual_tolerance if args.residual_tolerance >= 0 else None,
+                     min_iterations=args.min_iterations, divergence_factor=args.divergence_factor)
+
+    elif args.command == "demo":
+        import sys
+        import tempfile
+        import time
+
+        from cfd_job_pool import CFDJobPool, make_cfd_jobs
+
+        dummy_solver = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_starccm.py")
+        os.environ.setdefault("DUMMY_SOLVER_SECONDS", "2.0")
+        os.environ.setdefault("DUMMY_DIVERGENCE_RATE", "0.1")
+        # The dummy runs 100 iterations, the windows are scaled down accordingly
+        options = {"window": 20, "report_tolerance": 1e-3, "residual_tolerance": 1e-3, "min_iterations": 20}
+
+        with tempfile.TemporaryDirectory() as folder:
+            for k in range(1, 9):
+                with open(os.path.join(folder, f"Design{k}.x_t"), 'w') as file:
+                    file.write(f"design {k}\n")
+            for monitor_factory in (None, lambda: SolverMonitor(**options)):
+                pool = CFDJobPool([sys.executable, dummy_solver, "-np", "{cores}", "-batch", "{macro}"],
+                                  macro_file="Run_CFD_Modified.java", core_budget=16, poll_interval=0.05,
+                                  monitor_factory=monitor_factory)
+                start = time.time()
+                jobs = pool.run(make_cfd_jobs(folder, "Design_blank.sim", 4))
+                elapsed = time.time() - start
+                statuses = {status: sum(job.status == status for job in jobs) for status in ("done", "failed", "diverged")}
+                print(f"\n{'With' if monitor_factory else 'Without'} monitor: {elapsed:.1f} s, "
+                      f"{sum(job.iterations or 0 for job in jobs)} iterations, {statuses}\n")
+                if monitor_factory is None:
+                    print("Offline replay of the unmonitored logs:")
+                    replay_files([job.log_file for job in jobs], **options)
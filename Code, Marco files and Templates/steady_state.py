@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import math
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from evaluation_cache import design_key
+from hypervolume import ParetoArchive
+from optimization import (
+    Mixer,
+    crossover,
+    generate_initial_population,
+    mutate,
+    select_next_generation,
+    tournament_selection,
+)
+
+
+## Functions for asynchronous steady-state optimization
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def make_offspring(population, problem, crossover_rate, mutation_rate, exclude, max_attempts=100):
+    """
+    Produce a single offspring from the current parents.
+
+    :param population: Ranked parent population
+    :param problem: Problem definition (Mixer)
+    :param crossover_rate: Crossover probability
+    :param mutation_rate: Mutation probability per variable
+    :param exclude: Set of design keys that must not be produced again (evaluated or in flight)
+    :param max_attempts: Number of tries before giving up
+    :return: A new solution, or None if no new design was found
+    """
+    for _ in range(max_attempts):
+        parent1 = tournament_selection(population)
+        parent2 = tournament_selection(population)
+        child1, child2 = crossover(parent1, parent2, crossover_rate, problem)
+        child = random.choice([child1, child2])
+
+        # Copy the child, crossover returns the parents themselves when it is not applied
+        child = mutate({"variables": list(child["variables"]), "objectives": [0.0, 0.0]}, mutation_rate, problem)
+        if design_key(child["variables"]) not in exclude:
+            return child
+    return None
+
+
+def run_steady_state(problem, evaluate, population_size, max_evaluations, num_workers, crossover_rate,
+                     mutation_rate, reference_point, initial_population=None, evaluation_cache=None, density="crowding"):
+    """
+    Asynchronous steady-state optimization. Up to num_workers evaluations run at the same time; whenever one
+    of them finishes, the design is inserted into the population and ranked, and a new offspring is produced
+    from the current parents and dispatched right away. There is no generation barrier.
+
+    :param problem: Problem definition (Mixer)
+    :param evaluate: Callable evaluate(variables, evaluation_id) -> (obj1, obj2), called from worker threads
+    :param population_size: Number of surviving solutions
+    :param max_evaluations: Number of evaluations to dispatch in total
+    :param num_workers: Number of evaluations running at the same time
+    :param crossover_rate: Crossover probability
+    :param mutation_rate: Mutation probability per variable
+    :param reference_point: Reference point for the HyperVolume calculation
+    :param initial_population: Optional list of solutions to evaluate first, random designs otherwise
+    :param evaluation_cache: Optional EvaluationCache; cached designs are inserted without being dispatched
+    :param density: Density estimator for survival and tournament ties, see select_next_generation
+    :return: A tuple (population, history), history holding one record per finished evaluation
+    """
+    pending = list(initial_population or generate_initial_population(problem, population_size))
+    population = []
+    history = []
+    seen = set()  # Design keys that are evaluated or in flight
+    in_flight = {}
+    archive = ParetoArchive(reference_point)
+    submitted = 0
+    start_time = time.time()
+
+    def insert(solution, evaluation_id, started, cached=False):
+        nonlocal population
+        population.append(solution)
+        population = select_next_generation(population, population_size, density, reference_point)
+        archive.insert(solution["objectives"][0], solution["objectives"][1], solution)
+        hv = archive.hypervolume
+        finished = time.time()
+        history.append({
+            "evaluation": evaluation_id,
+            "variables": list(solution["variables"]),
+            "objectives": list(solution["objectives"]),
+            "cached": cached,
+            "started": started - start_time,
+            "finished": finished - start_time,
+            "hypervolume": hv,
+        })
+        print(f"Evaluation {evaluation_id} finished: Variables = {solution['variables']}, "
+              f"Objectives = {solution['objectives']}, HyperVolume: {hv:.4f}")
+
+    def dispatch(executor):
+        nonlocal submitted
+        while len(in_flight) < num_workers and submitted < max_evaluations:
+            if pending:
+                solution = pending.pop(0)
+            elif len(population) >= 2:
+                solution = make_offspring(population, problem, crossover_rate, mutation_rate, seen)
+                if solution is None:
+                    print("No new offspring found, waiting for running evaluations.")
+                    return
+            else:
+                # Not enough evaluated parents yet for a tournament
+                return
+
+            key = design_key(solution["variables"])
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if evaluation_cache is not None:
+                entry = evaluation_cache.lookup(solution["variables"])
+                if entry is not None:
+                    solution["objectives"] = list(entry["objectives"])
+                    insert(solution, "cache", time.time(), cached=True)
+                    continue
+
+            submitted += 1
+            future = executor.submit(evaluate, list(solution["variables"]), submitted)
+            in_flight[future] = (submitted, solution, time.time())
+            print(f"Dispatched evaluation {submitted}: Variables = {solution['variables']}")
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        dispatch(executor)
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                evaluation_id, solution, started = in_flight.pop(future)
+                try:
+                    obj1, obj2 = future.result()
+                except Exception as e:
+                    print(f"Evaluation {evaluation_id} failed: {e}")
+                    continue
+                solution["objectives"] = [obj1, obj2]
+                insert(solution, evaluation_id, started)
+            dispatch(executor)
+
+    elapsed = time.time() - start_time
+    completed = len([record for record in history if not record["cached"]])
+    print(f"Steady-state run finished: {completed} evaluations in {elapsed:.1f} s "
+          f"({evaluations_per_hour(history, elapsed):.1f} evaluations per hour).")
+    return population, history
+
+
+def run_generational(problem, evaluate, population_size, generations, num_workers, crossover_rate,
+                     mutation_rate, reference_point, density="crowding"):
+    """
+    Lockstep reference run with the same evaluator: all offspring of a generation are dispatched together
+    and the next generation only starts when the slowest one has finished.
+
+    :return: A tuple (population, history) as returned by run_steady_state
+    """
+    population = []
+    history = []
+    seen = set()
+    start_time = time.time()
+    evaluation_id = 0
+    archive = ParetoArchive(reference_point)
+
+    batch = generate_initial_population(problem, population_size)
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for generation in range(generations + 1):
+            started = time.time()
+            futures = []
+            for solution in batch:
+                seen.add(design_key(solution["variables"]))
+                evaluation_id += 1
+                futures.append((evaluation_id, solution, executor.submit(evaluate, list(solution["variables"]), evaluation_id)))
+
+            for current_id, solution, future in futures:
+                try:
+                    solution["objectives"] = list(future.result())
+                except Exception as e:
+                    print(f"Evaluation {current_id} failed: {e}")
+                    continue
+                population.append(solution)
+                archive.insert(solution["objectives"][0], solution["objectives"][1], solution)
+                history.append({
+                    "evaluation": current_id,
+                    "variables": list(solution["variables"]),
+                    "objectives": list(solution["objectives"]),
+                    "cached": False,
+                    "started": started - start_time,
+                    "finished": time.time() - start_time,
+                    "hypervolume": archive.hypervolume,
+                })
+
+            population = select_next_generation(population, population_size, density, reference_point)
+            print(f"Generation {generation + 1} finished, HyperVolume: {archive.hypervolume:.4f}")
+
+            batch = []
+            while len(batch) < population_size and len(population) >= 2:
+                child = make_offspring(population, problem, crossover_rate, mutation_rate, seen)
+                if child is None:
+                    break
+                seen.add(design_key(child["variables"]))
+                batch.append(child)
+            if not batch:
+                break
+
+    return population, history
+
+
+def evaluations_per_hour(history, elapsed):
+    """Completed (non-cached) evaluations per wall-clock hour."""
+    completed = len([record for record in history if not record["cached"]])
+    return completed / elapsed * 3600 if elapsed > 0 else 0.0
+
+
+def stand_in_objectives(problem, variables):
+    """
+    Deterministic analytic (MI, pressure drop) of an obstacle layout, used in place of CFD results.
+    The flow runs along the lattice rows (top and bottom nodes are the channel walls).
+    """
+    centres = []
+    mixing, blockage = 0.0, 0.0
+    for position in variables:
+        a, b = problem.edges[position - 1]
+        row_a, col_a = divmod(a - 1, 4)
+        row_b, col_b = divmod(b - 1, 4)
+        across = abs(row_a - row_b)
+        along = abs(col_a - col_b)
+        centre_row, centre_col = (row_a + row_b) / 2, (col_a + col_b) / 2
+
+        # Obstacles across the flow mix more but also block more than obstacles along it
+        mixing += 0.6 * across + 0.25 * along + 0.15 * abs(centre_row - 1.5)
+        blockage += 0.9 * across + 0.3 * along + 0.2 * (1.5 - abs(centre_row - 1.5))
+        centres.append((centre_row, centre_col))
+
+    # Staggered obstacles fold the interface; obstacles side by side narrow the gap between them
+    for i in range(len(centres)):
+        for j in range(i + 1, len(centres)):
+            d_row = abs(centres[i][0] - centres[j][0])
+            d_col = abs(centres[i][1] - centres[j][1])
+            if 0 < d_col <= 1 and d_row >= 0.5:
+                mixing += 0.4 * d_row
+            if d_col == 0:
+                blockage += 0.8 / (d_row + 0.5)
+
+    obj1 = 0.15 + 0.4 * (1 - math.exp(-mixing / 4))
+    obj2 = 2.0 + 1.2 * blockage ** 1.2
+    return obj1, obj2
+
+
+def make_stand_in_evaluator(problem, mean_duration=0.2, spread=0.6, seed=0):
+    """
+    Local stand-in for the SolidWorks + STAR-CCM+ chain. The objectives are a deterministic analytic
+    function of the obstacle layout; the run time is drawn from a log-normal distribution, so a few
+    designs are much slower than the others, as with slow or divergent CFD runs.
+
+    :param problem: Problem definition (Mixer)
+    :param mean_duration: Median run time of one evaluation in seconds
+    :param spread: Standard deviation of the log run time
+    :param seed: Seed of the run time generator
+    :return: Callable evaluate(variables, evaluation_id) -> (obj1, obj2)
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def evaluate(variables, evaluation_id):
+        with lock:
+            duration = rng.lognormvariate(math.log(mean_duration), spread)
+        time.sleep(duration)
+
+        return stand_in_objectives(problem, variables)
+
+    return evaluate
+
+
+if __name__ == "__main__":
+    # Compare steady-state and lockstep throughput with the local stand-in evaluator
+    random.seed(1)
+    problem = Mixer()
+    evaluator = make_stand_in_evaluator(problem, mean_duration=0.2, spread=0.8, seed=1)
+    reference_point = [-1.0, 50.0]
+
+    start = time.time()
+    _, generational_history = run_generational(problem, evaluator, 4, 5, 4, 0.7, 0.3, reference_point)
+    generational_time = time.time() - start
+
+    random.seed(1)
+    start = time.time()
+    population, steady_history = run_steady_state(problem, evaluator, 4, len(generational_history), 4, 0.7, 0.3,
+                                                  reference_point)
+    steady_time = time.time() - start
+
+    print(f"\nGenerational: {len(generational_history)} evaluations in {generational_time:.2f} s, "
+          f"{evaluations_per_hour(generational_history, generational_time):.0f} evaluations per hour, "
+          f"HyperVolume {generational_history[-1]['hypervolume']:.4f}")
+    print(f"Steady-state: {len(steady_history)} evaluations in {steady_time:.2f} s, "
+          f"{evaluations_per_hour(steady_history, steady_time):.0f} evaluations per hour, "
+          f"HyperVolume {steady_history[-1]['hypervolume']:.4f}")
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from postprocessing import (PLATES, defer_reports, design_filenames, load_summary_rows, natural_key, summarize_csv,
+                            write_summary)
+
+
+## Incremental post-processing while the simulations are running
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def export_complete(csv_file):
+    """
+    Check whether Run_CFD.java has finished a design's export: the pressure drop is appended to the header
+    and to the first data row only after the XYZ table has been written.
+    """
+    try:
+        with open(csv_file, 'r', encoding='utf-8', errors='replace') as file:
+            header = file.readline()
+            first_row = file.readline()
+    except OSError:
+        return False
+    fields = first_row.rstrip('\r\n').split(',')
+    return 'Pressure_drop' in header and first_row.endswith('\n') and len(fields) > 5 and fields[5].strip() != ''
+
+
+def file_signature(csv_file):
+    """(size, modification time) of a file, None if it does not exist."""
+    try:
+        stat = os.stat(csv_file)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class SummaryWatcher:
+    """
+    Background thread that post-processes every Design{k}.csv of a generation as soon as its export is
+    complete and has not changed for settle_time seconds, and upserts its row into the summary file.
+    A file that changes after it was processed is processed again. With num_designs, only Design1 to
+    Design{num_designs} are watched and the final summary has a row for each of them, NaN for a design
+    without export, as in process_all_csv_files.
+
+    Usage:
+        watcher = SummaryWatcher(folder, output_folder, summary_file).start()
+        ... run the simulations ...
+        watcher.finish()  # Processes what is left and writes the final summary
+    """
+    def __init__(self, input_folder, output_folder, summary_file, planes=PLATES, chunksize=None, use_cache=False,
+                 write_reports=True, num_workers=1, num_designs=None, poll_interval=1.0, settle_time=2.0):
+        self.input_folder = input_folder
+        self.output_folder = output_folder
+        self.summary_file = summary_file
+        self.planes = planes
+        self.chunksize = chunksize
+        self.use_cache = use_cache
+        self.write_reports = write_reports
+        self.num_workers = num_workers
+        self.num_designs = num_designs
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+
+        self.rows = {}  # File name -> (base name, MI values, F2 value)
+        self.processed = {}  # File name -> signature of the processed version
+        self.candidates = {}  # File name -> (signature, time it was first seen)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="SummaryWatcher", daemon=True)
+
+    def start(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.thread.start()
+        return self
+
+    def resume(self, filenames):
+        """
+        Keep the rows of the existing summary for the given exports (already post-processed before a restart),
+        so they are not processed again unless they change.
+
+        :param filenames: Export file names, e.g. ['Design1.csv', 'Design2.csv']
+        :return: self
+        """
+        rows = load_summary_rows(self.summary_file, self.planes)
+        with self.lock:
+            for filename in filenames:
+                signature = file_signature(os.path.join(self.input_folder, filename))
+                if filename in rows and signature is not None:
+                    self.rows[filename] = rows[filename]
+                    self.processed[filename] = signature
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Summary watcher: {e}")
+
+    def poll(self, force=False):
+        """
+        Process every new or changed export that is complete and stable.
+
+        :param force: Process all new or changed exports, complete or not (used once the solver has finished)
+        :return: Number of processed files
+        """
+        with self.lock:
+            if not os.path.isdir(self.input_folder):
+                return 0
+            filenames = sorted((f for f in os.listdir(self.input_folder) if f.endswith(".csv")), key=natural_key)
+            if self.num_designs is not None:
+                expected = set(design_filenames(self.num_designs))
+                filenames = [f for f in filenames if f in expected]
+            processed = 0
+            now = time.time()
+            for filename in filenames:
+                file_path = os.path.join(self.input_folder, filename)
+                signature = file_signature(file_path)
+                if signature is None or self.processed.get(filename) == signature:
+                    continue
+
+                if not force:
+                    # Wait until the export is complete and its size and modification time have settled
+                    previous, first_seen = self.candidates.get(filename, (None, now))
+                    if previous != signature:
+                        self.candidates[filename] = (signature, now)
+                        continue
+                    if now - first_seen < self.settle_time or not export_complete(file_path):
+                        continue
+
+                self._process(filename, file_path, signature)
+                processed += 1
+            if processed:
+                write_summary([self.rows[f] for f in sorted(self.rows, key=natural_key)], self.summary_file,
+                              self.planes)
+            return processed
+
+    def _process(self, filename, file_path, signature):
+        start = time.time()
+        base_name, mi_values, f2_value, error = summarize_csv(file_path, self.output_folder, self.planes,
+                                                              self.chunksize, self.use_cache,
+                                                              self.write_reports is True)
+        if error is not None:
+            print(f"Post-processing of {base_name} failed: {error}")
+        elif self.write_reports == "deferred":
+            defer_reports([file_path], self.output_folder, self.planes, self.chunksize, self.use_cache,
+                          self.num_workers)
+        self.rows[filename] = (base_name, mi_values, f2_value)
+        self.processed[filename] = signature
+        self.candidates.pop(filename, None)
+        print(f"{base_name} post-processed in {time.time() - start:.2f} s.")
+
+    def finish(self):
+        """
+        Stop watching, process the remaining exports and write the final summary.
+
+        :return: Path to the summary file
+        """
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.poll(force=True)
+        with self.lock:
+            summary_data = [self.rows[f] for f in sorted(self.rows, key=natural_key)]
+            if self.num_designs is not None:
+                summary_data = []
+                for filename in design_filenames(self.num_designs):
+                    if filename not in self.rows:
+                        print(f"Post-processing of {filename} failed: the export is missing")
+                    summary_data.append(self.rows.get(filename, (filename, {name: np.nan for name, _ in self.planes},
+                                                                 None)))
+            write_summary(summary_data, self.summary_file, self.planes)
+        return self.summary_file
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import time
+
+import numpy as np
+
+from evaluation_cache import design_key
+from ranking import non_dominated_ranks
+
+
+## Surrogate pre-screening of offspring
+# ----------------------------------------------------------------------------------------------------------------------------
+
+def design_features(designs, num_edges=36):
+    """
+    One-hot encoding of obstacle layouts: row i has a 1 in column e - 1 for every edge index e of design i.
+
+    :param designs: List of variable lists (1-based Mixer.edges indices)
+    :return: (N, num_edges) float array
+    """
+    features = np.zeros((len(designs), num_edges))
+    for i, variables in enumerate(designs):
+        features[i, [int(v) - 1 for v in set(variables)]] = 1.0
+    return features
+
+
+class GaussianProcessSurrogate:
+    """
+    Gaussian process on one-hot layout features, one independent output per objective.
+
+    The kernel exp(-hamming / length_scale) only depends on the number of shared obstacle edges, and it is
+    positive definite on binary vectors. With a few hundred evaluated designs, fitting (Cholesky) and predicting
+    take milliseconds, so the model is simply refitted on all data after every generation.
+    """
+    def __init__(self, length_scale=4.0, noise=1e-2, num_edges=36, min_training_size=4):
+        self.length_scale = length_scale
+        self.noise = noise
+        self.num_edges = num_edges
+        self.min_training_size = min_training_size
+
+        self.designs = {}  # design key -> (variables, objectives)
+        self.predictions = {}  # design key -> predicted mean, waiting for the CFD result
+        self.errors = []  # (design key, predicted, actual)
+        self.fit_time = 0.0
+
+    @property
+    def ready(self):
+        return len(self.designs) >= self.min_training_size
+
+    def _kernel(self, a, b):
+        # Hamming distance of one-hot rows: |a| + |b| - 2 a.b
+        hamming = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :] - 2 * a @ b.T
+        return np.exp(-hamming / self.length_scale)
+
+    def update(self, designs, objectives):
+        """
+        Add evaluated designs and refit. Designs predicted earlier get their prediction error recorded.
+
+        :param designs: List of variable lists
+        :param objectives: List of (obj1, obj2)
+        """
+        for variables, values in zip(designs, objectives):
+            values = np.array(values, dtype=float)
+            if not np.all(np.isfinite(values)):
+                continue
+            key = design_key(variables)
+            if key in self.predictions:
+                self.errors.append((key, self.predictions.pop(key), values))
+            self.designs[key] = (list(variables), values)
+        self.fit()
+
+    def fit(self):
+        start = time.perf_counter()
+        if not self.designs:
+            return
+        variables, values = zip(*self.designs.values())
+        self.train_x = design_features(variables, self.num_edges)
+        targets = np.array(values)
+
+        # Standardize every objective
+        self.mean = targets.mean(axis=0)
+        self.scale = targets.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        standardized = (targets - self.mean) / self.scale
+
+        gram = self._kernel(self.train_x, self.train_x) + self.noise * np.eye(len(targets))
+        self.cholesky = np.linalg.cholesky(gram)
+        self.alpha = np.linalg.solve(self.cholesky.T, np.linalg.solve(self.cholesky, standardized))
+        self.fit_time = time.perf_counter() - start
+
+    def predict(self, designs):
+        """
+        Predicted objectives of new designs.
+
+        :return: A tuple (mean, std) of (N, 2) arrays in objective units
+        """
+        x = design_features(designs, self.num_edges)
+        cross = self._kernel(x, self.train_x)
+        mean = cross @ self.alpha
+        v = np.linalg.solve(self.cholesky, cross.T)
+        variance = np.clip(1.0 - (v ** 2).sum(axis=0), 1e-12, None)
+        std = np.sqrt(variance)[:, None] * np.ones((1, mean.shape[1]))
+        return mean * self.scale + self.mean, std * self.scale
+
+    def error_report(self):
+        """
+        Prediction error of all designs that were predicted before they were simulated.
+
+        :return: Dictionary with the number of compared designs and the MAE / RMSE per objective
+        """
+        if not self.errors:
+            return {"count": 0}
+        predicted = np.array([error[1] for error in self.errors])
+        actual = np.array([error[2] for error in self.errors])
+        difference = predicted - actual
+        return {
+            "count": len(self.errors),
+            "mae": np.abs(difference).mean(axis=0).tolist(),
+            "rmse": np.sqrt((difference ** 2).mean(axis=0)).tolist(),
+        }
+
+
+def prescreen(surrogate, candidates, k, kappa=1.0):
+    """
+    Choose the k candidates worth a CFD run. Candidates are ranked by non-dominated sorting of their optimistic
+    predictions (MI + kappa * std, pressure drop - kappa * std); ties go to the most uncertain candidate.
+
+    :param surrogate: GaussianProcessSurrogate
+    :param candidates: List of solutions, more than k
+    :param k: Number of candidates to keep
+    :param kappa: Weight of the uncertainty; 0 selects on predicted dominance only
+    :return: List of the selected solutions
+    """
+    if len(candidates) <= k or not surrogate.ready:
+        return candidates[:k]
+
+    start = time.perf_counter()
+    mean, std = surrogate.predict([solution["variables"] for solution in candidates])
+    optimistic = np.column_stack([mean[:, 0] + kappa * std[:, 0], mean[:, 1] - kappa * std[:, 1]])
+    ranks = non_dominated_ranks(optimistic)
+    uncertainty = (std / surrogate.scale).sum(axis=1)
+    order = np.lexsort((-uncertainty, ranks))[:k]
+
+    selected = []
+    for i in order:
+        surrogate.predictions[design_key(candidates[i]["variables"])] = mean[i]
+        selected.append(candidates[i])
+    print(f"Surrogate selected {k} of {len(candidates)} candidates "
+          f"(fit {surrogate.fit_time * 1000:.1f} ms, predict {(time.perf_counter() - start) * 1000:.1f} ms).")
+    return selected
+
+
+if __name__ == "__main__":
+    # Training / prediction time and hold-out error on the analytic stand-in objectives
+    import random
+
+    from optimization import Mixer
+    from steady_state import stand_in_objectives
+
+    random.seed(0)
+    problem = Mixer()
+    designs = [problem.create_solution()["variables"] for _ in range(600)]
+    objectives = [stand_in_objectives(problem, variables) for variables in designs]
+    test_designs, test_objectives = designs[500:], np.array(objectives[500:])
+
+    print(f"{'training':>9} {'fit (ms)':>9} {'predict (ms)':>13} {'MAE MI':>8} {'MAE dP':>8}")
+    for n in [25, 50, 100, 200, 500]:
+        surrogate = GaussianProcessSurrogate()
+        surrogate.update(designs[:n], objectives[:n])
+        start = time.perf_counter()
+        mean, _ = surrogate.predict(test_designs)
+        predict_time = time.perf_counter() - start
+        mae = np.abs(mean - test_objectives).mean(axis=0)
+        print(f"{n:>9} {surrogate.fit_time * 1000:>9.2f} {predict_time * 1000:>13.2f} {mae[0]:>8.4f} {mae[1]:>8.4f}")
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import numpy as np
+
+from evaluation_cache import design_key
+
+
+## Symmetries of the obstacle lattice
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Mixer places the obstacles on the edges of a 4 x 4 node lattice, node n in row (n - 1) // 4 and column
+# (n - 1) % 4. The flow runs along the rows, the top nodes (1-4) and the bottom nodes (13-16) are the channel
+# walls, so a layout mirrored across the mid-plane of the channel (row r -> 3 - r) has the same pressure drop
+# and, the two inlet streams being swapped, the same mixing index:
+#
+#   mirror_top_bottom   row r -> 3 - r       mirror across the mid-plane of the channel
+#   mirror_left_right   column c -> 3 - c    reverses the flow direction through the mixer
+#   rotate_180          both of the above
+#
+# SymmetryGroup turns the enabled symmetries into permutation tables of the 36 edges of Mixer.edges and
+# reduces every layout to its canonical representative, the smallest sorted layout among its images. Only
+# the representative of each class of equivalent layouts is simulated and its results are assigned to all
+# members; the evaluation cache finds a design under any of its images. Symmetries the physics does not
+# support (e.g. mirror_left_right when inlet and outlet differ) are left out of the group; an empty group
+# simulates every layout. obstacle_offsets measures how far the CAD obstacles (geometry.obstacle_table)
+# deviate from an exact mirror image; as long as they do, mirror images are different geometries and main.py
+# keeps the group empty.
+
+LATTICE_SIZE = 4
+NODE_MAPS = {
+    "mirror_top_bottom": lambda row, col: (LATTICE_SIZE - 1 - row, col),
+    "mirror_left_right": lambda row, col: (row, LATTICE_SIZE - 1 - col),
+    "rotate_180": lambda row, col: (LATTICE_SIZE - 1 - row, LATTICE_SIZE - 1 - col),
+}
+
+
+def node_position(node):
+    """(row, column) of a lattice node, 1-based node numbers as in Mixer.edges."""
+    return divmod(node - 1, LATTICE_SIZE)
+
+
+def map_node(name, node):
+    """Image of a node under a symmetry of NODE_MAPS."""
+    row, col = NODE_MAPS[name](*node_position(node))
+    return row * LATTICE_SIZE + col + 1
+
+
+def edge_permutation(edges, name):
+    """
+    Permutation table of a symmetry over the edges of the lattice.
+
+    :param edges: Node pairs of the edges, Mixer.edges
+    :param name: Symmetry of NODE_MAPS
+    :return: Array of 1-based edge indices, entry e - 1 is the image of edge e
+    """
+    if name not in NODE_MAPS:
+        raise ValueError(f"Unknown symmetry '{name}', expected one of {sorted(NODE_MAPS)}.")
+    index = {frozenset(edge): e for e, edge in enumerate(edges, start=1)}
+    table = []
+    for a, b in edges:
+        image = frozenset(map_node(name, node) for node in (a, b))
+        if image not in index:
+            raise ValueError(f"Symmetry '{name}' maps edge {(a, b)} onto {tuple(sorted(image))}, which is not an edge.")
+        table.append(index[image])
+    return np.array(table, dtype=np.int64)
+
+
+class SymmetryGroup:
+    """
+    Group generated by the enabled symmetries, as permutation tables of the edges.
+
+    Usage:
+        symmetry = SymmetryGroup(problem.edges, ["mirror_top_bottom"])
+        symmetry.canonical([3, 7, 12, 30])  # Representative simulated for all images of the layout
+        representatives, classes = symmetry.reduce(population)
+    """
+    def __init__(self, edges, symmetries=()):
+        """
+        :param edges: Node pairs of the edges, Mixer.edges
+        :param symmetries: Names of the symmetries of NODE_MAPS the results are invariant under; the group
+                           also contains their compositions
+        """
+        self.symmetries = list(symmetries)
+        identity = np.arange(1, len(edges) + 1, dtype=np.int64)
+        generators = [edge_permutation(edges, name) for name in self.symmetries]
+
+        # Closure under composition, e.g. both mirrors add the rotation by 180 degrees
+        tables = [identity]
+        for table in tables:
+            for generator in generators:
+                composed = generator[table - 1]
+                if not any(np.array_equal(composed, known) for known in tables):
+                    tables.append(composed)
+        self.tables = np.array(tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def images(self, variables):
+        """Sorted layouts equivalent to a layout, one per element of the group (may repeat)."""
+        return [sorted(int(v) for v in table[np.asarray(variables, dtype=np.int64) - 1]) for table in self.tables]
+
+    def canonical(self, variables):
+        """Canonical representative of a layout: the lexicographically smallest of its sorted images."""
+        return min(self.images(variables))
+
+    def canonical_array(self, layouts):
+        """canonical() of every row of an array of shape (n, k) of 1-based edge indices."""
+        layouts = np.asarray(layouts, dtype=np.int64)
+        images = np.sort(self.tables[:, layouts - 1], axis=2)  # (group, n, k)
+        best = images[0]
+        for image in images[1:]:
+            # Row-wise lexicographic comparison: the first differing column decides
+            differs = image != best
+            first = np.argmax(differs, axis=1)
+            rows = np.arange(len(best))
+            smaller = differs.any(axis=1) & (image[rows, first] < best[rows, first])
+            best = np.where(smaller[:, None], image, best)
+        return best
+
+    def key(self, variables):
+        """design_key of the canonical representative, shared by all equivalent layouts."""
+        return design_key(self.canonical(variables))
+
+    def image_keys(self, variables):
+        """design_key of every distinct image of a layout."""
+        return sorted({design_key(image) for image in self.images(variables)})
+
+    def reduce(self, population):
+        """
+        Reduce a population to one representative per class of equivalent layouts.
+
+        :param population: List of solutions
+        :return: A tuple (representatives, classes): new solutions with the canonical layouts, in order of
+                 first occurrence, and for each of them the list of solutions of the population it stands for
+        """
+        representatives, classes, positions = [], [], {}
+        for solution in population:
+            key = self.key(solution["variables"])
+            if key not in positions:
+                positions[key] = len(representatives)
+                representatives.append({"variables": self.canonical(solution["variables"]), "objectives": [0.0, 0.0]})
+                classes.append([])
+            classes[positions[key]].append(solution)
+        return representatives, classes
+
+    @staticmethod
+    def map_back(representatives, classes):
+        """Assign the objectives of the simulated representatives to every layout of their class."""
+        for representative, members in zip(representatives, classes):
+            for solution in members:
+                solution["objectives"] = list(representative["objectives"])
+
+
+def obstacle_offsets(edges, name, table=None):
+    """
+    Deviation of the CAD obstacles from an exact mirror image: the centre of the obstacle of every straight
+    edge (rows 1-18 of geometry.obstacle_table) is mirrored about the middle of the lattice and compared with
+    the centre of the obstacle of its image edge. The diagonal obstacles are rotated by the macro and left out.
+
+    :return: Array of the offsets in mm, entry e - 1 for edge e
+    """
+    from geometry import obstacle_table
+
+    table = obstacle_table() if table is None else table
+    straight = np.arange(18)
+    centres = (table[straight, :2] + table[straight, 3:5]) / 2
+    middle = (centres.min(axis=0) + centres.max(axis=0)) / 2
+    # Rows run along -y (top nodes at the largest y), columns along x
+    flip = {"mirror_top_bottom": [False, True], "mirror_left_right": [True, False], "rotate_180": [True, True]}[name]
+    mirrored = np.where(flip, 2 * middle - centres, centres)
+    images = edge_permutation(edges, name)[straight] - 1
+    return np.linalg.norm(mirrored - centres[images], axis=1)
+
+
+if __name__ == "__main__":
+    import time
+
+    from optimization import Mixer, generate_initial_population
+
+    problem = Mixer()
+    feasibility = problem.feasibility
+    layouts = feasibility.layouts[feasibility.feasible_rows].astype(np.int64) + 1
+
+    for symmetries in ([], ["mirror_top_bottom"], ["mirror_top_bottom", "mirror_left_right"]):
+        symmetry = SymmetryGroup(problem.edges, symmetries)
+        start = time.perf_counter()
+        canonical = symmetry.canonical_array(layouts)
+        elapsed = time.perf_counter() - start
+        assert all(feasibility.is_feasible(list(row)) for row in np.unique(canonical, axis=0))
+        classes = len(np.unique(canonical, axis=0))
+        print(f"{symmetries or 'No symmetry'}: group of {len(symmetry)}, {classes} of {len(layouts)} feasible layouts "
+              f"to simulate ({1 - classes / len(layouts):.1%} saved), canonicalized in {elapsed * 1000:.0f} ms")
+
+    symmetry = SymmetryGroup(problem.edges, ["mirror_top_bottom"])
+    population = generate_initial_population(problem, 50)
+    # Mirror images of the first designs, as they turn up among the offspring
+    population += [{"variables": symmetry.images(sol["variables"])[-1]} for sol in population[:10]]
+    representatives, classes = symmetry.reduce(population)
+    print(f"Population of {len(population)} designs: {len(representatives)} to simulate")
+
+    for name in NODE_MAPS:
+        offsets = obstacle_offsets(problem.edges, name)
+        print(f"{name}: CAD obstacles of {int((offsets > 1e-9).sum())} of {len(offsets)} straight edges are off "
+              f"their mirror position, by up to {offsets.max():.2f} mm")
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Xiao Liang
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from checkpoint import write_json
+from evaluation_cache import design_key
+
+
+## Warm start of the CFD runs
+# ----------------------------------------------------------------------------------------------------------------------------
+#
+# Run_CFD.java solves every design from the cold initial field of Design_blank.sim, although most offspring
+# differ from an evaluated design by one or two obstacle edges. WarmStartIndex keeps the converged designs
+# (layout, saved .sim file) of the campaign in {output_directory}/warm_start.json; every new CFD job gets the
+# .sim of its nearest converged design as the initialization source (init_sim_file in the job file), if it
+# is within max_distance edges. The job pool records the iterations and wall time of every run with its
+# initialization (warm / cold), python instrumentation.py report <log> compares the two.
+
+NUM_EDGES = 36  # Edges of the lattice (geometry.obstacle_table)
+INDEX_FILE = "warm_start.json"
+
+
+def edge_counts(layouts):
+    """Array of shape (n, NUM_EDGES): how often every edge occurs in each layout (1-based edge indices)."""
+    counts = np.zeros((len(layouts), NUM_EDGES), dtype=np.int16)
+    if not len(layouts):
+        return counts
+    layouts = np.asarray(layouts, dtype=np.int64)
+    for column in layouts.T:
+        np.add.at(counts, (np.arange(len(layouts)), column - 1), 1)
+    return counts
+
+
+def layout_distance(a, b):
+    """
+    Set distance of two layouts: the number of obstacles of a that are not in b, e.g. 1 if they differ by a
+    single edge. The order of the obstacles does not matter.
+    """
+    return int(len(a) - np.minimum(edge_counts([a])[0], edge_counts([b])[0]).sum())
+
+
+class WarmStartIndex:
+    """
+    Nearest-neighbour index over the converged designs of a campaign. Thread-safe, the steady-state workers
+    share one index.
+
+    Usage:
+        index = WarmStartIndex(os.path.join(output_directory, "warm_start.json"), max_distance=2)
+        index.assign(jobs, population)  # Before the jobs are run, sets job.init_sim_file
+        index.add_jobs(jobs, population)  # After the run, adds the converged designs
+    """
+    def __init__(self, index_file, max_distance=2):
+        """
+        :param index_file: JSON file of the index, loaded if it exists
+        :param max_distance: Largest layout distance to warm-start from; farther designs start cold
+        """
+        self.index_file = index_file
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.entries = []
+        self.counts = np.zeros((0, NUM_EDGES), dtype=np.int16)
+        if os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as file:
+                entries = json.load(file)
+            # Designs whose .sim file was deleted since cannot serve as source
+            self.entries = [entry for entry in entries if os.path.exists(entry["sim_file"])]
+            self.counts = edge_counts([entry["layout"] for entry in self.entries])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def nearest(self, layout):
+        """
+        Closest converged design of a layout.
+
+        :return: A tuple (entry, distance), entry being None if no design is within max_distance
+        """
+        with self.lock:
+            if not self.entries:
+                return None, None
+            overlap = np.minimum(self.counts, edge_counts([layout])[0]).sum(axis=1)
+            distances = len(layout) - overlap
+            best = int(np.argmin(distances))
+            distance = int(distances[best])
+            if distance > self.max_distance:
+                return None, distance
+            return self.entries[best], distance
+
+    def add(self, layout, sim_file, design=None, iterations=None):
+        """Add a converged design; a design already in the index gets the new .sim file."""
+        entry = {"key": design_key(layout), "layout": [int(v) for v in layout], "sim_file": sim_file,
+                 "design": design, "iterations": iterations}
+        with self.lock:
+            for k, existing in enumerate(self.entries):
+                if existing["key"] == entry["key"]:
+                    self.entries[k] = entry
+                    break
+            else:
+                self.entries.append(entry)
+                self.counts = np.vstack([self.counts, edge_counts([layout])])
+            write_json(self.index_file, self.entries)
+
+    def discard(self, folder):
+        """Remove the designs whose .sim file is in folder, e.g. before the folder is reused for other designs."""
+        folder = os.path.abspath(folder)
+        with self.lock:
+            keep = [k for k, entry in enumerate(self.entries)
+                    if os.path.dirname(os.path.abspath(entry["sim_file"])) != folder]
+            if len(keep) < len(self.entries):
+                self.entries = [self.entries[k] for k in keep]
+                self.counts = self.counts[keep]
+                write_json(self.index_file, self.entries)
+
+    def assign(self, jobs, population):
+        """
+        Set the initialization source of CFD jobs. Design{k} is population[k - 1], as in make_cfd_jobs.
+
+        :return: Number of warm-started jobs
+        """
+        warm = 0
+        for job in jobs:
+            entry, distance = self.nearest(population[design_index(job.design_id) - 1]["variables"])
+            if entry is not None:
+                job.init_sim_file = entry["sim_file"]
+                job.init_source = f"{entry['key']} (distance {distance})"
+                warm += 1
+        print(f"Warm start: {warm}/{len(jobs)} CFD jobs initialized from a converged design.")
+        return warm
+
+    def add_jobs(self, jobs, population):
+        """Add the designs of finished jobs that converged and saved their .sim file."""
+        for job in jobs:
+            if job.status == "done" and os.path.exists(job.sim_file):
+                self.add(population[design_index(job.design_id) - 1]["variables"], job.sim_file, job.design_id,
+                         job.iterations)
+
+
+def design_index(design_id):
+    """k of 'Design{k}'."""
+    return int(design_id[len("Design"):])
+
+
+if __name__ == "__main__":
+    # Offspring of a generational campaign with the dummy solver: jobs initialized from the nearest
+    # converged design of the earlier generations against cold starts
+    import random
+    import sys
+    import tempfile
+    import time
+
+    from cfd_job_pool import CFDJobPool, make_cfd_jobs
+    from cad_batch import emulate_cad_macro, write_cad_manifest
+    from optimization import Mixer, generate_initial_population
+
+    dummy_solver = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummy_starccm.py")
+    os.environ.setdefault("DUMMY_SOLVER_SECONDS", "0.4")
+    problem = Mixer()
+    random.seed(0)
+    np.random.seed(0)
+    generations = [generate_initial_population(problem, 8)]
+    for _ in range(3):
+        # One or two obstacles of a parent moved to another feasible edge, as the mutation does
+        slots = [random.sample(range(problem.num_variables), random.choice([1, 2])) for _ in generations[-1]]
+        generations.append([{"variables": problem.feasibility.resample(list(parent["variables"]), positions)}
+                            for parent, positions in zip(generations[-1], slots)])
+
+    for use_warm_start in (False, True):
+        with tempfile.TemporaryDirectory() as output_directory:
+            index = WarmStartIndex(os.path.join(output_directory, INDEX_FILE), max_distance=2)
+            pool = CFDJobPool([sys.executable, dummy_solver, "-np", "{cores}", "-batch", "{macro}"],
+                              macro_file="Run_CFD_Modified.java", core_budget=16, poll_interval=0.02)
+            start = time.time()
+            jobs = []
+            for generation, population in enumerate(generations):
+                folder = os.path.join(output_directory, f"T_{generation}")
+                write_cad_manifest(population, folder, "Blank.SLDPRT", save_sldprt=False)
+                emulate_cad_macro(folder)
+                generation_jobs = make_cfd_jobs(folder, "Design_blank.sim", 4)
+                if use_warm_start:
+                    index.assign(generation_jobs, population)
+                jobs += pool.run(generation_jobs)
+                index.add_jobs(generation_jobs, population)
+            elapsed = time.time() - start
+
+        for initialization in ("cold", "warm"):
+            group = [job for job in jobs if job.initialization == initialization]
+            if group:
+                print(f"{'With' if use_warm_start else 'Without'} warm start, {initialization}: {len(group)} runs, "
+                      f"{np.mean([job.iterations for job in group]):.1f} iterations and "
+                      f"{np.mean([job.wall_time for job in group]):.2f} s per run")
+        print(f"{'With' if use_warm_start else 'Without'} warm start: {sum(job.iterations for job in jobs)} "
+              f"iterations, {elapsed:.1f} s in total\n")